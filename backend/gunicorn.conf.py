@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for running Vocas with several worker processes.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Workers default to the number of CPU cores (WEB_CONCURRENCY overrides it),
+so HTML parsing and rewriting is spread over all cores. With more than one
+worker, caches, jobs and single-flight leases are kept in a shared SQLite
+database (SHARED_STATE_DB, default data/shared.db).
+"""
+import os
+import multiprocessing
+
+from dotenv import load_dotenv
+
+# Read .env here as well, so a SHARED_STATE_DB set there wins over the default below
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or 0) or multiprocessing.cpu_count()
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Every worker opens its own SQLite connections and background tasks, so
+# the app must be imported after the fork
+preload_app = False
+
+# Streamed audio responses can outlive the default 30 s on shutdown
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "60"))
+
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+
+if workers > 1 and not os.getenv("SHARED_STATE_DB"):
+    os.environ["SHARED_STATE_DB"] = "data/shared.db"
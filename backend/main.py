@@ -1,15 +1,28 @@
-from fastapi import FastAPI, Request, HTTPException, Body
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, Request, HTTPException, Body, Query
+from fastapi.responses import HTMLResponse, StreamingResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
+from collections import OrderedDict
+from typing import List, Optional
 import os
+import json
+import time
+import uuid
 import logging
 from dotenv import load_dotenv
 
 from services.proxy import ProxyService
+from services.http_cache import NotHTMLError
+from services.http_client import ConnectionSettings
+from services.shared_state import SharedState
 from services.llm import LLMService
-from services.tts import TTSService
+from services.tts import TTSService, registry as tts_registry
+from services.prefetch import PrefetchScheduler
+from services.jobs import JobManager, QueueFullError, DONE
+from services.playlists import PlaylistManager
+from services.audio_files import AudioFileResponse, IMMUTABLE
+from services import metrics, startup
 from fastapi.middleware.cors import CORSMiddleware
 
 # Load environment variables
@@ -29,6 +42,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    Adds a Server-Timing header with the pipeline stages that ran before the
+    response started (streamed bodies are timed in /metrics only).
+    """
+    started = time.perf_counter()
+    with metrics.request_timings() as timings:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = metrics.server_timing_header(timings, time.perf_counter() - started)
+    return response
+
 def get_base_url(request: Request) -> str:
     """
     Get the correct base URL respecting X-Forwarded-Proto header from reverse proxy.
@@ -39,8 +64,7 @@ def get_base_url(request: Request) -> str:
     forwarded_host = request.headers.get("x-forwarded-host", None)
     host = request.headers.get("host", str(request.base_url.netloc))
     
-    # Debug logging
-    logger.info(f"Headers: X-Forwarded-Proto={forwarded_proto}, X-Forwarded-Host={forwarded_host}, Host={host}")
+    logger.debug(f"Headers: X-Forwarded-Proto={forwarded_proto}, X-Forwarded-Host={forwarded_host}, Host={host}")
     
     if forwarded_proto:
         # We're behind a reverse proxy with proper headers
@@ -56,27 +80,124 @@ def get_base_url(request: Request) -> str:
     # Local development - use base_url as-is
     return str(request.base_url).rstrip('/')
 
-# Mount static files
+# Mount static files (generated audio is served by /audio/ below; old
+# /static/audio/ URLs keep working)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Templates
 templates = Jinja2Templates(directory="templates")
 
 # Services
-proxy_service = ProxyService()
-llm_service = LLMService(api_key=os.getenv("GEMINI_API_KEY"))
+# Multi-worker mode (gunicorn.conf.py): caches, jobs and single-flight leases
+# live in one SQLite database shared by all worker processes
+shared_state = SharedState(os.getenv("SHARED_STATE_DB")) if os.getenv("SHARED_STATE_DB") else None
+
+# Outbound connection pools share one DNS cache and keepalive/HTTP/2 settings
+connections = ConnectionSettings()
+proxy_service = ProxyService(connections, shared=shared_state)
+llm_service = LLMService(api_key=os.getenv("GEMINI_API_KEY"), shared=shared_state)
 
 # TTS Service - provider from ENV (default: edge)
 tts_provider = os.getenv("TTS_PROVIDER", "edge")
-tts_service = TTSService(output_dir="static/audio", provider=tts_provider)
+tts_service = TTSService(output_dir="static/audio", provider=tts_provider, connections=connections, shared=shared_state)
+
+# Background cache warming for popular front pages (disabled without PREFETCH_SOURCES)
+prefetch_scheduler = PrefetchScheduler(
+    proxy_service,
+    llm_service,
+    tts_service,
+    sources=[s.strip() for s in os.getenv("PREFETCH_SOURCES", "").split(",") if s.strip()],
+    interval=float(os.getenv("PREFETCH_INTERVAL", "900")),
+    articles_per_source=int(os.getenv("PREFETCH_ARTICLES_PER_SOURCE", "5")),
+    concurrency=int(os.getenv("PREFETCH_CONCURRENCY", "2")),
+    budget=int(os.getenv("PREFETCH_BUDGET", "20")),
+    modes=[m.strip() for m in os.getenv("PREFETCH_MODES", "read").split(",") if m.strip()],
+    shared=shared_state
+)
+
+# Job queue - LLM and TTS run in bounded worker pools outside of HTTP requests
+job_manager = JobManager(
+    llm_stage=lambda job: process_text(job.text, job.mode, job.source),
+    tts_stage=lambda text, on_progress: tts_service.generate_audio(text, on_progress=on_progress),
+    llm_workers=int(os.getenv("JOB_LLM_WORKERS", "4")),
+    tts_workers=int(os.getenv("JOB_TTS_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "100")),
+    retention=float(os.getenv("JOB_RETENTION", "3600")),
+    db_path=os.getenv("JOB_DB") or None,
+    shared=shared_state
+)
+
+# Playlists of whole front pages, queued through the same job workers
+playlist_manager = PlaylistManager(
+    proxy_service,
+    llm_service,
+    tts_service,
+    job_manager,
+    max_items=int(os.getenv("PLAYLIST_MAX_ITEMS", "20")),
+    extract_concurrency=int(os.getenv("PLAYLIST_EXTRACT_CONCURRENCY", "4")),
+    shared=shared_state
+)
 
 class ProcessRequest(BaseModel):
-    text: str
+    text: Optional[str] = None # extracted by the client; omitted when ?url= is used
     mode: str = "read" # 'read' or 'summarize'
+    stream: bool = False # return a streaming audio URL instead of waiting for the whole MP3
+    source: Optional[str] = None # page URL of client-extracted text, for per-site pre-cleaning
+
+class PlaylistRequest(BaseModel):
+    urls: Optional[List[str]] = None # article URLs in playback order
+    section: Optional[str] = None # front or section page whose top articles are used instead
+    limit: int = 10 # articles taken from the section page
+    mode: str = "read" # 'read' or 'summarize'
+
+# Pending streaming requests: stream_id -> {"text", "mode", "source", "processed_text"}
+# Kept (bounded) after playback starts so the browser can re-request the audio.
+# In multi-worker mode they are kept in the shared database instead.
+MAX_PENDING_STREAMS = 1000
+pending_streams: "OrderedDict[str, dict]" = OrderedDict()
+
+def remember_stream(stream_id: str, pending: dict):
+    """
+    Stores a pending stream; with several workers in the shared database,
+    since the audio element's request may reach a different worker.
+    """
+    if shared_state:
+        shared_state.put("stream", stream_id, pending, max_entries=MAX_PENDING_STREAMS)
+        return
+    pending_streams[stream_id] = pending
+    while len(pending_streams) > MAX_PENDING_STREAMS:
+        pending_streams.popitem(last=False)
+
+def find_stream(stream_id: str) -> Optional[dict]:
+    """
+    Returns the pending stream registered by remember_stream().
+    """
+    if shared_state:
+        return shared_state.get("stream", stream_id)
+    return pending_streams.get(stream_id)
+
+# Pipe the LLM output into speech synthesis sentence by sentence on /api/stream
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+
+# nginx internal location mapped to static/audio, e.g. /_audio/ (empty = send files from Python)
+AUDIO_ACCEL_REDIRECT = os.getenv("AUDIO_ACCEL_REDIRECT") or None
+
+@app.on_event("startup")
+async def startup_event():
+    job_manager.start()
+    prefetch_scheduler.start()
+    tts_service.cache.start()
+    startup.mark_ready()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await prefetch_scheduler.stop()
+    await playlist_manager.stop()
+    await job_manager.stop()
+    await tts_service.cache.stop()
     await proxy_service.close()
+    if shared_state:
+        await shared_state.stop()
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -93,42 +214,374 @@ async def read_url(request: Request, url: str):
     # Base host for injecting scripts - respects X-Forwarded-Proto from nginx
     base_host = get_base_url(request)
     
-    html_content = await proxy_service.fetch_and_process(url, base_host)
+    try:
+        page = await proxy_service.fetch(url)
+    except NotHTMLError:
+        return await passthrough(url)
+    except Exception as e:
+        metrics.ERRORS.inc(stage="proxy")
+        logger.error(f"Proxy error for {url}: {e}")
+        return HTMLResponse(f"<h1>Error loading page: {e}</h1>", status_code=502)
     
-    # Return HTML. 
+    # Return HTML as it is rewritten.
     # Important: We strip Content-Security-Policy to allow our injected scripts to run.
-    response = HTMLResponse(content=html_content)
+    async def body():
+        async for chunk in proxy_service.render_stream(page, url, base_host):
+            data = chunk.encode("utf-8")
+            metrics.PROXIED_BYTES.inc(len(data))
+            yield data
+    
+    response = StreamingResponse(body(), media_type="text/html; charset=utf-8")
     if "content-security-policy" in response.headers:
         del response.headers["content-security-policy"]
     
     return response
 
+async def passthrough(url: str):
+    """
+    Streams a non-HTML resource (PDF, image) reached through a rewritten
+    link unchanged; files over the passthrough limit are left to the browser.
+    """
+    try:
+        upstream = await proxy_service.open_passthrough(url)
+    except Exception as e:
+        metrics.ERRORS.inc(stage="proxy")
+        logger.error(f"Passthrough error for {url}: {e}")
+        return HTMLResponse(f"<h1>Error loading page: {e}</h1>", status_code=502)
+    
+    if proxy_service.passthrough_too_large(upstream):
+        await upstream.aclose()
+        return RedirectResponse(str(upstream.url))
+    
+    return StreamingResponse(
+        proxy_service.passthrough_body(upstream),
+        status_code=upstream.status_code,
+        headers=proxy_service.passthrough_headers(upstream)
+    )
+
 @app.post("/api/process")
-async def process_content(request: ProcessRequest):
+async def process_content(request: ProcessRequest, url: Optional[str] = Query(None)):
     """
     Processes text (cleaning/reasoning/summarizing) and generates audio.
+    With ?url= the article is extracted server-side from the proxied page
+    instead of being sent by the client.
+    """
+    with metrics.PROCESS.time(mode=request.mode, stream=str(request.stream).lower()):
+        return await run_process(request, url)
+
+async def run_process(request: ProcessRequest, url: Optional[str]):
     """
-    logger.info(f"Processing request: mode={request.mode}, text_len={len(request.text)}")
+    Body of /api/process, timed as a whole by process_content.
+    """
+    text = await resolve_text(request.text, url)
+    source = url or request.source
     
-    processed_text = ""
-    if request.mode == "summarize":
-        processed_text = llm_service.summarize_text(request.text)
-    else:
-        # 'read' mode - clean logic
-        processed_text = llm_service.clean_text(request.text)
+    logger.info(f"Processing request: mode={request.mode}, text_len={len(text)}, stream={request.stream}, url={bool(url)}")
     
-    logger.info(f"LLM processed text length: {len(processed_text)}")
+    if request.stream:
+        # LLM and TTS run when the audio element opens the stream URL
+        stream_id = uuid.uuid4().hex
+        remember_stream(stream_id, {"text": text, "mode": request.mode, "source": source, "processed_text": None})
+        
+        return {
+            "audio_url": f"/api/stream/{stream_id}",
+            "processed_text": None
+        }
     
-    audio_file = tts_service.generate_audio(processed_text)
+    # Runs through the job workers so concurrent syntheses stay bounded
+    job = await job_manager.wait(submit_job(text, request.mode, source).id)
+    for name, seconds in job.timings.items():
+        metrics.record_timing(name, seconds)
     
-    if not audio_file:
+    if job.status != DONE:
+        metrics.ERRORS.inc(stage="process")
         raise HTTPException(status_code=500, detail="Failed to generate audio")
         
     return {
-        "audio_url": f"/static/audio/{audio_file}",
-        "processed_text": processed_text
+        "audio_url": f"/audio/{job.audio_file}",
+        "processed_text": job.processed_text
+    }
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(request: ProcessRequest, url: Optional[str] = Query(None)):
+    """
+    Queues text (or ?url=) for processing and returns the job id immediately.
+    Poll GET /api/jobs/{id} or subscribe to /api/jobs/{id}/events.
+    """
+    text = await resolve_text(request.text, url)
+    job = submit_job(text, request.mode, url or request.source)
+    
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Returns job status, stage progress and the audio URL once done.
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events stream of job updates; ends when the job finishes.
+    """
+    if not job_manager.get(job_id):
+        raise HTTPException(status_code=404, detail="Unknown job")
+    
+    async def events():
+        async for job in job_manager.watch(job_id):
+            yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-store"})
+
+@app.post("/api/playlists", status_code=202)
+async def create_playlist(request: PlaylistRequest):
+    """
+    Turns a list of article URLs (or the top articles of a section page)
+    into an audio playlist. Returns at once; items are extracted and queued
+    in order in the background, so the first one is ready first.
+    """
+    urls = request.urls or []
+    if request.section:
+        try:
+            urls = urls + await playlist_manager.section_links(request.section, request.limit)
+        except Exception as e:
+            logger.error(f"Playlist section fetch failed for {request.section}: {e}")
+            raise HTTPException(status_code=502, detail="Failed to load page")
+    if not urls:
+        raise HTTPException(status_code=400, detail="No article URLs")
+    
+    playlist = playlist_manager.create(urls, request.mode)
+    return playlist_manager.to_dict(playlist)
+
+@app.get("/api/playlists/{playlist_id}.m3u")
+async def playlist_m3u(request: Request, playlist_id: str):
+    """
+    The playlist as M3U for any audio player; each entry waits for its
+    audio, so the player can start on the first article right away.
+    """
+    playlist = playlist_manager.get(playlist_id)
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Unknown playlist")
+    
+    base_url = get_base_url(request)
+    lines = ["#EXTM3U"]
+    for index, item in enumerate(playlist.items):
+        title = (item.title or item.url).replace("\n", " ")
+        lines.append(f"#EXTINF:-1,{title}")
+        lines.append(f"{base_url}/api/playlists/{playlist.id}/items/{index}")
+    
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="audio/x-mpegurl", headers={"Cache-Control": "no-store"})
+
+@app.get("/api/playlists/{playlist_id}")
+async def get_playlist(playlist_id: str):
+    """
+    Returns the playlist with the status of every item.
+    """
+    playlist = playlist_manager.get(playlist_id)
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Unknown playlist")
+    return playlist_manager.to_dict(playlist)
+
+@app.api_route("/api/playlists/{playlist_id}/items/{index}", methods=["GET", "HEAD"])
+async def playlist_item(request: Request, playlist_id: str, index: int, variant: Optional[str] = Query(None)):
+    """
+    Serves the audio of one playlist item, waiting until it is synthesized.
+    """
+    try:
+        audio_file = await playlist_manager.item_audio(playlist_id, index)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown playlist item")
+    if not audio_file or not tts_service.cache.touch(audio_file):
+        raise HTTPException(status_code=502, detail="Failed to generate audio")
+    return await audio_response(request, audio_file, variant, cache_control="no-cache")
+
+def submit_job(text: str, mode: str, source: Optional[str] = None):
+    """
+    Queues a job, mapping a full queue to 503 so clients back off.
+    """
+    try:
+        return job_manager.submit(text, mode, source)
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Too many requests in progress", headers={"Retry-After": "5"})
+
+async def resolve_text(text: Optional[str], url: Optional[str]) -> str:
+    """
+    Returns the article text: extracted server-side for ?url=, otherwise
+    the text sent by the client.
+    """
+    if url:
+        try:
+            text = await proxy_service.extract_article(url)
+        except Exception as e:
+            logger.error(f"Extraction fetch failed for {url}: {e}")
+            raise HTTPException(status_code=502, detail="Failed to load page")
+        if not text:
+            # The overlay falls back to client-side Readability
+            raise HTTPException(status_code=422, detail="No article found")
+    elif not text:
+        raise HTTPException(status_code=400, detail="Either text or url is required")
+    return text
+
+@app.get("/api/stream/{stream_id}")
+async def stream_audio(request: Request, stream_id: str, variant: Optional[str] = Query(None)):
+    """
+    Streams audio for a request registered via /api/process with stream=true.
+    Playback can start as soon as the TTS provider sends the first chunk -
+    with LLM_STREAMING, already while the LLM is still generating the text;
+    ?variant= applies once the audio is cached.
+    """
+    pending = find_stream(stream_id)
+    if not pending:
+        raise HTTPException(status_code=404, detail="Unknown stream")
+    
+    if pending["processed_text"] is None:
+        pending["processed_text"] = llm_service.cached(pending["text"], pending["mode"])
+    if pending["processed_text"] is None:
+        if LLM_STREAMING:
+            # Synthesis starts on the first sentences while Gemini is still writing
+            return StreamingResponse(
+                tts_service.stream_text_audio(llm_service.stream_text(pending["text"], pending["mode"], pending.get("source"))),
+                media_type="audio/mpeg",
+                headers={"Cache-Control": "no-store"}
+            )
+        pending["processed_text"] = await process_text(pending["text"], pending["mode"], pending.get("source"))
+        remember_stream(stream_id, pending)
+    processed_text = pending["processed_text"]
+    
+    # Already synthesized (e.g. browser re-requesting the stream) - serve the file
+    audio_file = await tts_service.get_cached_audio(processed_text)
+    if audio_file:
+        return await audio_response(request, audio_file, variant, cache_control="no-cache")
+    
+    return StreamingResponse(
+        tts_service.stream_audio(processed_text),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-store"}
+    )
+
+@app.api_route("/audio/{filename:path}", methods=["GET", "HEAD"])
+async def audio(request: Request, filename: str, variant: Optional[str] = Query(None)):
+    """
+    Serves a generated audio file with Range support and immutable caching.
+    ?variant=opus|low asks for a smaller encoding; without it, clients
+    sending Save-Data: on get one automatically.
+    """
+    if not tts_service.cache.touch(filename):
+        raise HTTPException(status_code=404, detail="Unknown audio file")
+    return await audio_response(request, filename, variant)
+
+async def audio_response(request: Request, filename: str, variant: Optional[str] = None, cache_control: str = IMMUTABLE):
+    """
+    Builds the response for a cached audio file, converting it to the chosen
+    variant first. The source file is pinned until the response is sent.
+    """
+    variants = tts_service.variants
+    negotiated = variant is None
+    chosen = variants.choose(variant, request.headers.get("save-data", "").lower() == "on", request.headers.get("accept", ""))
+    
+    # Not reaped by the audio sweeper while it is converted and sent
+    tts_service.cache.pin(filename)
+    try:
+        served = (await variants.get(filename, chosen) if chosen else None) or filename
+        if served == filename:
+            chosen = None
+        
+        return AudioFileResponse(
+            os.path.join(tts_service.output_dir, served),
+            served,
+            request.headers,
+            method=request.method,
+            media_type=variants.media_type(chosen),
+            cache_control=cache_control,
+            headers={"Vary": "Save-Data"} if negotiated else None,
+            accel_prefix=AUDIO_ACCEL_REDIRECT,
+            variant=chosen or "original",
+            on_close=lambda: tts_service.cache.unpin(filename)
+        )
+    except BaseException:
+        tts_service.cache.unpin(filename)
+        raise
+
+async def process_text(text: str, mode: str, source: Optional[str] = None) -> str:
+    """
+    Runs the LLM step for the given mode ('read' cleans, 'summarize' summarizes).
+    """
+    if mode == "summarize":
+        processed_text = await llm_service.summarize_text(text, source)
+    else:
+        # 'read' mode - clean logic
+        processed_text = await llm_service.clean_text(text, source)
+    
+    logger.info(f"LLM processed text length: {len(processed_text)}")
+    return processed_text
+
+@app.get("/api/stats")
+async def stats():
+    """
+    Returns cache statistics.
+    """
+    return {
+        "audio_cache": tts_service.stats(),
+        "llm_cache": llm_service.cache.stats(),
+        "preclean": llm_service.preclean_stats(),
+        "page_cache": proxy_service.cache.stats(),
+        "render_cache": proxy_service.render_cache.stats(),
+        "extract_cache": proxy_service.extract_cache.stats(),
+        "prefetch": prefetch_scheduler.stats(),
+        "jobs": job_manager.stats(),
+        "playlists": playlist_manager.stats(),
+        "rate_limits": {
+            "llm": llm_service.governor.stats(),
+            "tts": tts_service.rate_stats()
+        },
+        "tts_providers": tts_service.provider_stats(),
+        "startup": startup.report(tts_registry.stats()),
+        "connections": connections.stats(),
+        "shared_state": shared_state.stats() if shared_state else None
+    }
+
+# Counters the services already keep, read when /metrics is scraped
+def cache_stats() -> dict:
+    return {
+        "audio": tts_service.stats(),
+        "llm": llm_service.cache.stats(),
+        "page": proxy_service.cache.stats(),
+        "render": proxy_service.render_cache.stats(),
+        "extract": proxy_service.extract_cache.stats()
     }
 
+for field, description in (("hits", "Cache hits"), ("misses", "Cache misses")):
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        f"vocas_cache_{field}_total", description, "counter", ["cache"],
+        lambda field=field: [({"cache": name}, stats[field]) for name, stats in cache_stats().items()]
+    ))
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "vocas_jobs", "Unfinished jobs by stage", "gauge", ["stage"],
+    lambda: [({"stage": stage}, job_manager.stats()[stage]) for stage in ("queued", "in_llm", "tts_queued", "in_tts")]
+))
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "vocas_dns_cache_lookups_total", "Upstream host name lookups", "counter", ["result"],
+    lambda: [({"result": result}, connections.dns.stats()[result]) for result in ("hits", "misses", "failures")] if connections.dns else []
+))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus text exposition of stage latencies, byte and error counters.
+    """
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=5000, reload=True)
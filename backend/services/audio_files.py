@@ -0,0 +1,157 @@
+import os
+import asyncio
+from email.utils import formatdate
+from typing import Callable, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from services.metrics import AUDIO_SERVED_BYTES
+
+# Generated files never change under their URL (the name is a content hash)
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range `Range: bytes=...` header into an inclusive
+    (start, end) pair. Returns None when the header should be ignored
+    (other units, several ranges) and the whole file sent instead.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def make_etag(filename: str, stat: os.stat_result) -> str:
+    """
+    Strong ETag from the content-hash file name; the mtime tells apart a
+    file synthesized again after it was evicted.
+    """
+    return f'"{os.path.basename(filename)}-{stat.st_mtime_ns:x}"'
+
+
+class AudioFileResponse(Response):
+    """
+    Sends a generated audio file with Range/206, If-None-Match/304 and HEAD
+    support, so players can seek without downloading the whole file.
+
+    With `accel_prefix` set, only headers are sent and nginx delivers the
+    file itself (X-Accel-Redirect to `accel_prefix` + filename) with
+    sendfile and its own range handling; otherwise the file is read in
+    large chunks in a thread. `on_close` runs after the response, also when the
+    client disconnects (e.g. to unpin the file in the audio cache).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        filename: str,
+        request_headers: Headers,
+        method: str = "GET",
+        media_type: str = "audio/mpeg",
+        cache_control: str = IMMUTABLE,
+        headers: Optional[dict] = None,
+        accel_prefix: Optional[str] = None,
+        variant: str = "original",
+        on_close: Optional[Callable[[], None]] = None
+    ):
+        self.path = path
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.send_body = method != "HEAD"
+        self.variant = variant
+        self.on_close = on_close
+        self.range: Optional[Tuple[int, int]] = None
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = make_etag(filename, stat)
+        self.init_headers({
+            **(headers or {}),
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat.st_mtime, usegmt=True),
+            "cache-control": cache_control,
+        })
+
+        if accel_prefix:
+            self.send_body = False
+            self.headers["x-accel-redirect"] = accel_prefix.rstrip("/") + "/" + filename
+            return
+
+        if etag in [tag.strip() for tag in request_headers.get("if-none-match", "").split(",")]:
+            self.status_code = 304
+            self.send_body = False
+            return
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                self.range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.send_body = False
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                return
+
+        if self.range:
+            start, end = self.range
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        else:
+            self.range = (0, size - 1)
+        self.headers["content-length"] = str(self.range[1] - self.range[0] + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if not self.send_body or self.range[1] < self.range[0]:
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            start, end = self.range
+            count = end - start + 1
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                remaining = count
+                while remaining > 0:
+                    chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # File shorter than its stat said - end the body anyway
+                    await send({"type": "http.response.body", "body": b""})
+            AUDIO_SERVED_BYTES.inc(count, variant=self.variant)
+        finally:
+            if self.on_close:
+                self.on_close()
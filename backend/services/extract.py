@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+import trafilatura
+
+logger = logging.getLogger(__name__)
+
+
+class ArticleExtractor:
+    """
+    Server-side article extraction (trafilatura), the counterpart of
+    Readability in the overlay.
+    """
+
+    def __init__(self, min_length: int = 200):
+        # Shorter extractions are usually section pages or paywall stubs
+        self.min_length = min_length
+
+    def extract(self, content: bytes, url: str) -> Optional[str]:
+        """
+        Returns the main text of the page or None if there is no article.
+        """
+        try:
+            text = trafilatura.extract(
+                content,
+                url=url,
+                include_comments=False,
+                include_tables=False,
+                favor_precision=True
+            )
+        except Exception as e:
+            logger.error(f"Extraction failed for {url}: {e}")
+            return None
+
+        if not text or len(text) < self.min_length:
+            return None
+        return text
+
+    async def extract_async(self, content: bytes, url: str) -> Optional[str]:
+        """
+        extract() in a worker thread - trafilatura is CPU-bound.
+        """
+        return await asyncio.to_thread(self.extract, content, url)
+
+
+class ExtractionCache:
+    """
+    Extracted article text per URL, tagged with the upstream version it was
+    extracted from (like RenderCache). Pages without an article are cached
+    too, so they are not re-parsed on every request. LRU-bounded by entry
+    count.
+    """
+
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        # url -> (version, text or None)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, url: str, version: str):
+        """
+        Returns (found, text); text is None for pages without an article.
+        """
+        entry = self._entries.get(url)
+        if entry and entry[0] == version:
+            self.hits += 1
+            self._entries.move_to_end(url)
+            return True, entry[1]
+
+        if entry:
+            del self._entries[url]
+        self.misses += 1
+        return False, None
+
+    def put(self, url: str, version: str, text: Optional[str]):
+        self._entries[url] = (version, text)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / requests, 3) if requests else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
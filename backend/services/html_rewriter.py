@@ -0,0 +1,302 @@
+import re
+import json
+import codecs
+from html import escape, unescape
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urljoin
+
+# Elements whose content is raw text - tags inside them are not parsed
+RAW_TEXT_ELEMENTS = ("script", "style", "textarea", "title", "xmp", "iframe", "noembed", "noframes")
+
+TAG_NAME = re.compile(r'</?([a-zA-Z][^\s/>]*)')
+# Unquoted values run to whitespace or '>' like in the HTML tokenizer, so
+# query strings such as href=/clanek?id=5&page=2 stay whole
+ATTRIBUTE = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?''')
+CHARSET_IN_CONTENT = re.compile(r'(charset\s*=\s*)[^\s;"\']+', re.IGNORECASE)
+
+SKIPPED_HREF_PREFIXES = ('#', 'javascript:', 'data:', 'mailto:')
+
+
+def page_url_script(url: str) -> str:
+    """
+    JS assignment of the proxied page URL, used by the overlay to request
+    server-side extraction. Safe to embed in an inline <script>.
+    """
+    return f"window.VOCAS_PAGE_URL = {json.dumps(url)};".replace("</", "<\\/")
+
+
+def _attributes(tag: str):
+    """
+    Yields (name, value, span) for each attribute of a start tag.
+    `value` is None for attributes without one; `span` covers name=value.
+    """
+    name_match = TAG_NAME.match(tag)
+    body_end = len(tag) - (2 if tag.endswith("/>") else 1)
+    for match in ATTRIBUTE.finditer(tag, name_match.end(), body_end):
+        value = match.group(2)
+        if value is not None and value[:1] in ('"', "'"):
+            value = value[1:-1]
+        yield match.group(1).lower(), value, match.span()
+
+
+def _find_attribute(tag: str, name: str):
+    for attr_name, value, span in _attributes(tag):
+        if attr_name == name:
+            return value, span
+    return None, None
+
+
+def _replace_span(tag: str, span, replacement: str) -> str:
+    return tag[:span[0]] + replacement + tag[span[1]:]
+
+
+class StreamingRewriter:
+    """
+    Incremental, tokenizer-based equivalent of ProxyService.render().
+
+    Upstream HTML is fed in chunks and everything that doesn't need changing
+    is passed through verbatim; only <head>, </head>, </body>, <base>, <meta>
+    and <a href> tags are touched. Memory use is bounded by the largest
+    single tag or comment rather than by the page size.
+    """
+
+    def __init__(self, url: str, base_host: str):
+        self.url = url
+        self.base_host = base_host
+
+        self._buffer = ""
+        self._raw_text_end: Optional[re.Pattern] = None
+        self._head_opened = False
+        self._head_closed = False
+        self._body_closed = False
+
+    # Injected markup (same elements and attribute order as render())
+
+    def _head_start_markup(self) -> str:
+        return (
+            '<meta content="no-referrer" name="referrer"/>'
+            f'<base href="{escape(self.url)}"/>'
+        )
+
+    def _head_end_markup(self) -> str:
+        return f'<link href="{escape(self.base_host)}/static/vocas-overlay.css" rel="stylesheet"/>'
+
+    def _body_end_markup(self) -> str:
+        return (
+            f'<script>window.VOCAS_API_URL = "{self.base_host}/api/process";{page_url_script(self.url)}</script>'
+            f'<script src="{escape(self.base_host)}/static/vocas-overlay.js"></script>'
+        )
+
+    def _synthesized_head(self) -> str:
+        self._head_opened = self._head_closed = True
+        return f"<head>{self._head_start_markup()}{self._head_end_markup()}</head>"
+
+    # Tag handlers
+
+    def _start_tag(self, name: str, tag: str) -> str:
+        if not self._head_opened and name not in ("html", "head"):
+            # No <head> before the first content tag - browsers imply one here
+            return self._synthesized_head() + self._start_tag(name, tag)
+
+        if name == "a":
+            return self._rewrite_link(tag)
+
+        if name == "head" and not self._head_opened:
+            self._head_opened = True
+            return tag + self._head_start_markup()
+
+        if name == "body" and not self._head_closed:
+            # Head never closed - finish it before the body starts
+            self._head_closed = True
+            return self._head_end_markup() + tag
+
+        if name == "base":
+            return ""
+
+        if name == "meta":
+            return self._rewrite_meta(tag)
+
+        return tag
+
+    def _end_tag(self, name: str, tag: str) -> str:
+        if name == "head" and not self._head_closed:
+            if not self._head_opened:
+                return tag
+            self._head_closed = True
+            return self._head_end_markup() + tag
+
+        if name == "body" and not self._body_closed:
+            self._body_closed = True
+            return self._body_end_markup() + tag
+
+        return tag
+
+    def _rewrite_link(self, tag: str) -> str:
+        href, span = _find_attribute(tag, "href")
+        if href is None:
+            return tag
+
+        href = unescape(href)
+        if href.startswith(SKIPPED_HREF_PREFIXES):
+            return tag
+
+        absolute_url = urljoin(self.url, href)
+        return _replace_span(tag, span, f'href="{escape(f"{self.base_host}/read/{absolute_url}")}"')
+
+    def _rewrite_meta(self, tag: str) -> str:
+        http_equiv, _ = _find_attribute(tag, "http-equiv")
+        if http_equiv and http_equiv.strip().lower() == "content-security-policy":
+            return ""
+
+        # Output is always UTF-8, so declared charsets must say so (as bs4 does)
+        charset, span = _find_attribute(tag, "charset")
+        if charset is not None:
+            return _replace_span(tag, span, 'charset="utf-8"')
+
+        if http_equiv and http_equiv.strip().lower() == "content-type":
+            content, span = _find_attribute(tag, "content")
+            if content is not None:
+                content = CHARSET_IN_CONTENT.sub(r'\1utf-8', unescape(content))
+                return _replace_span(tag, span, f'content="{escape(content)}"')
+
+        return tag
+
+    # Tokenizer
+
+    def _find_tag_end(self, start: int) -> int:
+        """
+        Returns the index just past the '>' closing the tag at `start`,
+        skipping '>' inside quoted attribute values, or -1 if incomplete.
+        """
+        buffer = self._buffer
+        quote = None
+        for i in range(start + 1, len(buffer)):
+            char = buffer[i]
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in ('"', "'"):
+                # Quotes only open a value right after '='
+                j = i - 1
+                while j > start and buffer[j].isspace():
+                    j -= 1
+                if buffer[j] == "=":
+                    quote = char
+            elif char == ">":
+                return i + 1
+        return -1
+
+    def _process(self, final: bool) -> str:
+        buffer = self._buffer
+        out = []
+        pos = 0
+
+        while pos < len(buffer):
+            if self._raw_text_end:
+                match = self._raw_text_end.search(buffer, pos)
+                if not match:
+                    # Keep a possible partial end tag for the next chunk
+                    keep = 0 if final else len(self._raw_text_end.pattern)
+                    safe = max(pos, len(buffer) - keep)
+                    out.append(buffer[pos:safe])
+                    pos = safe
+                    break
+                out.append(buffer[pos:match.start()])
+                pos = match.start()
+                self._raw_text_end = None
+                continue
+
+            lt = buffer.find("<", pos)
+            if lt == -1:
+                out.append(buffer[pos:])
+                pos = len(buffer)
+                break
+
+            out.append(buffer[pos:lt])
+            pos = lt
+
+            if buffer.startswith("<!--", lt):
+                end = buffer.find("-->", lt + 4)
+                if end == -1:
+                    break
+                out.append(buffer[lt:end + 3])
+                pos = end + 3
+                continue
+
+            if buffer.startswith(("<!", "<?"), lt):
+                end = buffer.find(">", lt)
+                if end == -1:
+                    break
+                out.append(buffer[lt:end + 1])
+                pos = end + 1
+                continue
+
+            name_match = TAG_NAME.match(buffer, lt)
+            if not name_match:
+                if not final and len(buffer) - lt < 3:
+                    break  # "<" or "</" at the end of the chunk
+                out.append("<")
+                pos = lt + 1
+                continue
+
+            end = self._find_tag_end(lt)
+            if end == -1:
+                break
+
+            tag = buffer[lt:end]
+            name = name_match.group(1).lower()
+            if tag.startswith("</"):
+                out.append(self._end_tag(name, tag))
+            else:
+                out.append(self._start_tag(name, tag))
+                if name in RAW_TEXT_ELEMENTS and not tag.endswith("/>"):
+                    self._raw_text_end = re.compile(f"</{re.escape(name)}", re.IGNORECASE)
+            pos = end
+
+        self._buffer = buffer[pos:]
+        if final and self._buffer:
+            out.append(self._buffer)
+            self._buffer = ""
+        return "".join(out)
+
+    def feed(self, text: str) -> str:
+        """
+        Feeds the next chunk of decoded HTML and returns the output that is ready.
+        """
+        self._buffer += text
+        return self._process(final=False)
+
+    def close(self) -> str:
+        """
+        Flushes the remaining input and appends anything not injected yet.
+        """
+        out = self._process(final=True)
+        if not self._head_opened:
+            out += self._synthesized_head()
+        elif not self._head_closed:
+            self._head_closed = True
+            out += self._head_end_markup()
+        if not self._body_closed:
+            self._body_closed = True
+            out += self._body_end_markup()
+        return out
+
+
+def rewrite_chunks(chunks: Iterable[bytes], encoding: str, url: str, base_host: str) -> Iterator[str]:
+    """
+    Decodes and rewrites upstream HTML chunk by chunk.
+    """
+    decoder = codecs.getincrementaldecoder(_codec(encoding))(errors="replace")
+    rewriter = StreamingRewriter(url, base_host)
+    for chunk in chunks:
+        out = rewriter.feed(decoder.decode(chunk))
+        if out:
+            yield out
+    yield rewriter.feed(decoder.decode(b"", final=True)) + rewriter.close()
+
+
+def _codec(encoding: str) -> str:
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return "utf-8"
@@ -0,0 +1,634 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+from services.shared_state import SharedState
+from services.metrics import UPSTREAM_FETCH, UPSTREAM_BYTES, UPSTREAM_ABORTS, ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Responses of these types are pages; anything else is passed through unchanged
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+
+class UpstreamAborted(Exception):
+    """
+    The upstream fetch was cut short: the body exceeded the size cap or the
+    total deadline passed.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class NotHTMLError(Exception):
+    """
+    Upstream answered with something other than HTML (a PDF, an image).
+    The body is not read, so the caller can stream it through instead.
+    """
+
+    def __init__(self, url: str, content_type: str):
+        super().__init__(f"{url} is not HTML ({content_type or 'unknown type'})")
+        self.url = url
+        self.content_type = content_type
+
+
+def is_html(content_type: str, head: bytes = b"") -> bool:
+    """
+    Decides from the Content-Type, or when it is missing from the first
+    bytes of the body, whether a response is an HTML page.
+    """
+    if content_type:
+        return content_type.split(";", 1)[0].strip().lower() in HTML_TYPES
+    start = head.lstrip(b"\xef\xbb\xbf \t\r\n")[:512].lower()
+    return not start or start.startswith((b"<!doctype html", b"<html", b"<head", b"<body", b"<!--")) or b"<html" in start
+
+
+@dataclass
+class CachedPage:
+    """
+    Upstream response body plus the validators needed to revalidate it.
+    """
+    url: str
+    content: bytes = field(repr=False)
+    encoding: str
+    content_type: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    max_age: float
+    stale_while_revalidate: float = 0.0
+    must_revalidate: bool = False
+    # Identifies this upstream version: the ETag, or a hash of the body
+    version: str = ""
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.age < self.max_age
+
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """
+    Parses a Cache-Control header into a {directive: value} dict.
+    """
+    directives = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _seconds(value: Optional[str]) -> float:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PageCache:
+    """
+    In-process HTTP cache for upstream pages fetched by ProxyService.
+
+    Honors Cache-Control, Expires, ETag and Last-Modified. Stale entries are
+    revalidated with If-None-Match / If-Modified-Since; within the
+    stale-while-revalidate window (the larger of `max_stale` and the
+    response's own directive) they are served immediately while the refresh
+    runs in the background. `no-cache` pages are stale right away, so they
+    are always refreshed but may still be served from that window;
+    `must-revalidate` and `no-store` opt out of it. Entries are evicted
+    LRU-first once the byte budget is exceeded. With `directory` set, bodies
+    are also persisted to disk and survive restarts.
+
+    Bodies are read as a stream: a response over `max_body` bytes or one
+    still incomplete after `total_timeout` seconds (e.g. a slow-drip server)
+    is aborted, and non-HTML responses raise NotHTMLError before their body
+    is downloaded.
+
+    With `shared` set (multi-worker mode), pages are persisted in the shared
+    database instead of `directory`, bounded by the same byte budget, and
+    each worker keeps its in-memory LRU in front of it. A worker whose copy
+    is stale first looks for a newer one stored by another worker, and only
+    one worker at a time fetches a given URL upstream.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_stale: float = 300.0,
+        default_ttl: float = 0.0,
+        directory: Optional[str] = None,
+        max_body: int = 10 * 1024 * 1024,
+        total_timeout: float = 30.0,
+        shared: Optional[SharedState] = None
+    ):
+        """
+        Args:
+            max_bytes: Memory budget for cached bodies
+            max_stale: How long past expiry a page may still be served while it is revalidated
+            default_ttl: Freshness lifetime for responses without any caching headers
+            directory: Optional directory for disk persistence
+            max_body: Largest upstream page that is downloaded (decoded bytes)
+            total_timeout: Deadline for the whole upstream request including the body
+            shared: Shared database of the worker processes (replaces `directory`)
+        """
+        self.max_bytes = max_bytes
+        self.max_stale = max_stale
+        self.default_ttl = default_ttl
+        self.directory = directory
+        self.max_body = max_body
+        self.total_timeout = total_timeout
+        self.shared = shared
+
+        self.requests = 0
+        self.served_from_cache = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.aborted = 0
+        self.passed_through = 0
+
+        self._entries: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._total_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: set = set()
+
+        self._db = None
+        if shared:
+            self.directory = None
+            self._db = shared.connect()
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, meta TEXT NOT NULL, body BLOB NOT NULL, size INTEGER NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS pages_stored_at ON pages (stored_at)")
+            self._db.commit()
+        elif directory:
+            os.makedirs(directory, exist_ok=True)
+
+    async def fetch(self, client: httpx.AsyncClient, url: str) -> CachedPage:
+        """
+        Returns the page for `url`, from cache when possible.
+
+        Raises httpx errors like client.get() would when there is nothing
+        usable in the cache.
+        """
+        self.requests += 1
+        entry = self._get(url)
+
+        if entry and entry.is_fresh:
+            self.hits += 1
+            self.served_from_cache += 1
+            self.bytes_saved += len(entry.content)
+            return entry
+
+        if entry and self._can_serve_stale(entry):
+            self.stale_hits += 1
+            self.served_from_cache += 1
+            self._revalidate_in_background(client, url, entry)
+            return entry
+
+        page = await self._single_flight(url, lambda: self._request(client, url, entry))
+        if entry is not None and page is entry:
+            # Revalidated (304) or stale-if-error
+            self.served_from_cache += 1
+        return page
+
+    def _can_serve_stale(self, entry: CachedPage) -> bool:
+        if entry.must_revalidate:
+            return False
+        stale_for = entry.age - entry.max_age
+        return stale_for < max(self.max_stale, entry.stale_while_revalidate)
+
+    def _revalidate_in_background(self, client: httpx.AsyncClient, url: str, entry: CachedPage):
+        if url in self._inflight:
+            return
+
+        async def refresh():
+            try:
+                await self._single_flight(url, lambda: self._request(client, url, entry))
+            except Exception as e:
+                logger.warning(f"Background revalidation failed for {url}: {e}")
+
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _single_flight(self, url: str, request) -> CachedPage:
+        """
+        Makes sure only one upstream request per URL is in flight.
+        """
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        inflight = asyncio.get_running_loop().create_future()
+        self._inflight[url] = inflight
+        try:
+            if self.shared:
+                # Other workers wait for the copy this one stores, and vice versa
+                since = time.time()
+                entry = await self.shared.single_flight(f"page:{url}", lambda: self._stored_since(url, since), request)
+            else:
+                entry = await request()
+            inflight.set_result(entry)
+            return entry
+        except Exception as e:
+            inflight.set_exception(e)
+            # Mark retrieved so waiters without interest don't log "never retrieved"
+            inflight.exception()
+            raise
+        finally:
+            self._inflight.pop(url, None)
+
+    async def _request(self, client: httpx.AsyncClient, url: str, entry: Optional[CachedPage]) -> CachedPage:
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        started = time.perf_counter()
+        try:
+            response, content = await asyncio.wait_for(self._download(client, url, headers), self.total_timeout)
+        except NotHTMLError:
+            self.passed_through += 1
+            UPSTREAM_FETCH.observe(time.perf_counter() - started, status="passthrough")
+            raise
+        except (httpx.HTTPError, UpstreamAborted, asyncio.TimeoutError) as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = UpstreamAborted("timeout", f"No complete response from {url} within {self.total_timeout:g}s")
+            if isinstance(e, httpx.TimeoutException):
+                UPSTREAM_ABORTS.inc(reason="connect_timeout" if isinstance(e, httpx.ConnectTimeout) else "read_timeout")
+            elif isinstance(e, UpstreamAborted):
+                self.aborted += 1
+                UPSTREAM_ABORTS.inc(reason=e.reason)
+            UPSTREAM_FETCH.observe(time.perf_counter() - started, status="aborted" if isinstance(e, UpstreamAborted) else "error")
+            ERRORS.inc(stage="upstream")
+            if entry:
+                # stale-if-error: an old page beats an error page
+                logger.warning(f"Upstream unreachable ({e}), serving stale copy of {url}")
+                return entry
+            raise e
+        UPSTREAM_FETCH.observe(time.perf_counter() - started, status=str(response.status_code))
+        UPSTREAM_BYTES.inc(len(content))
+
+        if response.status_code == 304 and entry:
+            self.revalidated += 1
+            self.bytes_saved += len(entry.content)
+            self._refresh_freshness(entry, response)
+            return entry
+
+        if response.status_code >= 500 and entry:
+            logger.warning(f"Upstream returned {response.status_code}, serving stale copy of {url}")
+            return entry
+
+        response.raise_for_status()
+        self.misses += 1
+
+        page, store = self._build_entry(url, response, content)
+        if store:
+            self._put(url, page)
+        else:
+            self._remove(url)
+        return page
+
+    async def _download(self, client: httpx.AsyncClient, url: str, headers: Dict[str, str]):
+        """
+        Streams the response body, stopping as soon as it is known to be
+        too large or not HTML. Returns (response, body).
+        """
+        async with client.stream("GET", url, headers=headers) as response:
+            content_type = response.headers.get("content-type", "")
+            ok = 200 <= response.status_code < 300
+            if ok and content_type and not is_html(content_type):
+                raise NotHTMLError(url, content_type)
+
+            length = response.headers.get("content-length", "")
+            if length.isdigit() and int(length) > self.max_body:
+                raise UpstreamAborted("too_large", f"{url} is {int(length)} bytes, limit {self.max_body}")
+
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                if ok and not chunks and not content_type and not is_html("", chunk):
+                    raise NotHTMLError(url, content_type)
+                size += len(chunk)
+                if size > self.max_body:
+                    # Counts decoded bytes, so compressed bombs are cut off too
+                    raise UpstreamAborted("too_large", f"{url} exceeds {self.max_body} bytes")
+                chunks.append(chunk)
+            return response, b"".join(chunks)
+
+    def _freshness(self, response: httpx.Response) -> Dict[str, object]:
+        """
+        Derives freshness lifetime and revalidation rules from response headers.
+        """
+        cache_control = parse_cache_control(response.headers.get("cache-control", ""))
+
+        if "no-store" in cache_control or response.headers.get("vary", "").strip() == "*":
+            return {"store": False}
+
+        if "no-cache" in cache_control:
+            max_age = 0.0
+        elif "s-maxage" in cache_control:
+            max_age = _seconds(cache_control["s-maxage"])
+        elif "max-age" in cache_control:
+            max_age = _seconds(cache_control["max-age"])
+        elif "expires" in response.headers:
+            try:
+                expires = parsedate_to_datetime(response.headers["expires"]).timestamp()
+                max_age = max(0.0, expires - time.time())
+            except (TypeError, ValueError):
+                max_age = 0.0
+        elif "last-modified" in response.headers:
+            # RFC 9111 heuristic: 10% of the time since the last modification
+            try:
+                modified = parsedate_to_datetime(response.headers["last-modified"]).timestamp()
+                max_age = min(max(0.0, (time.time() - modified) * 0.1), 3600.0)
+            except (TypeError, ValueError):
+                max_age = self.default_ttl
+        else:
+            max_age = self.default_ttl
+
+        return {
+            "store": True,
+            "max_age": max_age,
+            "stale_while_revalidate": _seconds(cache_control.get("stale-while-revalidate")),
+            "must_revalidate": "must-revalidate" in cache_control or "proxy-revalidate" in cache_control,
+        }
+
+    def _build_entry(self, url: str, response: httpx.Response, content: bytes):
+        """
+        Returns (page, store) where store says whether the response may be cached.
+        """
+        freshness = self._freshness(response)
+        etag = response.headers.get("etag")
+        page = CachedPage(
+            url=url,
+            content=content,
+            encoding=response.encoding or "utf-8",
+            content_type=response.headers.get("content-type", ""),
+            etag=etag,
+            last_modified=response.headers.get("last-modified"),
+            stored_at=time.time(),
+            max_age=freshness.get("max_age", 0.0),
+            stale_while_revalidate=freshness.get("stale_while_revalidate", 0.0),
+            must_revalidate=freshness.get("must_revalidate", False),
+            version=etag or hashlib.sha256(content).hexdigest(),
+        )
+        return page, freshness["store"]
+
+    def _refresh_freshness(self, entry: CachedPage, response: httpx.Response):
+        freshness = self._freshness(response)
+        entry.stored_at = time.time()
+        if freshness["store"]:
+            entry.max_age = freshness["max_age"]
+            entry.stale_while_revalidate = freshness["stale_while_revalidate"]
+            entry.must_revalidate = freshness["must_revalidate"]
+        entry.etag = response.headers.get("etag", entry.etag)
+        entry.last_modified = response.headers.get("last-modified", entry.last_modified)
+        self._write_disk(entry)
+
+    def _get(self, url: str) -> Optional[CachedPage]:
+        entry = self._entries.get(url)
+        if self._db and (entry is None or not entry.is_fresh):
+            # Another worker may have fetched or revalidated the page since
+            stored = self._read_disk(url)
+            if stored and (entry is None or stored.stored_at > entry.stored_at):
+                self._put(url, stored, persist=False)
+                entry = stored
+        elif entry is None and self.directory:
+            entry = self._read_disk(url)
+            if entry:
+                self._put(url, entry, persist=False)
+        if entry:
+            self._entries.move_to_end(url)
+        return entry
+
+    def _stored_since(self, url: str, since: float) -> Optional[CachedPage]:
+        """
+        Returns the shared copy of `url` if another worker stored it after `since`.
+        """
+        stored = self._read_disk(url)
+        if stored is None or stored.stored_at < since:
+            return None
+        self._put(url, stored, persist=False)
+        return stored
+
+    def _remove(self, url: str):
+        old = self._entries.pop(url, None)
+        if old:
+            self._total_bytes -= len(old.content)
+            self._remove_disk(url)
+
+    def _put(self, url: str, entry: CachedPage, persist: bool = True):
+        if len(entry.content) > self.max_bytes:
+            return
+
+        old = self._entries.pop(url, None)
+        if old:
+            self._total_bytes -= len(old.content)
+
+        self._entries[url] = entry
+        self._total_bytes += len(entry.content)
+
+        while self._total_bytes > self.max_bytes and self._entries:
+            evicted_url, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted.content)
+            if not self._db:
+                # The shared table has its own budget (see _write_shared)
+                self._remove_disk(evicted_url)
+
+        if persist:
+            self._write_disk(entry)
+
+    # Disk persistence: <sha256(url)>.body + <sha256(url)>.json, or the
+    # `pages` table of the shared database
+
+    def _disk_path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _write_disk(self, entry: CachedPage):
+        if self._db:
+            self._write_shared(entry)
+            return
+        if not self.directory:
+            return
+        path = self._disk_path(entry.url)
+        try:
+            with open(f"{path}.body.tmp", "wb") as f:
+                f.write(entry.content)
+            os.replace(f"{path}.body.tmp", f"{path}.body")
+
+            meta = asdict(entry)
+            meta.pop("content")
+            with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(f"{path}.json.tmp", f"{path}.json")
+        except OSError as e:
+            logger.warning(f"Failed to persist cached page {entry.url}: {e}")
+
+    def _read_disk(self, url: str) -> Optional[CachedPage]:
+        if self._db:
+            row = self._db.execute("SELECT meta, body FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            meta, content = json.loads(row[0]), bytes(row[1])
+        else:
+            path = self._disk_path(url)
+            try:
+                with open(f"{path}.json", "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(f"{path}.body", "rb") as f:
+                    content = f.read()
+            except (OSError, ValueError):
+                return None
+        page = CachedPage(content=content, **meta)
+        page.version = page.version or page.etag or hashlib.sha256(content).hexdigest()
+        return page
+
+    def _remove_disk(self, url: str):
+        if self._db:
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._db.commit()
+            return
+        if not self.directory:
+            return
+        path = self._disk_path(url)
+        for suffix in (".body", ".json"):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+
+    def _write_shared(self, entry: CachedPage):
+        """
+        Stores the page in the shared table, dropping the oldest pages once
+        the table exceeds the byte budget.
+        """
+        meta = asdict(entry)
+        meta.pop("content")
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, meta, body, size, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (entry.url, json.dumps(meta), entry.content, len(entry.content), entry.stored_at)
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total > self.max_bytes:
+                for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY stored_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                    total -= size
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to store shared page {entry.url}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": round(self.served_from_cache / self.requests, 3) if self.requests else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "aborted": self.aborted,
+            "passed_through": self.passed_through,
+            "pages": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    async def close(self):
+        for task in list(self._background):
+            task.cancel()
+
+
+class RenderCache:
+    """
+    Cache of the final rewritten HTML served by /read/.
+
+    The output depends only on the upstream body, the page URL and the proxy
+    base host, so entries are keyed on (url, base_host) and tagged with the
+    upstream version they were rendered from. A lookup with a different
+    version drops the old document. Memory is bounded by a byte budget with
+    LRU eviction.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, url: str, base_host: str, version: str) -> Optional[str]:
+        key = (url, base_host)
+        entry = self._entries.get(key)
+
+        if entry and entry[0] == version:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        if entry:
+            # Upstream changed since this document was rendered
+            self.invalidations += 1
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    def put(self, url: str, base_host: str, version: str, html: str):
+        size = len(html)
+        if size > self.max_bytes:
+            return
+
+        key = (url, base_host)
+        self._drop(key)
+        self._entries[key] = (version, html)
+        self._total_bytes += size
+
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted)
+
+    def _drop(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total_bytes -= len(entry[1])
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / requests, 3) if requests else 0.0,
+            "documents": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
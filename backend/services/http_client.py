@@ -0,0 +1,226 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+import ipaddress
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import httpcore
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class DNSCache:
+    """
+    Caches name resolution for outbound connections.
+
+    getaddrinfo() runs in a thread and can take tens of milliseconds per
+    lookup; news pages send every reader to the same few hosts, so answers
+    are kept for `ttl` seconds (the system resolver does not expose record
+    TTLs). Concurrent lookups of one host share a single resolution, and a
+    host whose addresses all refuse connections is resolved again.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """
+        Returns the addresses of `host`, IPv4 first. IP literals are returned as is.
+        """
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        key = (host, port)
+        entry = self._entries.get(key)
+        if entry and time.monotonic() < entry[0]:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._lookup(host, port))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _lookup(self, host: str, port: int) -> List[str]:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            self.failures += 1
+            raise
+        addresses = []
+        for family, _, _, _, sockaddr in sorted(infos, key=lambda info: info[0] != socket.AF_INET):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+
+        if len(self._entries) >= self.max_entries:
+            now = time.monotonic()
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host: str, port: int):
+        self._entries.pop((host, port), None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "hosts": len(self._entries),
+            "ttl": self.ttl,
+        }
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend that connects to addresses from a DNSCache.
+
+    Only the TCP connect uses the cached address; TLS still verifies and
+    sends SNI for the original host name.
+    """
+
+    def __init__(self, dns: DNSCache, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.dns = dns
+        self.backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None,
+                          socket_options=None) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await asyncio.wait_for(self.dns.resolve(host, port), timeout)
+        except asyncio.TimeoutError:
+            raise httpcore.ConnectTimeout(f"Resolving {host} timed out")
+        except OSError as e:
+            raise httpcore.ConnectError(str(e))
+
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                                      socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        # Every cached address failed - the host may have moved
+        self.dns.forget(host, port)
+        raise error or httpcore.ConnectError(f"No addresses for {host}")
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """
+    httpx transport whose connection pool resolves names through a DNSCache.
+
+    httpx does not take a network backend, so the pool is rebuilt with the
+    same settings plus the caching backend.
+    """
+
+    def __init__(self, dns: DNSCache, limits: httpx.Limits, http2: bool = False, retries: int = 0):
+        super().__init__(limits=limits, http2=http2, retries=retries)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            retries=retries,
+            network_backend=CachingNetworkBackend(dns),
+        )
+
+
+class ConnectionSettings:
+    """
+    Outbound connection tuning shared by the proxy and the providers that
+    accept their own HTTP client, read from the environment. Create one per
+    process so all clients share its DNS cache.
+    """
+
+    def __init__(self):
+        self.max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+        self.max_keepalive = int(os.getenv("HTTP_MAX_KEEPALIVE", "100"))
+        self.keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+        self.http2 = os.getenv("HTTP2", "true").lower() in ("1", "true", "yes")
+        self.dns_ttl = float(os.getenv("DNS_CACHE_TTL", "300"))
+        self.retries = int(os.getenv("HTTP_CONNECT_RETRIES", "1"))
+
+        if self.http2 and not http2_available():
+            logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+            self.http2 = False
+
+        self.dns = DNSCache(ttl=self.dns_ttl) if self.dns_ttl > 0 else None
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def async_client(self, **kwargs) -> httpx.AsyncClient:
+        """
+        Creates an async client on a tuned pool (HTTP/2 where the server
+        offers it via ALPN, DNS cache, keepalive).
+        """
+        if self.dns:
+            transport = PooledTransport(self.dns, self.limits, http2=self.http2, retries=self.retries)
+        else:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2, retries=self.retries)
+        return httpx.AsyncClient(transport=transport, **kwargs)
+
+    def sync_client(self, max_connections: int, **kwargs) -> httpx.Client:
+        """
+        Creates a blocking client for SDKs that run in the thread pool
+        (e.g. ElevenLabs), sized to how many calls they make at once.
+        """
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        return httpx.Client(limits=limits, http2=self.http2, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "keepalive_expiry": self.keepalive_expiry,
+            "http2": self.http2,
+            "dns_cache": self.dns.stats() if self.dns else None,
+        }
+
@@ -0,0 +1,375 @@
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+from dataclasses import dataclass, asdict, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from services.shared_state import SharedState, SQLiteWriter
+
+logger = logging.getLogger(__name__)
+
+# Job states in pipeline order
+QUEUED = "queued"
+LLM = "llm"
+TTS_QUEUED = "tts_queued"
+TTS = "tts"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED = (DONE, FAILED)
+
+# How often a job run by another worker is checked for updates (s)
+WATCH_POLL_INTERVAL = 0.5
+
+
+class QueueFullError(Exception):
+    """
+    Raised by JobManager.submit() when too many jobs are waiting.
+    """
+
+
+@dataclass
+class Job:
+    id: str
+    mode: str
+    text: str
+    # URL of the article page, for per-site pre-cleaning
+    source: Optional[str] = None
+    status: str = QUEUED
+    # Progress of the current stage (0-1); for TTS the share of finished segments
+    progress: float = 0.0
+    processed_text: Optional[str] = None
+    audio_file: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    updated_at: float = field(default_factory=time.time)
+    # Seconds spent in each stage: queue, llm, tts_queue, tts
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        """
+        Public view of the job (without the input text).
+        """
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "audio_url": f"/audio/{self.audio_file}" if self.audio_file else None,
+            "processed_text": self.processed_text if self.status == DONE else None,
+            "error": self.error,
+            "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobManager:
+    """
+    Runs the LLM -> TTS pipeline outside of HTTP requests.
+
+    Jobs wait in an LLM queue, are processed by `llm_workers` workers and
+    handed to `tts_workers` TTS workers through a small bounded queue, so LLM
+    workers stop taking new jobs when synthesis falls behind. At most
+    `max_queued` unfinished jobs are accepted; further submissions raise
+    QueueFullError. With `db_path` set, jobs are stored in SQLite and
+    unfinished ones are resumed after a restart. Finished jobs are kept for
+    `retention` seconds.
+
+    With `shared` set (multi-worker mode), jobs are stored in the shared
+    database with every update, so any worker can report a job's status;
+    each worker runs the jobs submitted to it and holds a `job:<id>` lease
+    while they are unfinished. On startup a worker resumes only the
+    unfinished jobs whose owner's lease has expired (it crashed or was
+    replaced).
+    """
+
+    def __init__(
+        self,
+        llm_stage: Callable[[Job], Awaitable[str]],
+        tts_stage: Callable[[str, Callable[[float], None]], Awaitable[Optional[str]]],
+        llm_workers: int = 4,
+        tts_workers: int = 2,
+        max_queued: int = 100,
+        retention: float = 3600.0,
+        db_path: Optional[str] = None,
+        shared: Optional[SharedState] = None
+    ):
+        """
+        Args:
+            llm_stage: Returns the processed text for a job
+            tts_stage: Synthesizes text, returns the audio file name (or None)
+                and reports progress through the callback
+        """
+        self.llm_stage = llm_stage
+        self.tts_stage = tts_stage
+        self.llm_workers = llm_workers
+        self.tts_workers = tts_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.shared = shared
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._started = 0
+        self._queue_wait_total = 0.0
+
+        self._jobs: Dict[str, Job] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._llm_queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self._tts_queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+
+        self._db: Optional[sqlite3.Connection] = None
+        if shared:
+            self._db = shared.connect()
+        elif db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+        if self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        # Progress and status updates are written off the event loop, in order
+        self._writer: Optional[SQLiteWriter] = None
+        if shared:
+            self._writer = shared.writer
+        elif db_path:
+            self._writer = SQLiteWriter(lambda: sqlite3.connect(db_path, check_same_thread=False), "jobs-db")
+
+    def start(self):
+        # Sized here so worker counts changed after construction apply
+        self._tts_queue = asyncio.Queue(maxsize=max(1, self.tts_workers))
+        self._restore()
+        self._workers = [asyncio.create_task(self._llm_worker()) for _ in range(self.llm_workers)]
+        self._workers += [asyncio.create_task(self._tts_worker()) for _ in range(self.tts_workers)]
+        logger.info(f"Job workers started (llm={self.llm_workers}, tts={self.tts_workers}, max_queued={self.max_queued})")
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._writer:
+            await self._writer.drain()
+        self._stopping = False
+
+    def submit(self, text: str, mode: str = "read", source: Optional[str] = None) -> Job:
+        """
+        Queues a job and returns it immediately.
+        """
+        self._prune()
+        if self.pending() >= self.max_queued:
+            self.rejected += 1
+            raise QueueFullError(f"{self.max_queued} jobs already waiting")
+
+        job = Job(id=uuid.uuid4().hex, mode=mode, text=text, source=source)
+        self._jobs[job.id] = job
+        if self.shared:
+            self.shared.try_acquire(f"job:{job.id}")
+        # Written right away, so that other workers know the job as soon as its id is out
+        self._persist(job, wait=True)
+        self._llm_queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.shared:
+            # Submitted to another worker
+            job = self._load(job_id)
+        return job
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    def pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status not in FINISHED)
+
+    async def wait(self, job_id: str) -> Job:
+        """
+        Waits until the job is done or failed.
+        """
+        job = None
+        async for job in self.watch(job_id):
+            pass
+        return job
+
+    async def watch(self, job_id: str) -> AsyncIterator[Job]:
+        """
+        Yields the job now and after every change until it finishes.
+        """
+        if job_id not in self._jobs and self.shared:
+            async for job in self._watch_stored(job_id):
+                yield job
+            return
+
+        while True:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            changed = self._changed.setdefault(job_id, asyncio.Event())
+            yield job
+            if job.status in FINISHED:
+                return
+            await changed.wait()
+
+    async def _watch_stored(self, job_id: str) -> AsyncIterator[Job]:
+        """
+        Follows a job run by another worker by polling the shared database.
+        """
+        updated_at = None
+        while True:
+            job = self._load(job_id)
+            if job is None:
+                return
+            if job.updated_at != updated_at:
+                updated_at = job.updated_at
+                yield job
+            if job.status in FINISHED:
+                return
+            await asyncio.sleep(WATCH_POLL_INTERVAL)
+
+    def _update(self, job: Job, **changes):
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.updated_at = time.time()
+        # Other workers only see progress through the database
+        if "status" in changes or job.status in FINISHED or self.shared:
+            self._persist(job)
+        if job.status in FINISHED and self.shared:
+            self.shared.release(f"job:{job.id}")
+
+        changed = self._changed.pop(job.id, None)
+        if changed:
+            changed.set()
+
+    async def _llm_worker(self):
+        while True:
+            job = await self._llm_queue.get()
+            started_at = time.time()
+            self._started += 1
+            self._queue_wait_total += started_at - job.created_at
+            job.timings["queue"] = started_at - job.created_at
+            self._update(job, status=LLM, progress=0.0, started_at=started_at)
+            try:
+                processed_text = await self.llm_stage(job)
+            except asyncio.CancelledError:
+                if self._stopping:
+                    raise
+                # Cancelled from inside the stage (e.g. a shared call); the worker carries on
+                self._fail(job, RuntimeError("Cancelled"))
+                continue
+            except Exception as e:
+                self._fail(job, e)
+                continue
+
+            job.timings["llm"] = time.time() - started_at
+            self._update(job, status=TTS_QUEUED, progress=0.0, processed_text=processed_text)
+            # Blocks while all TTS workers are busy (backpressure)
+            await self._tts_queue.put(job)
+
+    async def _tts_worker(self):
+        while True:
+            job = await self._tts_queue.get()
+            started_at = time.time()
+            job.timings["tts_queue"] = started_at - job.updated_at
+            self._update(job, status=TTS, progress=0.0)
+            try:
+                audio_file = await self.tts_stage(
+                    job.processed_text,
+                    lambda progress: self._update(job, progress=progress)
+                )
+                if not audio_file:
+                    raise RuntimeError("Failed to generate audio")
+            except asyncio.CancelledError:
+                if self._stopping:
+                    raise
+                self._fail(job, RuntimeError("Cancelled"))
+                continue
+            except Exception as e:
+                self._fail(job, e)
+                continue
+
+            self.completed += 1
+            job.timings["tts"] = time.time() - started_at
+            self._update(job, status=DONE, progress=1.0, audio_file=audio_file)
+            logger.info(f"Job {job.id} done in {job.updated_at - job.created_at:.1f}s")
+
+    def _fail(self, job: Job, error: Exception):
+        self.failed += 1
+        logger.error(f"Job {job.id} failed in stage {job.status}: {error}")
+        self._update(job, status=FAILED, error=str(error))
+
+    def _prune(self):
+        """
+        Forgets finished jobs older than `retention`.
+        """
+        cutoff = time.time() - self.retention
+        for job_id in [job.id for job in self._jobs.values() if job.status in FINISHED and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+            self._changed.pop(job_id, None)
+        if self._writer:
+            self._writer.defer(
+                "DELETE FROM jobs WHERE updated_at < ? AND json_extract(data, '$.status') IN (?, ?)",
+                (cutoff, DONE, FAILED)
+            )
+
+    def _persist(self, job: Job, wait: bool = False):
+        if not self._db:
+            return
+        params = (job.id, json.dumps(asdict(job), ensure_ascii=False), job.updated_at)
+        sql = "INSERT OR REPLACE INTO jobs (id, data, updated_at) VALUES (?, ?, ?)"
+        if not wait:
+            self._writer.defer(sql, params)
+            return
+        try:
+            self._db.execute(sql, params)
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to persist job {job.id}: {e}")
+
+    def _restore(self):
+        """
+        Loads stored jobs; unfinished ones start over from the LLM stage
+        (its results are cached, so this is cheap for jobs that got far).
+        """
+        if not self._db:
+            return
+        self._prune()
+        resumed = 0
+        for (data,) in self._db.execute("SELECT data FROM jobs ORDER BY updated_at").fetchall():
+            job = Job(**json.loads(data))
+            if self.shared and (job.status in FINISHED or not self.shared.try_acquire(f"job:{job.id}")):
+                # Finished, or still running in a live worker
+                continue
+            if job.status not in FINISHED:
+                job.status, job.progress = QUEUED, 0.0
+                self._llm_queue.put_nowait(job)
+                resumed += 1
+            self._jobs[job.id] = job
+        if resumed:
+            logger.info(f"Resumed {resumed} unfinished jobs")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._llm_queue.qsize(),
+            "tts_queued": sum(1 for job in self._jobs.values() if job.status == TTS_QUEUED),
+            "in_llm": sum(1 for job in self._jobs.values() if job.status == LLM),
+            "in_tts": sum(1 for job in self._jobs.values() if job.status == TTS),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_queue_wait": round(self._queue_wait_total / self._started, 3) if self._started else 0.0,
+            "max_queued": self.max_queued,
+            "llm_workers": self.llm_workers,
+            "tts_workers": self.tts_workers,
+        }
@@ -1,73 +1,335 @@
-import google.generativeai as genai
 import os
+import re
+import asyncio
+import hashlib
 import logging
+from typing import AsyncIterator, List, Optional
+
+from services.llm_cache import LLMCache, make_llm_key
+from services.preclean import PreCleaner, estimate_tokens, looks_clean, site_of
+from services.ratelimit import RateGovernor
+from services.shared_state import SharedState
+from services.metrics import LLM_CALL, LLM_TOKENS_SAVED, ERRORS
 
 logger = logging.getLogger(__name__)
 
+# Bump when the prompts change so cached results from old prompts are not reused
+PROMPT_VERSION = "1"
+
+CLEAN_PROMPT = """
+You are an expert news reader assistant. Your task is to prepare the following text for Text-to-Speech reading.
+
+Instructions:
+1. Extract the main journalistic content (the story).
+2. REMOVE:
+   - Dates, times, and name days (e.g., "Dnes je pátek...", "Svátek má...").
+   - Weather reports.
+   - Navigation menus, subscribe buttons, ads.
+   - Image captions (unless essential to the story).
+   - Author bylines at the start.
+3. Keep the language Czech (or the original language).
+4. Make the text flow naturally for listening.
+5. Return ONLY the cleaned text. Do not add "Here is the cleaned text:" etc.
+"""
+
+SUMMARIZE_PROMPT = """
+You are an expert news summarizer.
+
+Instructions:
+1. Create a concise summary of the following text in Czech language.
+2. Focus on the most important facts.
+3. Keep it suitable for listening (approx. 3-5 sentences).
+4. Return ONLY the summary.
+"""
+
+SECTION_PROMPT = """
+You are an expert news summarizer. The following text is one section of a longer article.
+
+Instructions:
+1. Summarize this section in Czech language in a few sentences.
+2. Keep all important facts, names and numbers; they will be combined with the other sections.
+3. Return ONLY the summary.
+"""
+
+REDUCE_PROMPT = """
+You are an expert news summarizer. The following text consists of summaries of consecutive sections of one article.
+
+Instructions:
+1. Combine them into one concise summary of the whole article in Czech language.
+2. Focus on the most important facts.
+3. Keep it suitable for listening (approx. 3-5 sentences).
+4. Return ONLY the summary.
+"""
+
+
+def split_sections(text: str, max_chars: int) -> List[str]:
+    """
+    Splits a long article into sections of roughly max_chars/2 to max_chars
+    at paragraph boundaries.
+
+    Where a section ends depends on the content of its last paragraph, not
+    on its offset, so an edit in one part of an updated article changes only
+    the sections around it and the others keep their cached summaries.
+    """
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = " ".join(paragraph.split())
+        # A paragraph over the limit is cut at sentence ends
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(". ", 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            paragraphs.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            paragraphs.append(paragraph)
+
+    sections = []
+    current: List[str] = []
+    size = 0
+    for i, paragraph in enumerate(paragraphs):
+        current.append(paragraph)
+        size += len(paragraph) + 1
+        following = len(paragraphs[i + 1]) if i + 1 < len(paragraphs) else 0
+        boundary = hashlib.md5(paragraph.encode("utf-8")).digest()[0] % 3 == 0
+        if (size >= max_chars // 2 and boundary) or size + following > max_chars:
+            sections.append("\n".join(current))
+            current, size = [], 0
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
 class LLMService:
-    def __init__(self, api_key: str, model: str = 'gemini-2.5-flash'):
+    def __init__(self, api_key: str, model: str = 'gemini-2.5-flash', shared: Optional[SharedState] = None):
+        self.model_name = model
+        self.client = None
         if not api_key:
             logger.warning("Google Gemini API Key not provided!")
         else:
+            # Imported only when configured - the SDK (gRPC, protobuf) is slow to load
+            import google.generativeai as genai
             genai.configure(api_key=api_key)
-        
-        self.model_name = model
-        self.client = genai.GenerativeModel(model_name=model) if api_key else None
+            self.client = genai.GenerativeModel(model_name=model)
+
+        # Results cache - the same article text is only sent to Gemini once
+        # (across all workers when `shared` is set)
+        self.cache = LLMCache(
+            ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000")),
+            db_path=os.getenv("LLM_CACHE_DB") or None,
+            shared=shared
+        )
+
+        # Outbound limits - bursts queue here instead of being throttled by Gemini
+        self.governor = RateGovernor(
+            "gemini",
+            max_in_flight=int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8")),
+            rate=float(os.getenv("GEMINI_RATE_LIMIT", "0")) or None,
+            burst=int(os.getenv("GEMINI_RATE_BURST", "0")) or None,
+            max_retries=int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4")),
+            backoff=float(os.getenv("RATE_LIMIT_BACKOFF", "0.5"))
+        )
+
+        # Long articles are summarized section by section, then combined
+        self.summary_single_max_chars = int(os.getenv("SUMMARY_SINGLE_MAX_CHARS", "20000"))
+        self.summary_section_chars = int(os.getenv("SUMMARY_SECTION_CHARS", "10000"))
+        self.summary_concurrency = int(os.getenv("SUMMARY_CONCURRENCY", "6"))
+
+        # Local pre-cleaning before Gemini: 'llm' always calls Gemini afterwards,
+        # 'local' skips it for articles that are already clean, 'off' disables it
+        self.preclean_mode = os.getenv("PRECLEAN_MODE", "llm").lower()
+        self.precleaner = PreCleaner(
+            min_articles=int(os.getenv("PRECLEAN_MIN_ARTICLES", "3")),
+            shared=shared
+        ) if self.preclean_mode != "off" else None
+        self.local_only = 0
+
+    def _preclean(self, text: str, source: Optional[str]) -> str:
+        """
+        Runs the local pre-cleaning (learning the site's boilerplate on the
+        way) and counts the Gemini input tokens it saved.
+        """
+        if not self.precleaner:
+            return text
+        result = self.precleaner.process(text, source)
+        for reason, chars in result.removed.items():
+            LLM_TOKENS_SAVED.inc(estimate_tokens(chars), reason=reason)
+        return result.text
+
+    def _fallback(self, text: str, source: Optional[str]) -> str:
+        """
+        The pre-cleaned article, for when Gemini fails (without learning or
+        counting it again).
+        """
+        return self.precleaner.clean(text, site_of(source)).text if self.precleaner else text
+
+    def _skip_gemini(self, text: str) -> bool:
+        """
+        In 'local' mode, whether the pre-cleaned article needs no Gemini clean-up.
+        """
+        if self.preclean_mode != "local" or not looks_clean(text):
+            return False
+        self.local_only += 1
+        LLM_TOKENS_SAVED.inc(estimate_tokens(len(text)), reason="local_only")
+        return True
+
+    def _key(self, mode: str, text: str) -> str:
+        return make_llm_key(mode, self.model_name, PROMPT_VERSION, text)
+
+    async def _call(self, mode: str, system_prompt: str, text: str) -> str:
+        """
+        Calls Gemini. Raises on errors and empty responses so that failures
+        are never cached.
+        """
+        with LLM_CALL.time(timing="llm", mode=mode):
+            response = await self.governor.call(
+                lambda: self.client.generate_content_async(f"{system_prompt}\n\nTEXT:\n{text}")
+            )
+        if not response.text:
+            raise ValueError("Empty response from Gemini")
+        return response.text.strip()
+
+    async def _generate(self, mode: str, system_prompt: str, text: str) -> str:
+        """
+        Calls Gemini through the results cache.
+        """
+        return await self.cache.get_or_create(self._key(mode, text), lambda: self._call(mode, system_prompt, text))
 
-    def clean_text(self, text: str) -> str:
+    async def clean_text(self, text: str, source: Optional[str] = None) -> str:
         """
         Uses LLM to clean text for reading (remove dates, weather, etc.)
+        `source` (the article's page URL) enables per-site boilerplate removal.
+
+        The result is cached under the article as extracted: pre-cleaning
+        changes as it learns a site's boilerplate, the key must not.
         """
         if not self.client:
-            return text # Fallback if no API key
-            
-        system_prompt = """
-        You are an expert news reader assistant. Your task is to prepare the following text for Text-to-Speech reading.
-        
-        Instructions:
-        1. Extract the main journalistic content (the story).
-        2. REMOVE:
-           - Dates, times, and name days (e.g., "Dnes je pátek...", "Svátek má...").
-           - Weather reports.
-           - Navigation menus, subscribe buttons, ads.
-           - Image captions (unless essential to the story).
-           - Author bylines at the start.
-        3. Keep the language Czech (or the original language).
-        4. Make the text flow naturally for listening.
-        5. Return ONLY the cleaned text. Do not add "Here is the cleaned text:" etc.
-        """
-        
+            return self._preclean(text, source) # Fallback if no API key
+
+        async def create():
+            precleaned = self._preclean(text, source)
+            if self._skip_gemini(precleaned):
+                return precleaned
+            return await self._call("read", CLEAN_PROMPT, precleaned)
+
         try:
-            response = self.client.generate_content(f"{system_prompt}\n\nTEXT:\n{text}")
-            if response.text:
-                return response.text.strip()
-            return text
+            return await self.cache.get_or_create(self._key("read", text), create)
         except Exception as e:
+            ERRORS.inc(stage="llm")
             logger.error(f"Error calling Gemini: {e}")
-            return text
+            return self._fallback(text, source)
 
-    def summarize_text(self, text: str) -> str:
+    async def summarize_text(self, text: str, source: Optional[str] = None) -> str:
         """
-        Uses LLM to summarize the text.
+        Uses LLM to summarize the text. Cached under the article as
+        extracted, like clean_text().
         """
         if not self.client:
             return "Omlouvám se, ale nemám nastavený API klíč pro sumarizaci."
-            
-        system_prompt = """
-        You are an expert news summarizer. 
-        
-        Instructions:
-        1. Create a concise summary of the following text in Czech language.
-        2. Focus on the most important facts.
-        3. Keep it suitable for listening (approx. 3-5 sentences).
-        4. Return ONLY the summary.
-        """
-        
+
+        async def create():
+            precleaned = self._preclean(text, source)
+            if len(precleaned) <= self.summary_single_max_chars:
+                return await self._call("summarize", SUMMARIZE_PROMPT, precleaned)
+            return await self._map_reduce(precleaned)
+
         try:
-            response = self.client.generate_content(f"{system_prompt}\n\nTEXT:\n{text}")
-            if response.text:
-                return response.text.strip()
+            return await self.cache.get_or_create(self._key("summarize", text), create)
+        except ValueError:
+            ERRORS.inc(stage="llm")
             return "Nepodařilo se vytvořit souhrn."
         except Exception as e:
+            ERRORS.inc(stage="llm")
             logger.error(f"Error calling Gemini: {e}")
             return "Chyba při komunikaci s AI."
+
+    async def _map_reduce(self, text: str) -> str:
+        partials = await self._summarize_sections(text)
+        return await self._generate("summarize_reduce", REDUCE_PROMPT, partials)
+
+    async def _summarize_sections(self, text: str) -> str:
+        """
+        Summarizes the sections of a long article concurrently (at most
+        `summary_concurrency` at a time) and returns the section summaries
+        in order, ready for the reduce step. Each section summary is cached
+        on its own.
+        """
+        sections = split_sections(text, self.summary_section_chars)
+        cached = sum(
+            self.cache.get(self._key("summarize_section", section)) is not None
+            for section in sections
+        )
+        logger.info(f"Summarizing {len(sections)} sections ({cached} cached), {len(text)} chars")
+
+        semaphore = asyncio.Semaphore(self.summary_concurrency)
+
+        async def summarize(section: str) -> str:
+            async with semaphore:
+                return await self._generate("summarize_section", SECTION_PROMPT, section)
+
+        partials = await asyncio.gather(*(summarize(section) for section in sections))
+        return "\n\n".join(partials)
+
+    def cached(self, text: str, mode: str = "read") -> Optional[str]:
+        """
+        Returns the cached result for `mode` without calling Gemini.
+        """
+        mode = "summarize" if mode == "summarize" else "read"
+        return self.cache.get(self._key(mode, text))
+
+    async def stream_text(self, text: str, mode: str = "read", source: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Streams the cleaned text ('read') or the summary ('summarize') as
+        Gemini generates it, so speech synthesis can start on the first
+        sentences. A cached result comes in one piece. Falls back like
+        clean_text()/summarize_text() when the call fails before producing
+        anything; a failure midway is raised.
+        """
+        summarize = mode == "summarize"
+        if not self.client:
+            yield "Omlouvám se, ale nemám nastavený API klíč pro sumarizaci." if summarize else self._preclean(text, source)
+            return
+
+        mode, system_prompt = ("summarize", SUMMARIZE_PROMPT) if summarize else ("read", CLEAN_PROMPT)
+
+        async def generate():
+            precleaned = self._preclean(text, source)
+            if not summarize and self._skip_gemini(precleaned):
+                yield precleaned
+                return
+            source_mode, source_prompt, source_text = mode, system_prompt, precleaned
+            if summarize and len(precleaned) > self.summary_single_max_chars:
+                # Long article: section summaries first, then stream the combined summary
+                source_mode, source_prompt, source_text = "summarize_reduce", REDUCE_PROMPT, await self._summarize_sections(precleaned)
+            with LLM_CALL.time(timing="llm", mode=source_mode):
+                async for piece in self.governor.stream(lambda: self._stream_gemini(f"{source_prompt}\n\nTEXT:\n{source_text}")):
+                    yield piece
+
+        started = False
+        try:
+            # Keyed on the article as extracted, like clean_text()
+            async for piece in self.cache.stream(self._key(mode, text), generate):
+                started = True
+                yield piece
+        except Exception as e:
+            ERRORS.inc(stage="llm")
+            logger.error(f"Error streaming from Gemini: {e}")
+            if started:
+                raise
+            if not summarize:
+                yield self._fallback(text, source)
+            elif isinstance(e, ValueError):
+                yield "Nepodařilo se vytvořit souhrn."
+            else:
+                yield "Chyba při komunikaci s AI."
+
+    async def _stream_gemini(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.client.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def preclean_stats(self) -> Optional[dict]:
+        if not self.precleaner:
+            return None
+        return {**self.precleaner.stats(), "mode": self.preclean_mode, "local_only": self.local_only}
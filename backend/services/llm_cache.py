@@ -0,0 +1,203 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses whitespace so trivially different extractions share a cache entry.
+    """
+    return " ".join(text.split())
+
+
+def make_llm_key(mode: str, model: str, prompt_version: str, text: str) -> str:
+    payload = json.dumps([mode, model, prompt_version, normalize_text(text)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Cache of LLM results keyed on (mode, model, prompt version, text hash).
+
+    Entries expire after `ttl` seconds and the in-memory part is bounded to
+    `max_entries` (LRU). With `db_path` set, results are also stored in
+    SQLite so they survive restarts. Concurrent requests for the same key
+    share a single LLM call.
+
+    With `shared` set, results are stored in the shared database instead
+    and the single call spans all worker processes: a worker that finds
+    another one already asking Gemini waits for its stored result.
+    """
+
+    def __init__(self, ttl: float = 86400.0, max_entries: int = 2000, db_path: Optional[str] = None,
+                 shared: Optional[SharedState] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.shared = shared
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._db: Optional[sqlite3.Connection] = None
+
+        if shared:
+            self._db = shared.connect()
+        elif db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+        if self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry:
+            value, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+
+        if self._db:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row:
+                self._remember(key, row[0], row[1])
+                return row[0]
+
+        return None
+
+    def put(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+
+        if self._db:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to persist LLM result: {e}")
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[str]]) -> str:
+        """
+        Returns the cached result or awaits `create()` and caches it.
+
+        `create()` runs as its own task shared by all concurrent callers of
+        the key, so a caller that is cancelled stops waiting without
+        cancelling the call for the others. Exceptions from `create()` are
+        not cached; they propagate to every caller waiting on the key.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        inflight = asyncio.create_task(self._create(key, create))
+        self._inflight[key] = inflight
+        inflight.add_done_callback(lambda task: self._done(key, task))
+        return await asyncio.shield(inflight)
+
+    async def _create(self, key: str, create: Callable[[], Awaitable[str]]) -> str:
+        if self.shared:
+            value = await self.shared.single_flight(f"llm:{key}", lambda: self.get(key), create)
+        else:
+            value = await create()
+        self.put(key, value)
+        return value
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # don't warn when every caller has gone
+
+    async def stream(self, key: str, create: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        get_or_create() for a streamed result: yields the cached text in one
+        piece, or the result of a call already in flight for the key, or
+        the pieces of `create()` as they arrive.
+
+        The joined text is cached once the stream completes. A stream that
+        fails or is abandoned by the consumer is not cached, and callers
+        waiting on it get an error.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            yield value
+            return
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            yield await asyncio.shield(inflight)
+            return
+
+        self.misses += 1
+        inflight = asyncio.get_running_loop().create_future()
+        self._inflight[key] = inflight
+        pieces = []
+        try:
+            async for piece in create():
+                pieces.append(piece)
+                yield piece
+            value = "".join(pieces).strip()
+            if not value:
+                raise ValueError("Empty response")
+            self.put(key, value)
+            inflight.set_result(value)
+        except BaseException as e:
+            inflight.set_exception(e if isinstance(e, Exception) else RuntimeError("Stream abandoned"))
+            inflight.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses + self.coalesced
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / requests, 3) if requests else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+        if self._db:
+            stats["persisted_entries"] = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return stats
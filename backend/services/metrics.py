@@ -0,0 +1,197 @@
+import time
+import contextlib
+import contextvars
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers cached lookups up to long syntheses
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage timings of the current request, reported in the Server-Timing header
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("timings", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names, rendered in the
+    Prometheus text exposition format.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> Iterable[str]:
+        return []
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> (bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, timing: Optional[str] = None, **labels):
+        """
+        Observes the duration of the block; with `timing` set, also adds it
+        to the Server-Timing header of the current request.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(elapsed, **labels)
+            if timing:
+                record_timing(timing, elapsed)
+
+    def samples(self) -> Iterable[str]:
+        for key, (counts, total, count) in self._values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = 'le="%s"' % _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {bucket_count}"
+            inf = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, inf)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+
+class CallbackMetric(Metric):
+    """
+    Metric whose samples are read at scrape time, e.g. counters a service
+    already keeps in its stats().
+    """
+
+    def __init__(self, name: str, help: str, type: str, labels: Sequence[str], collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        super().__init__(name, help, labels)
+        self.type = type
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect():
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.labels, self._key(labels))} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+UPSTREAM_FETCH = REGISTRY.histogram("vocas_upstream_fetch_seconds", "Upstream page requests", ["status"])
+HTML_REWRITE = REGISTRY.histogram("vocas_html_rewrite_seconds", "Rewriting a proxied page", ["engine"])
+LLM_CALL = REGISTRY.histogram("vocas_llm_seconds", "Gemini calls (cache misses only)", ["mode"])
+TTS_SYNTHESIS = REGISTRY.histogram("vocas_tts_seconds", "Audio synthesis", ["provider", "kind"])
+PROCESS = REGISTRY.histogram("vocas_process_seconds", "Total /api/process latency", ["mode", "stream"])
+TRANSCODE = REGISTRY.histogram("vocas_audio_transcode_seconds", "Converting cached audio to a smaller variant", ["variant"])
+
+UPSTREAM_BYTES = REGISTRY.counter("vocas_upstream_bytes_total", "Bytes downloaded from upstream sites")
+UPSTREAM_ABORTS = REGISTRY.counter("vocas_upstream_aborted_total", "Upstream fetches cut short", ["reason"])
+PASSTHROUGH_BYTES = REGISTRY.counter("vocas_passthrough_bytes_total", "Non-HTML upstream bytes streamed through unchanged")
+PROXIED_BYTES = REGISTRY.counter("vocas_proxied_bytes_total", "Rewritten HTML bytes sent to readers")
+AUDIO_BYTES = REGISTRY.counter("vocas_audio_bytes_total", "Generated audio bytes", ["provider"])
+AUDIO_SERVED_BYTES = REGISTRY.counter("vocas_audio_served_bytes_total", "Audio file bytes sent to readers", ["variant"])
+LLM_TOKENS_SAVED = REGISTRY.counter("vocas_llm_tokens_saved_total", "Estimated Gemini input tokens saved by local pre-cleaning", ["reason"])
+ERRORS = REGISTRY.counter("vocas_errors_total", "Failed pipeline stages", ["stage"])
+
+
+@contextlib.contextmanager
+def request_timings():
+    """
+    Collects stage timings for the current request; yields the list of
+    (name, seconds) pairs.
+    """
+    timings: List[Tuple[str, float]] = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record_timing(name: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    """
+    Formats timings as a Server-Timing header value (durations in ms).
+    """
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,255 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional, Set
+
+from services.jobs import JobManager, QueueFullError, DONE, FAILED
+from services.prefetch import find_article_links
+from services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+# Item states besides the job statuses
+EXTRACTING = "extracting"
+
+# How often a request for an item that is still being extracted looks again
+ITEM_POLL_INTERVAL = 0.2
+
+# Seconds to wait before re-submitting when the job queue is full
+QUEUE_RETRY_DELAY = 1.0
+
+
+@dataclass
+class PlaylistItem:
+    url: str
+    title: Optional[str] = None
+    job_id: Optional[str] = None
+    # Set directly when the audio was already cached, without a job
+    audio_file: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class Playlist:
+    id: str
+    mode: str
+    items: List[PlaylistItem]
+    building: bool = True
+    created_at: float = field(default_factory=time.time)
+
+
+class PlaylistManager:
+    """
+    Turns a list of article URLs (or the top articles of a section page)
+    into an audio playlist.
+
+    Articles are extracted up to `extract_concurrency` at a time and
+    queued in playlist order in the shared JobManager, so the LLM and TTS
+    worker pools bound the work of all playlists and single requests
+    together, and the first item is synthesized first while the rest follow
+    in the background. An article whose processed text and audio are
+    already cached gets its audio file right away, without a job.
+
+    Playlists are kept in memory, or with `shared` in the shared database so
+    that any worker can serve them.
+    """
+
+    def __init__(
+        self,
+        proxy_service,
+        llm_service,
+        tts_service,
+        job_manager: JobManager,
+        max_items: int = 20,
+        extract_concurrency: int = 4,
+        max_playlists: int = 200,
+        shared: Optional[SharedState] = None
+    ):
+        """
+        Args:
+            proxy_service: Fetches pages and extracts articles (page and extraction caches)
+            llm_service: For looking up already processed articles
+            tts_service: For looking up already synthesized audio
+            job_manager: Runs the LLM and TTS stages
+            max_items: Longest playlist
+            extract_concurrency: Articles extracted at once per playlist
+            max_playlists: Playlists kept for later requests (oldest are dropped)
+            shared: Shared database of the worker processes
+        """
+        self.proxy_service = proxy_service
+        self.llm_service = llm_service
+        self.tts_service = tts_service
+        self.job_manager = job_manager
+        self.max_items = max_items
+        self.extract_concurrency = extract_concurrency
+        self.max_playlists = max_playlists
+        self.shared = shared
+
+        self.created = 0
+        self.items = 0
+        self.reused = 0
+        self.failed = 0
+
+        self._playlists: "OrderedDict[str, Playlist]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _save(self, playlist: Playlist):
+        if self.shared:
+            self.shared.put("playlist", playlist.id, asdict(playlist), max_entries=self.max_playlists)
+            return
+        self._playlists[playlist.id] = playlist
+        while len(self._playlists) > self.max_playlists:
+            self._playlists.popitem(last=False)
+
+    def get(self, playlist_id: str) -> Optional[Playlist]:
+        if self.shared:
+            data = self.shared.get("playlist", playlist_id)
+            if data is None:
+                return None
+            data["items"] = [PlaylistItem(**item) for item in data["items"]]
+            return Playlist(**data)
+        return self._playlists.get(playlist_id)
+
+    async def section_links(self, section_url: str, limit: int) -> List[str]:
+        """
+        Returns the top article links of a front or section page, in page order.
+        """
+        page = await self.proxy_service.cache.fetch(self.proxy_service.client, section_url)
+        html = page.content.decode(page.encoding, errors="replace")
+        return find_article_links(html, section_url, min(limit, self.max_items))
+
+    def create(self, urls: List[str], mode: str = "read") -> Playlist:
+        """
+        Creates a playlist and starts building it in the background.
+        """
+        unique = list(OrderedDict.fromkeys(url.strip() for url in urls if url.strip()))
+        playlist = Playlist(id=uuid.uuid4().hex, mode=mode, items=[PlaylistItem(url) for url in unique[:self.max_items]])
+        self._save(playlist)
+        self.created += 1
+        self.items += len(playlist.items)
+
+        task = asyncio.create_task(self._build(playlist))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return playlist
+
+    async def _build(self, playlist: Playlist):
+        semaphore = asyncio.Semaphore(self.extract_concurrency)
+
+        async def extract(url: str) -> Optional[str]:
+            async with semaphore:
+                return await self.proxy_service.extract_article(url)
+
+        # Extraction runs ahead in parallel; jobs are queued strictly in playlist order
+        extractions = [asyncio.create_task(extract(item.url)) for item in playlist.items]
+        try:
+            for item, extraction in zip(playlist.items, extractions):
+                try:
+                    text = await extraction
+                except Exception as e:
+                    logger.warning(f"Playlist {playlist.id}: failed to load {item.url}: {e}")
+                    text = None
+                    item.error = "Failed to load page"
+                if text:
+                    item.title = text.strip().split("\n", 1)[0][:120]
+                    await self._queue(playlist, item, text)
+                elif not item.error:
+                    item.error = "No article found"
+                if item.error:
+                    self.failed += 1
+                self._save(playlist)
+        finally:
+            for extraction in extractions:
+                extraction.cancel()
+            playlist.building = False
+            self._save(playlist)
+
+    async def _queue(self, playlist: Playlist, item: PlaylistItem, text: str):
+        processed_text = self.llm_service.cached(text, playlist.mode)
+        audio_file = await self.tts_service.get_cached_audio(processed_text) if processed_text else None
+        if audio_file:
+            item.audio_file = audio_file
+            self.reused += 1
+            return
+
+        while True:
+            try:
+                item.job_id = self.job_manager.submit(text, playlist.mode, item.url).id
+                return
+            except QueueFullError:
+                # Back off instead of failing the rest of the playlist
+                await asyncio.sleep(QUEUE_RETRY_DELAY)
+
+    def status(self, item: PlaylistItem) -> dict:
+        """
+        Current state of an item: its job status, or 'extracting' / 'done' / 'failed'.
+        """
+        if item.audio_file:
+            return {"status": DONE, "progress": 1.0, "file": item.audio_file}
+        if item.error:
+            return {"status": FAILED, "progress": 0.0, "file": None, "error": item.error}
+        job = self.job_manager.get(item.job_id) if item.job_id else None
+        if job is None:
+            return {"status": EXTRACTING, "progress": 0.0, "file": None}
+        return {"status": job.status, "progress": job.progress, "file": job.audio_file, "error": job.error}
+
+    def to_dict(self, playlist: Playlist) -> dict:
+        items = []
+        for index, item in enumerate(playlist.items):
+            status = self.status(item)
+            items.append({
+                "url": item.url,
+                "title": item.title,
+                "status": status["status"],
+                "progress": round(status["progress"], 3),
+                "error": status.get("error"),
+                "audio_url": f"/api/playlists/{playlist.id}/items/{index}",
+                "ready": status["file"] is not None,
+            })
+        return {
+            "playlist_id": playlist.id,
+            "mode": playlist.mode,
+            "building": playlist.building,
+            "ready": sum(1 for item in items if item["ready"]),
+            "items": items,
+            "m3u_url": f"/api/playlists/{playlist.id}.m3u",
+        }
+
+    async def item_audio(self, playlist_id: str, index: int) -> Optional[str]:
+        """
+        Waits until the item's audio is ready and returns its file name, or
+        None if the item failed.
+
+        Raises:
+            KeyError: Unknown playlist or item
+        """
+        while True:
+            playlist = self.get(playlist_id)
+            if playlist is None or not 0 <= index < len(playlist.items):
+                raise KeyError(f"{playlist_id}/{index}")
+            item = playlist.items[index]
+            if item.audio_file or item.error:
+                return item.audio_file
+            if item.job_id:
+                job = await self.job_manager.wait(item.job_id)
+                return job.audio_file if job and job.status == DONE else None
+            if not playlist.building:
+                return None
+            await asyncio.sleep(ITEM_POLL_INTERVAL)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "items": self.items,
+            "reused_audio": self.reused,
+            "failed_items": self.failed,
+            "building": len(self._tasks),
+        }
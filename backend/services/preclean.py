@@ -0,0 +1,276 @@
+import re
+import time
+import hashlib
+import logging
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, urlencode, parse_qsl
+
+from services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+# Rough Gemini average for Czech text, used to report saved input tokens
+CHARS_PER_TOKEN = 4
+
+MONTHS = "ledna|února|března|dubna|května|června|července|srpna|září|října|listopadu|prosince"
+DAYS = "pondělí|úterý|středa|čtvrtek|pátek|sobota|neděle"
+
+# (reason, pattern, max. line length) - a line up to that length matching
+# the pattern as a whole is dropped; longer lines are story text
+PATTERNS = [
+    ("name_day", re.compile(r"(?:(?:dnes|zítra|včera)\s+)?(?:má|mají|slaví)\s+svátek\s+\S.*", re.I), 80),
+    ("name_day", re.compile(r"svátek\s+(?:má|mají|slaví)\s+\S.*", re.I), 80),
+    ("date", re.compile(r"(?:dnes\s+je\s+)?(?:(?:" + DAYS + r")\s*,?\s*)?\d{1,2}\.\s*(?:\d{1,2}\.|" + MONTHS + r")"
+                        r"\s*(?:\d{4})?\s*(?:,?\s*\d{1,2}:\d{2})?\.?", re.I), 60),
+    ("date", re.compile(r"dnes\s+je\s+(?:" + DAYS + r")\b.*", re.I), 80),
+    ("date", re.compile(r"(?:aktualizováno|publikováno|vydáno|upraveno)\s*:?\s*\d.*", re.I), 80),
+    ("weather", re.compile(r"(?:předpověď\s+)?počasí\b[^.!?]*", re.I), 80),
+    ("weather", re.compile(r"[^.!?]*-?\d+\s*°\s*C\b[^.!?]*", re.I), 80),
+    ("byline", re.compile(r"(?:autor|autorka|autoři|foto|zdroj|video|redakce)\s*:.*", re.I), 120),
+    # Only calls to action that make up the whole line; story sentences
+    # merely mentioning ads, sharing or newsletters are left alone
+    ("subscribe", re.compile(
+        r"(?:přihlaste\s+se\s+k\s+odběru|odebírejte|předplaťte\s+si|sdílejte|sdílet\s+(?:na|přes|článek|e-mailem))\b.*|"
+        r"(?:pokračování\s+článku\s+pod\s+reklamou|reklama|sdílet|"
+        r"(?:přečtěte\s+si|čtěte)\s+(?:také|též|více)|související\s+články)\s*:?", re.I), 80),
+]
+
+# Longest line that is counted towards per-site boilerplate
+MAX_BOILERPLATE_LINE = 320
+
+# Lines that keep an article from counting as clean in local-only mode
+SUSPICIOUS = re.compile(r"https?://|www\.|@|\s[|»›]\s")
+SENTENCE_END = ('.', '!', '?', ':', '"', '“', '”', ')', '…')
+
+
+def site_of(url: Optional[str]) -> Optional[str]:
+    """
+    Host name of an article URL without 'www.', used to group boilerplate per site.
+    """
+    if not url:
+        return None
+    host = urlparse(url if "//" in url else f"//{url}").hostname
+    if not host:
+        return None
+    return host[4:] if host.startswith("www.") else host
+
+
+# Query parameters that do not identify the article
+TRACKING_PARAMS = re.compile(r"utm_\w+|fbclid|gclid|ref|source|pos|share", re.I)
+
+
+def article_key(url: Optional[str]) -> Optional[str]:
+    """
+    Canonical form of an article URL (host without 'www.', path, identifying
+    query parameters), so revisions and re-extractions of one article are
+    counted once towards boilerplate.
+    """
+    site = site_of(url)
+    if not site:
+        return None
+    parts = urlparse(url if "//" in url else f"//{url}")
+    query = sorted((name, value) for name, value in parse_qsl(parts.query) if not TRACKING_PARAMS.fullmatch(name))
+    path = parts.path.rstrip("/") or "/"
+    return f"{site}{path}" + (f"?{urlencode(query)}" if query else "")
+
+
+def estimate_tokens(chars: int) -> int:
+    return chars // CHARS_PER_TOKEN
+
+
+def looks_clean(text: str) -> bool:
+    """
+    Whether the text is plain story text that Gemini would return almost
+    unchanged: every line after the title is a sentence-terminated
+    paragraph, with no links, e-mail addresses or menu separators.
+    """
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    if len(lines) < 2:
+        return False
+    for line in lines[1:]:
+        if SUSPICIOUS.search(line):
+            return False
+        if len(line) < 40 and not line.endswith(SENTENCE_END):
+            return False
+    return True
+
+
+@dataclass
+class PreCleanResult:
+    text: str
+    # Characters removed per reason (name_day, date, weather, byline, subscribe, boilerplate)
+    removed: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def removed_chars(self) -> int:
+        return sum(self.removed.values())
+
+
+class PreCleaner:
+    """
+    Local clean-up of article text before it is sent to Gemini.
+
+    Drops lines matching Czech date, name-day, weather, byline and
+    subscribe patterns, and per-site boilerplate: lines that appeared in
+    at least `min_articles` articles with different URLs on the same site
+    (share buttons, newsletter boxes, the site's standard footer). An
+    article counts once per canonical URL, so updated versions of a live
+    article never turn its own story into boilerplate. The line counts are
+    learned from the articles passing through and kept in SQLite - in
+    memory, or with `shared` in the shared database so all workers learn
+    together.
+    """
+
+    def __init__(self, min_articles: int = 3, max_lines: int = 200000, shared: Optional[SharedState] = None):
+        """
+        Args:
+            min_articles: In how many articles of a site a line must appear to count as boilerplate
+            max_lines: Line fingerprints kept across all sites
+            shared: Shared database of the worker processes
+        """
+        self.min_articles = min_articles
+        self.max_lines = max_lines
+
+        self.articles = 0
+        self.removed: Dict[str, int] = {}
+        self.tokens_in = 0
+
+        self._db = shared.connect() if shared else sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS boilerplate_articles ("
+            "site TEXT NOT NULL, hash TEXT NOT NULL, seen_at REAL NOT NULL, PRIMARY KEY (site, hash));"
+            "CREATE TABLE IF NOT EXISTS boilerplate_lines ("
+            "site TEXT NOT NULL, hash TEXT NOT NULL, articles INTEGER NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (site, hash));"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _lines(text: str) -> List[str]:
+        return [" ".join(line.split()) for line in text.split("\n")]
+
+    @staticmethod
+    def _hash(line: str) -> str:
+        return hashlib.sha1(line.lower().encode("utf-8")).hexdigest()[:16]
+
+    def learn(self, source: str, text: str):
+        """
+        Counts the lines of an article towards its site's boilerplate.
+        Only the first version seen of an article URL is counted; later
+        revisions and re-extractions of the same URL are not.
+        """
+        site, key = site_of(source), article_key(source)
+        if not site:
+            return
+        article = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        now = time.time()
+        try:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO boilerplate_articles (site, hash, seen_at) VALUES (?, ?, ?)", (site, article, now)
+            )
+            if cursor.rowcount <= 0:
+                return
+            hashes = {self._hash(line) for line in self._lines(text) if 2 < len(line) <= MAX_BOILERPLATE_LINE}
+            self._db.executemany(
+                "INSERT INTO boilerplate_lines (site, hash, articles, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(site, hash) DO UPDATE SET articles = articles + 1, updated_at = excluded.updated_at",
+                [(site, line_hash, now) for line_hash in hashes]
+            )
+            self._prune()
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to learn boilerplate for {site}: {e}")
+
+    def _prune(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM boilerplate_lines").fetchone()[0] - self.max_lines
+        if excess <= 0:
+            return
+        # One-off lines go first, oldest first; boilerplate stays
+        self._db.execute(
+            "DELETE FROM boilerplate_lines WHERE rowid IN "
+            "(SELECT rowid FROM boilerplate_lines ORDER BY articles >= ?, updated_at LIMIT ?)",
+            (self.min_articles, excess)
+        )
+        self._db.execute(
+            "DELETE FROM boilerplate_articles WHERE rowid IN "
+            "(SELECT rowid FROM boilerplate_articles ORDER BY seen_at LIMIT "
+            "MAX(0, (SELECT COUNT(*) FROM boilerplate_articles) - ?))",
+            (self.max_lines // 10,)
+        )
+
+    def _boilerplate(self, site: Optional[str]) -> set:
+        if not site:
+            return set()
+        try:
+            rows = self._db.execute(
+                "SELECT hash FROM boilerplate_lines WHERE site = ? AND articles >= ?", (site, self.min_articles)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read boilerplate for {site}: {e}")
+            return set()
+        return {row[0] for row in rows}
+
+    def clean(self, text: str, site: Optional[str] = None) -> PreCleanResult:
+        """
+        Returns the text without pattern and boilerplate lines. Does not
+        learn from it and does not count towards stats().
+        """
+        boilerplate = self._boilerplate(site)
+        kept = []
+        removed: Dict[str, int] = {}
+
+        for line in self._lines(text):
+            if not line:
+                continue
+            reason = None
+            if boilerplate and self._hash(line) in boilerplate:
+                reason = "boilerplate"
+            else:
+                reason = next((name for name, pattern, max_length in PATTERNS
+                               if len(line) <= max_length and pattern.fullmatch(line)), None)
+            if reason:
+                removed[reason] = removed.get(reason, 0) + len(line) + 1
+            else:
+                kept.append(line)
+
+        if not kept:
+            # Nothing recognizable as a story - leave the decision to Gemini
+            return PreCleanResult(text)
+        return PreCleanResult("\n".join(kept), removed)
+
+    def process(self, text: str, source: Optional[str] = None) -> PreCleanResult:
+        """
+        Learns from the article (when its URL is known) and cleans it.
+
+        Args:
+            text: Article text
+            source: URL of the article page
+        """
+        if source:
+            self.learn(source, text)
+        result = self.clean(text, site_of(source))
+
+        self.articles += 1
+        self.tokens_in += estimate_tokens(len(text))
+        for reason, chars in result.removed.items():
+            self.removed[reason] = self.removed.get(reason, 0) + chars
+        return result
+
+    def stats(self) -> dict:
+        removed = sum(self.removed.values())
+        try:
+            sites, lines = self._db.execute(
+                "SELECT COUNT(DISTINCT site), COUNT(*) FROM boilerplate_lines WHERE articles >= ?", (self.min_articles,)
+            ).fetchone()
+        except sqlite3.Error:
+            sites, lines = None, None
+        return {
+            "articles": self.articles,
+            "removed_chars": dict(self.removed),
+            "tokens_saved": estimate_tokens(removed),
+            "saved_ratio": round(estimate_tokens(removed) / self.tokens_in, 3) if self.tokens_in else 0.0,
+            "boilerplate_sites": sites,
+            "boilerplate_lines": lines,
+        }
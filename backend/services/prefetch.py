@@ -0,0 +1,197 @@
+import re
+import asyncio
+import logging
+from html import unescape
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+LINK = re.compile(r'<a\s[^>]*?href\s*=\s*["\']([^"\'#]+)', re.IGNORECASE)
+
+
+def find_article_links(html: str, page_url: str, limit: int) -> List[str]:
+    """
+    Returns up to `limit` links that look like articles, in page order
+    (front pages list the top stories first).
+
+    An article link stays on the same site and has a long slug or an
+    id-like number in its path, which filters out navigation, section and
+    tag pages.
+    """
+    host = urlparse(page_url).netloc.removeprefix("www.")
+    links = []
+
+    for match in LINK.finditer(html):
+        url = urljoin(page_url, unescape(match.group(1)).strip())
+        parsed = urlparse(url)
+
+        if parsed.scheme not in ("http", "https") or parsed.netloc.removeprefix("www.") != host:
+            continue
+
+        path = parsed.path.rstrip("/")
+        last_segment = path.rsplit("/", 1)[-1]
+        if last_segment.count("-") < 3 and not re.search(r"\d{5,}", path):
+            continue
+
+        url = parsed._replace(query="", fragment="").geturl()
+        if url not in links:
+            links.append(url)
+            if len(links) >= limit:
+                break
+
+    return links
+
+
+class PrefetchScheduler:
+    """
+    Periodically warms the LLM-result and audio caches for the top
+    articles of configured front pages, so the first reader of a popular
+    article gets a cache hit instead of the full fetch -> LLM -> TTS chain.
+
+    With `shared` set, only the worker holding the `prefetch` lease runs
+    cycles; another worker takes over if that one dies.
+    """
+
+    def __init__(
+        self,
+        proxy_service,
+        llm_service,
+        tts_service,
+        sources: List[str],
+        interval: float = 900.0,
+        articles_per_source: int = 5,
+        concurrency: int = 2,
+        budget: int = 20,
+        modes: Optional[List[str]] = None,
+        shared: Optional[SharedState] = None
+    ):
+        """
+        Args:
+            sources: Front page URLs to scan
+            interval: Seconds between cycles
+            articles_per_source: Top articles taken from each source
+            concurrency: Articles processed at the same time
+            budget: Max. articles sent through LLM + TTS per cycle
+            modes: Which modes to warm ('read', 'summarize')
+            shared: Shared database of the worker processes
+        """
+        self.proxy_service = proxy_service
+        self.llm_service = llm_service
+        self.tts_service = tts_service
+
+        self.sources = sources
+        self.interval = interval
+        self.articles_per_source = articles_per_source
+        self.concurrency = concurrency
+        self.budget = budget
+        self.modes = modes or ["read"]
+        self.shared = shared
+
+        self.cycles = 0
+        self.warmed = 0
+        self.failed = 0
+
+        # url -> upstream version already warmed
+        self._done: Dict[str, str] = {}
+        self._budget_left = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if not self.sources:
+            logger.info("Prefetch disabled (no PREFETCH_SOURCES)")
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Prefetch started for {len(self.sources)} sources every {self.interval:.0f}s")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if self.shared is None or self.shared.holds("prefetch") or self.shared.try_acquire("prefetch"):
+                try:
+                    await self.run_cycle()
+                except Exception as e:
+                    logger.error(f"Prefetch cycle failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_cycle(self):
+        """
+        Scans all sources and warms caches for new or changed articles.
+        """
+        self.cycles += 1
+        articles = []
+        for source in self.sources:
+            articles.extend(await self._top_articles(source))
+
+        articles = list(dict.fromkeys(articles))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self._budget_left = self.budget
+        warmed_before = self.warmed
+
+        async def warm(url: str):
+            async with semaphore:
+                await self._warm(url)
+
+        await asyncio.gather(*(warm(url) for url in articles))
+
+        # Forget articles that dropped off the front pages
+        self._done = {url: version for url, version in self._done.items() if url in articles}
+        logger.info(f"Prefetch cycle {self.cycles}: {len(articles)} articles, {self.warmed - warmed_before} warmed")
+
+    async def _top_articles(self, source: str) -> List[str]:
+        try:
+            page = await self.proxy_service.cache.fetch(self.proxy_service.client, source)
+        except Exception as e:
+            logger.warning(f"Prefetch could not load {source}: {e}")
+            return []
+        html = page.content.decode(page.encoding, errors="replace")
+        return find_article_links(html, source, self.articles_per_source)
+
+    async def _warm(self, url: str):
+        try:
+            page = await self.proxy_service.cache.fetch(self.proxy_service.client, url)
+            if self._done.get(url) == page.version:
+                return
+            if self._budget_left <= 0:
+                return
+            self._budget_left -= 1
+
+            # Same extraction (and cache) as /api/process?url=, so the LLM
+            # and audio cache keys match what readers will request
+            text = await self.proxy_service.extract_article(url)
+            if not text:
+                self._done[url] = page.version
+                return
+
+            for mode in self.modes:
+                if mode == "summarize":
+                    processed_text = await self.llm_service.summarize_text(text, url)
+                else:
+                    processed_text = await self.llm_service.clean_text(text, url)
+                await self.tts_service.generate_audio(processed_text)
+
+            self._done[url] = page.version
+            self.warmed += 1
+            logger.info(f"Prefetched {url}")
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Prefetch failed for {url}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "sources": len(self.sources),
+            "cycles": self.cycles,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "tracked_articles": len(self._done),
+        }
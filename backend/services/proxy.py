@@ -1,21 +1,81 @@
 import httpx
-from bs4 import BeautifulSoup
+import os
+import time
 import logging
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 from urllib.parse import urljoin, urlparse
 
+from services.http_client import ConnectionSettings, USER_AGENT
+from services.shared_state import SharedState
+from services.http_cache import CachedPage, PageCache, RenderCache, NotHTMLError
+from services.html_rewriter import rewrite_chunks, page_url_script
+from services.extract import ArticleExtractor, ExtractionCache
+from services.metrics import HTML_REWRITE, ERRORS, PASSTHROUGH_BYTES, UPSTREAM_ABORTS
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+# Size of the slices fed to the streaming rewriter
+REWRITE_CHUNK_SIZE = 64 * 1024
+
+# Upstream headers kept on passed-through (non-HTML) responses
+PASSTHROUGH_HEADERS = ("content-type", "content-length", "content-encoding", "content-disposition",
+                       "last-modified", "etag", "cache-control")
+
 logger = logging.getLogger(__name__)
 
+def normalize_url(url: str) -> str:
+    """
+    Adds https:// to scheme-less URLs (e.g. /read/www.ihned.cz).
+    """
+    if not url.startswith('http'):
+        url = 'https://' + url
+    return url
+
 class ProxyService:
-    def __init__(self):
-        self.client = httpx.AsyncClient(
+    def __init__(self, connections: Optional[ConnectionSettings] = None, shared: Optional[SharedState] = None):
+        # Upstream page cache (honors Cache-Control/ETag/Last-Modified), shared
+        # by all workers when `shared` is set
+        self.cache = PageCache(
+            max_bytes=int(os.getenv("PAGE_CACHE_MAX_MB", "64")) * 1024 * 1024,
+            max_stale=float(os.getenv("PAGE_CACHE_MAX_STALE", "300")),
+            default_ttl=float(os.getenv("PAGE_CACHE_DEFAULT_TTL", "0")),
+            directory=os.getenv("PAGE_CACHE_DIR") or None,
+            max_body=int(float(os.getenv("UPSTREAM_MAX_MB", "10")) * 1024 * 1024),
+            total_timeout=float(os.getenv("UPSTREAM_TOTAL_TIMEOUT", "30")),
+            shared=shared
+        )
+        
+        # Non-HTML resources (PDFs, images) larger than this are not proxied
+        self.max_passthrough_bytes = int(float(os.getenv("UPSTREAM_PASSTHROUGH_MAX_MB", "100")) * 1024 * 1024)
+        
+        # Rewritten output per (url, base_host, upstream version)
+        self.render_cache = RenderCache(
+            max_bytes=int(os.getenv("RENDER_CACHE_MAX_MB", "32")) * 1024 * 1024
+        )
+        
+        # Server-side article extraction per (url, upstream version)
+        self.extractor = ArticleExtractor()
+        self.extract_cache = ExtractionCache(
+            max_entries=int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", "500"))
+        )
+        
+        # HTML rewrite engine: 'stream' (tokenizer, incremental) or 'soup' (BeautifulSoup DOM)
+        self.rewriter = os.getenv("HTML_REWRITER", "stream")
+        
+        # Separate connect and per-read timeouts; the total deadline is enforced by the page cache.
+        # The pool (keepalive, HTTP/2, DNS cache) is shared by all upstream requests.
+        self.connections = connections or ConnectionSettings()
+        self.client = self.connections.async_client(
             follow_redirects=True,
-            timeout=30.0,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
+            timeout=httpx.Timeout(
+                float(os.getenv("UPSTREAM_READ_TIMEOUT", "10")),
+                connect=float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+            ),
+            headers={"User-Agent": USER_AGENT}
         )
 
-    def rewrite_links(self, soup: BeautifulSoup, original_url: str, base_host: str) -> None:
+    def rewrite_links(self, soup: "BeautifulSoup", original_url: str, base_host: str) -> None:
         """
         Rewrite all <a href> links to go through the proxy.
         
@@ -40,80 +100,166 @@ class ProxyService:
             # Rewrite to proxy URL with absolute path including Vocas server URL
             a_tag['href'] = f"{base_host}/read/{absolute_url}"
 
-    async def fetch_and_process(self, url: str, base_host: str) -> str:
+    def render(self, content: bytes, encoding: str, url: str, base_host: str) -> str:
         """
-        Fetches the URL, injects overlay, and returns modified HTML.
+        Parses the upstream HTML, injects the overlay and rewrites links.
         """
-        if not url.startswith('http'):
-            url = 'https://' + url
-
-        try:
-            response = await self.client.get(url)
-            response.raise_for_status()
-            
-            # Detect encoding
-            encoding = response.encoding or 'utf-8'
-            
-            soup = BeautifulSoup(response.content, 'html.parser', from_encoding=encoding)
-            
-            # 1. Inject <base> tag so relative links/images work
-            head = soup.find('head')
-            if not head:
-                head = soup.new_tag('head')
-                soup.insert(0, head)
-            
-            # Remove existing base if any
-            existing_base = head.find('base')
-            if existing_base:
-                existing_base.decompose()
-                
-            new_base = soup.new_tag('base', href=url)
-            head.insert(0, new_base)
-
-            # Add referrer policy to help load assets
-            meta_referrer = soup.new_tag('meta', attrs={'name': 'referrer', 'content': 'no-referrer'})
-            head.insert(0, meta_referrer)
+        # Only the 'soup' engine needs BeautifulSoup, so it is imported here
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(content, 'html.parser', from_encoding=encoding)
+        
+        # 1. Inject <base> tag so relative links/images work
+        head = soup.find('head')
+        if not head:
+            head = soup.new_tag('head')
+            soup.insert(0, head)
+        
+        # Remove existing base if any
+        existing_base = head.find('base')
+        if existing_base:
+            existing_base.decompose()
             
-            # Remove CSP meta tags
-            for meta in soup.find_all('meta', attrs={'http-equiv': 'Content-Security-Policy'}):
-                meta.decompose()
+        new_base = soup.new_tag('base', href=url)
+        head.insert(0, new_base)
 
-            # 2. Inject Vocas Overlay (CSS + JS)
-            # We inject relative paths to our server
-            
-            # CSS
-            css_link = soup.new_tag('link', rel='stylesheet', href=f"{base_host}/static/vocas-overlay.css")
-            head.append(css_link)
-            
-            # Readability JS (CDN for now, or bundled)
-            readability_script = soup.new_tag('script', src="https://unpkg.com/@mozilla/readability@0.4.4/Readability.js")
-            
-            # Vocas Configuration (API URL)
-            config_script = soup.new_tag('script')
-            config_script.string = f'window.VOCAS_API_URL = "{base_host}/api/process";'
+        # Add referrer policy to help load assets
+        meta_referrer = soup.new_tag('meta', attrs={'name': 'referrer', 'content': 'no-referrer'})
+        head.insert(0, meta_referrer)
+        
+        # Remove CSP meta tags
+        for meta in soup.find_all('meta', attrs={'http-equiv': 'Content-Security-Policy'}):
+            meta.decompose()
 
-            # Vocas JS
-            vocas_script = soup.new_tag('script', src=f"{base_host}/static/vocas-overlay.js")
-            
-            body = soup.find('body')
-            if body:
-                body.append(config_script)
-                body.append(readability_script)
-                body.append(vocas_script)
-            else:
-                # Fallback if no body
-                soup.append(config_script)
-                soup.append(readability_script)
-                soup.append(vocas_script)
-
-            # 3. Rewrite all links to go through proxy
-            self.rewrite_links(soup, url, base_host)
-
-            return str(soup)
-
-        except Exception as e:
-            logger.error(f"Proxy error for {url}: {e}")
-            return f"<h1>Error loading page: {e}</h1>"
+        # 2. Inject Vocas Overlay (CSS + JS)
+        # We inject relative paths to our server
+        
+        # CSS
+        css_link = soup.new_tag('link', rel='stylesheet', href=f"{base_host}/static/vocas-overlay.css")
+        head.append(css_link)
+        
+        # Vocas Configuration (API URL, page URL for server-side extraction)
+        config_script = soup.new_tag('script')
+        config_script.string = f'window.VOCAS_API_URL = "{base_host}/api/process";' + page_url_script(url)
+
+        # Vocas JS
+        vocas_script = soup.new_tag('script', src=f"{base_host}/static/vocas-overlay.js")
+        
+        body = soup.find('body')
+        if body:
+            body.append(config_script)
+            body.append(vocas_script)
+        else:
+            # Fallback if no body
+            soup.append(config_script)
+            soup.append(vocas_script)
+
+        # 3. Rewrite all links to go through proxy
+        self.rewrite_links(soup, url, base_host)
+
+        return str(soup)
+
+    async def fetch(self, url: str) -> CachedPage:
+        """
+        Returns the upstream page through the page cache. Raises NotHTMLError
+        for non-HTML resources (see open_passthrough) and fetch errors.
+        """
+        return await self.cache.fetch(self.client, normalize_url(url))
+
+    async def render_stream(self, page: CachedPage, url: str, base_host: str) -> AsyncIterator[str]:
+        """
+        Injects the overlay into a fetched page and yields the modified HTML
+        in chunks (from the render cache when possible).
+        """
+        url = normalize_url(url)
+        html = self.render_cache.get(url, base_host, page.version)
+        if html is not None:
+            yield html
+            return
+
+        if self.rewriter == "soup":
+            try:
+                with HTML_REWRITE.time(timing="rewrite", engine="soup"):
+                    html = self.render(page.content, page.encoding, url, base_host)
+            except Exception as e:
+                ERRORS.inc(stage="rewrite")
+                logger.error(f"Proxy error for {url}: {e}")
+                yield f"<h1>Error loading page: {e}</h1>"
+                return
+            self.render_cache.put(url, base_host, page.version, html)
+            yield html
+            return
+
+        # Streaming engine: output goes out as soon as each slice is rewritten
+        content = memoryview(page.content)
+        slices = (content[i:i + REWRITE_CHUNK_SIZE] for i in range(0, len(content), REWRITE_CHUNK_SIZE))
+        output = []
+        # Only time spent rewriting counts, not waiting for the reader to take the output
+        elapsed = 0.0
+        chunks = rewrite_chunks(slices, page.encoding, url, base_host)
+        while True:
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            elapsed += time.perf_counter() - started
+            if chunk is None:
+                break
+            output.append(chunk)
+            yield chunk
+        HTML_REWRITE.observe(elapsed, engine="stream")
+        self.render_cache.put(url, base_host, page.version, "".join(output))
+
+    async def open_passthrough(self, url: str) -> httpx.Response:
+        """
+        Opens a streamed request for a non-HTML resource. The caller sends
+        its body with passthrough_body(), which also closes it.
+        """
+        request = self.client.build_request("GET", normalize_url(url))
+        return await self.client.send(request, stream=True)
+
+    def passthrough_headers(self, response: httpx.Response) -> dict:
+        return {name: response.headers[name] for name in PASSTHROUGH_HEADERS if name in response.headers}
+
+    def passthrough_too_large(self, response: httpx.Response) -> bool:
+        length = response.headers.get("content-length", "")
+        return length.isdigit() and int(length) > self.max_passthrough_bytes
+
+    async def passthrough_body(self, response: httpx.Response) -> AsyncIterator[bytes]:
+        """
+        Relays the raw (still compressed) upstream body without buffering it.
+        A body without Content-Length that grows over the limit is cut off.
+        """
+        sent = 0
+        try:
+            async for chunk in response.aiter_raw():
+                sent += len(chunk)
+                if sent > self.max_passthrough_bytes:
+                    UPSTREAM_ABORTS.inc(reason="passthrough_too_large")
+                    raise RuntimeError(f"Passthrough of {response.url} exceeds {self.max_passthrough_bytes} bytes")
+                PASSTHROUGH_BYTES.inc(len(chunk))
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def extract_article(self, url: str) -> Optional[str]:
+        """
+        Returns the article text of the page (trafilatura), or None if the
+        page has no article (or is not HTML). The page comes from the page
+        cache, so this is usually free right after /read/ served it. Fetch
+        errors propagate.
+        """
+        url = normalize_url(url)
+        try:
+            page = await self.cache.fetch(self.client, url)
+        except NotHTMLError:
+            return None
+        
+        found, text = self.extract_cache.get(url, page.version)
+        if found:
+            return text
+        
+        text = await self.extractor.extract_async(page.content, url)
+        self.extract_cache.put(url, page.version, text)
+        return text
 
     async def close(self):
+        await self.cache.close()
         await self.client.aclose()
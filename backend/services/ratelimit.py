@@ -0,0 +1,208 @@
+import time
+import random
+import asyncio
+import logging
+import contextlib
+from itertools import count
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Error codes providers use for "slow down" (botocore, google-api-core, ...)
+THROTTLING_CODES = {
+    "ThrottlingException",
+    "Throttling",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "ResourceExhausted",
+    "RESOURCE_EXHAUSTED",
+    "TooManyRequests",
+}
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """
+    Recognizes rate-limit errors of the SDKs we call: HTTP 429 on the error
+    or its response (ElevenLabs, aiohttp, google-api-core) and botocore
+    ClientError codes such as ThrottlingException (Polly).
+    """
+    for name in ("status_code", "status", "code"):
+        value = getattr(error, name, None)
+        if value == 429 or (isinstance(value, str) and value in THROTTLING_CODES):
+            return True
+
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code") in THROTTLING_CODES
+    if getattr(response, "status_code", None) == 429:
+        return True
+
+    return type(error).__name__ in THROTTLING_CODES
+
+
+class RateGovernor:
+    """
+    Limits outbound calls to one provider.
+
+    Calls wait for a free slot and for a token from a bucket refilled at
+    `rate` per second (up to `burst`; no rate limit when `rate` is None).
+    Throttling errors are retried up to `max_retries` times with jittered
+    exponential backoff starting at `backoff` seconds. The backoff pauses
+    every caller of the provider, and the number of slots adapts: it halves
+    on every throttling error and grows back by one after as many successful
+    calls, up to `max_in_flight`. A burst therefore settles at what the
+    provider accepts instead of hammering an API that refuses requests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int = 4,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+        self.limit = max_in_flight
+        self._successes = 0
+        self._slots = asyncio.Condition()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs `fn()` within the limits, retrying it when it is throttled.
+        """
+        for attempt in count():
+            async with self._slot():
+                try:
+                    result = await fn()
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+                else:
+                    self._succeeded()
+                    return result
+            self._pause(attempt)
+
+    async def stream(self, fn: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Iterates `fn()` while holding a slot. A throttled stream is retried
+        only if it failed before yielding anything.
+        """
+        for attempt in count():
+            started = False
+            async with self._slot():
+                try:
+                    async for item in fn():
+                        started = True
+                        yield item
+                except Exception as e:
+                    if started or not self._should_retry(e, attempt):
+                        raise
+                else:
+                    self._succeeded()
+                    return
+            self._pause(attempt)
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        queued_at = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._slots:
+                await self._slots.wait_for(lambda: self.in_flight < self.limit)
+                self.in_flight += 1
+        finally:
+            self.waiting -= 1
+        try:
+            await self._take_token()
+            waited = time.monotonic() - queued_at
+            self.calls += 1
+            self._queue_wait_total += waited
+            self._queue_wait_max = max(self._queue_wait_max, waited)
+            yield
+        finally:
+            async with self._slots:
+                self.in_flight -= 1
+                self._slots.notify_all()
+
+    async def _take_token(self):
+        while True:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if wait <= 0:
+                if self.rate is None:
+                    return
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def _succeeded(self):
+        self._successes += 1
+        if self.limit < self.max_in_flight and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if not is_throttling_error(error):
+            return False
+        self.throttled += 1
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        if attempt >= self.max_retries:
+            self.gave_up += 1
+            logger.warning(f"{self.name}: still throttled after {attempt + 1} attempts, giving up")
+            return False
+        self.retries += 1
+        return True
+
+    def _pause(self, attempt: int):
+        """
+        Pauses all calls for a jittered exponential delay (half fixed, half random).
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        logger.info(f"{self.name}: throttled, backing off {delay:.2f}s")
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "gave_up": self.gave_up,
+            "avg_queue_wait": round(self._queue_wait_total / self.calls, 3) if self.calls else 0.0,
+            "max_queue_wait": round(self._queue_wait_max, 3),
+            "limit": self.limit,
+            "max_in_flight": self.max_in_flight,
+            "rate": self.rate,
+            "burst": self.burst,
+        }
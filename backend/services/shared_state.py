@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, Set, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SQLiteWriter:
+    """
+    Runs SQLite writes on a dedicated thread with its own connection, one
+    at a time and in the order they were submitted, so the event loop
+    never waits for the database lock or a commit.
+
+    Use it for writes nobody waits for (progress, access times, lease
+    releases); a write that must be visible before the caller goes on
+    can still await run().
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], name: str = "sqlite-writer"):
+        """
+        Args:
+            connect: Opens the writer's connection (on first use, in its thread)
+            name: Thread name prefix, for logs and debuggers
+        """
+        self._connect = connect
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self.writes = 0
+        self.failed = 0
+
+    def _run(self, write: Callable[[sqlite3.Connection], Any]) -> Any:
+        if self._db is None:
+            self._db = self._connect()
+        try:
+            result = write(self._db)
+            self._db.commit()
+        except sqlite3.Error:
+            self.failed += 1
+            self._db.rollback()
+            raise
+        self.writes += 1
+        return result
+
+    def submit(self, write: Callable[[sqlite3.Connection], Any]) -> Future:
+        """
+        Queues `write(connection)`; it is committed right after it returns.
+        """
+        return self._executor.submit(self._run, write)
+
+    def defer(self, sql: str, params: tuple = ()):
+        """
+        Queues a statement without waiting for it; failures are logged.
+        """
+        self.submit(lambda db: db.execute(sql, params)).add_done_callback(self._log_failure)
+
+    async def run(self, write: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Queues `write(connection)` and waits for its result without blocking
+        the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(write))
+
+    async def drain(self):
+        """
+        Waits until everything queued so far is written.
+        """
+        await self.run(lambda db: None)
+
+    @staticmethod
+    def _log_failure(future: Future):
+        error = future.exception()
+        if error is not None:
+            logger.warning(f"Deferred database write failed: {error}")
+
+
+class SharedState:
+    """
+    SQLite database (WAL mode) shared by the worker processes of one
+    deployment.
+
+    Services keep what every worker must see in their own tables here (page
+    bodies, LLM results, the audio index, jobs). SharedState itself adds
+    leases - named cross-process locks for single-flight work - and a small
+    key-value table. A lease expires `lease_ttl` seconds after it was last
+    renewed; the owning worker renews all its leases in the background, so
+    the leases of a crashed worker free up within one TTL.
+
+    Create one instance per worker process (after the fork, i.e. without
+    gunicorn's preload_app), since SQLite connections must not be shared
+    across processes.
+
+    `writer` runs writes off the event loop for services that do not need
+    to wait for them. Lease releases and renewals go through it too, so a
+    release queued after a service's deferred writes lands after them.
+    """
+
+    def __init__(self, path: str, lease_ttl: float = 30.0, poll_interval: float = 0.2):
+        """
+        Args:
+            path: Database file, e.g. data/shared.db
+            lease_ttl: Seconds until a lease that is not renewed expires
+            poll_interval: How often a waiting worker checks for the holder's result
+        """
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self.acquired = 0
+        self.waited = 0
+        self.joined = 0
+
+        self._lock = threading.Lock()
+        self._held: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = self.connect()
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key));"
+        )
+        self._db.commit()
+        self.writer = SQLiteWriter(self.connect, "shared-db")
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection to the shared database. WAL lets readers in all
+        workers run alongside the single writer, and the busy timeout makes
+        a writer wait for the lock instead of failing with 'database is
+        locked'.
+        """
+        db = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # Leases
+
+    def _take(self, db: sqlite3.Connection, name: str) -> bool:
+        now = time.time()
+        cursor = db.execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at < ?",
+            (name, self.owner, now + self.lease_ttl, now)
+        )
+        return cursor.rowcount > 0
+
+    def _taken(self, name: str) -> bool:
+        self.acquired += 1
+        self._held.add(name)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._renew())
+        return True
+
+    def try_acquire(self, name: str) -> bool:
+        """
+        Takes the lease `name` unless a live lease of another worker (or an
+        earlier call in this one) holds it. Must be called from the event
+        loop; for callers that need the answer synchronously - async code
+        should use acquire().
+        """
+        if name in self._held:
+            return False
+        with self._lock:
+            taken = self._take(self._db, name)
+            self._db.commit()
+        return self._taken(name) if taken else False
+
+    async def acquire(self, name: str) -> bool:
+        """
+        try_acquire() on the writer thread, queued behind earlier releases.
+        """
+        if name in self._held:
+            return False
+        taken = await self.writer.run(lambda db: self._take(db, name))
+        return self._taken(name) if taken else False
+
+    def release(self, name: str):
+        if name not in self._held:
+            return
+        self._held.discard(name)
+        self.writer.defer("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+    def holds(self, name: str) -> bool:
+        return name in self._held
+
+    def held_elsewhere(self, name: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM leases WHERE name = ? AND owner != ? AND expires_at >= ?",
+                (name, self.owner, time.time())
+            ).fetchone()
+        return row is not None
+
+    async def _renew(self):
+        while self._held:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self.writer.run(lambda db: db.execute(
+                    "UPDATE leases SET expires_at = ? WHERE owner = ?",
+                    (time.time() + self.lease_ttl, self.owner)
+                ))
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to renew leases: {e}")
+
+    async def wait_for(self, name: str, lookup: Callable[[], Optional[T]]) -> Optional[T]:
+        """
+        Waits while another worker holds the lease `name`. Returns `lookup()`
+        as soon as it finds the holder's result, or None once the lease is
+        gone without one (the holder failed, or its result is not cached).
+        """
+        self.waited += 1
+        while True:
+            value = lookup()
+            if value is not None:
+                self.joined += 1
+                return value
+            if not self.held_elsewhere(name):
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    async def single_flight(self, name: str, lookup: Callable[[], Optional[T]], create: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs `create()` in one worker at a time for `name`.
+
+        A worker that finds the lease taken waits for the holder and returns
+        `lookup()` once that finds the result. If the holder ends without
+        one, `create()` runs here anyway, without the lease, so waiters never
+        queue up behind each other for results that are not shared.
+        """
+        if not await self.acquire(name):
+            value = await self.wait_for(name, lookup)
+            if value is not None:
+                return value
+            return await create()
+
+        try:
+            # The previous holder may have finished just before we got the lease
+            value = lookup()
+            if value is not None:
+                return value
+            return await create()
+        finally:
+            self.release(name)
+
+    # Key-value table for small shared records (e.g. pending audio streams)
+
+    def put(self, namespace: str, key: str, value: dict, max_entries: Optional[int] = None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), time.time())
+            )
+            if max_entries:
+                self._db.execute(
+                    "DELETE FROM kv WHERE namespace = ? AND key NOT IN "
+                    "(SELECT key FROM kv WHERE namespace = ? ORDER BY updated_at DESC LIMIT ?)",
+                    (namespace, namespace, max_entries)
+                )
+            self._db.commit()
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def stop(self):
+        """
+        Stops lease renewal and releases this worker's leases.
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for name in list(self._held):
+            self.release(name)
+        await self.writer.drain()
+
+    def stats(self) -> dict:
+        with self._lock:
+            leases = self._db.execute("SELECT COUNT(*) FROM leases WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+        return {
+            "worker": os.getpid(),
+            "path": self.path,
+            "leases_held": len(self._held),
+            "leases_active": leases,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "joined": self.joined,
+            "deferred_writes": self.writer.writes,
+            "failed_writes": self.writer.failed,
+        }
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import logging
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Heavy optional SDKs; the report lists which of them this worker imported
+SDK_MODULES = ["google.generativeai", "edge_tts", "elevenlabs", "boto3", "bs4"]
+
+_imported_at = time.time()
+_ready_at: Optional[float] = None
+
+
+def process_started_at() -> float:
+    """
+    Wall-clock start of this process, read from /proc on Linux so that
+    interpreter startup and all imports are included. Elsewhere the time
+    this module was imported.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name; starttime is field 22 of the full line
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return _imported_at
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def mark_ready():
+    """
+    Records that the worker finished starting up and logs the report.
+    """
+    global _ready_at
+    _ready_at = time.time()
+    summary = report()
+    logger.info(
+        f"Worker {summary['pid']} ready in {summary['ready_seconds']:.2f} s, "
+        f"RSS {summary['rss_mb']} MB, SDKs loaded: {', '.join(summary['sdks_loaded']) or 'none'}"
+    )
+
+
+def report(providers: Optional[dict] = None) -> dict:
+    """
+    Cold start cost of this worker: seconds from process start until
+    mark_ready(), current and peak RSS, the optional SDKs it imported and
+    (when given) the TTS provider registry's load times.
+    """
+    def megabytes(value: Optional[int]) -> Optional[float]:
+        return round(value / (1024 * 1024), 1) if value is not None else None
+
+    return {
+        "pid": os.getpid(),
+        "ready_seconds": round(_ready_at - process_started_at(), 3) if _ready_at else None,
+        "rss_mb": megabytes(rss_bytes()),
+        "peak_rss_mb": megabytes(peak_rss_bytes()),
+        "sdks_loaded": [name for name in SDK_MODULES if name in sys.modules],
+        "tts_providers": providers,
+    }
@@ -2,14 +2,23 @@
 TTS služby pro Vocas 2.0
 """
 import os
+import time
 import uuid
+import asyncio
 import logging
-from typing import Optional
+import contextlib
+from typing import AsyncIterator, Callable, Dict, Optional
 
 from .base import BaseTTS
-from .edge_tts_provider import EdgeTTS
-from .elevenlabs_tts_provider import ElevenLabsTTS
-from .polly_tts_provider import PollyTTS
+from .cache import AudioCache, SharedAudioCache, make_cache_key
+from .chunking import SentenceStream, split_text, strip_id3
+from .failover import ProviderChain, SegmentReplay
+from .registry import ProviderRegistry, registry, register_provider
+from .variants import AudioVariants, default_variants
+from services.ratelimit import RateGovernor
+from services.http_client import ConnectionSettings
+from services.shared_state import SharedState
+from services.metrics import TTS_SYNTHESIS, AUDIO_BYTES, ERRORS
 
 logger = logging.getLogger(__name__)
 
@@ -18,26 +27,99 @@ class TTSService:
     Hlavní TTS služba podporující více providerů.
     """
     
-    def __init__(self, output_dir: str = "static/audio", provider: str = "edge"):
+    def __init__(self, output_dir: str = "static/audio", provider: str = "edge", connections: Optional[ConnectionSettings] = None,
+                 shared: Optional[SharedState] = None):
         """
         Inicializace TTS služby.
         
         Args:
             output_dir: Výstupní složka pro audio soubory
-            provider: TTS provider ('edge', 'elevenlabs', 'polly')
+            provider: TTS provider ('edge', 'elevenlabs', 'polly') nebo
+                      řetězec providerů oddělených čárkou ('edge,polly')
+            connections: Sdílené nastavení odchozích spojení (pro providery,
+                         kteří přijmou vlastního HTTP klienta)
+            shared: Sdílená databáze pracovních procesů (index audio cache
+                    a syntéza každého klíče jen v jednom procesu)
         """
         self.output_dir = output_dir
+        self.connections = connections
         self.provider_name = provider
         os.makedirs(output_dir, exist_ok=True)
         
-        # Inicializace providera
-        self.provider = self._init_provider(provider)
+        # Cache hotových audio souborů (stejný text = stejný soubor)
+        cache_options = dict(
+            max_bytes=int(os.getenv('AUDIO_CACHE_MAX_MB', '500')) * 1024 * 1024,
+            max_files=int(os.getenv('AUDIO_CACHE_MAX_FILES', '5000')),
+            max_age=float(os.getenv('AUDIO_CACHE_MAX_AGE_DAYS', '0')) * 86400 or None,
+            lease=float(os.getenv('AUDIO_CACHE_LEASE', '3600')),
+            sweep_interval=float(os.getenv('AUDIO_CACHE_SWEEP_INTERVAL', '600'))
+        )
+        self.cache = SharedAudioCache(output_dir, shared, **cache_options) if shared else AudioCache(output_dir, **cache_options)
+        
+        # Úspornější varianty (Opus, MP3 s nižším tokem) pro pomalá připojení
+        self.variants = AudioVariants(
+            self.cache,
+            default_variants(
+                opus_bitrate=os.getenv('AUDIO_VARIANT_OPUS_BITRATE', '32k'),
+                low_bitrate=os.getenv('AUDIO_VARIANT_LOW_BITRATE', '64k')
+            ),
+            enabled=[name.strip() for name in os.getenv('AUDIO_VARIANTS', 'opus,low').split(',') if name.strip()],
+            max_concurrency=int(os.getenv('AUDIO_TRANSCODE_CONCURRENCY', '2'))
+        )
+        
+        # Limity dělení textu a souběžnosti (výchozí hodnoty určuje provider)
+        self.chunk_chars = int(os.getenv('TTS_CHUNK_CHARS', '0')) or None
+        self.max_concurrency = int(os.getenv('TTS_MAX_CONCURRENCY', '0')) or None
+        
+        # Inicializace providera (nebo řetězce providerů s failoverem)
+        self.provider_names: Dict[int, str] = {}
+        self.provider = self._init_chain(provider)
+        
+        # Limit požadavků za sekundu (prázdné = výchozí hodnota providera)
+        self.rate_limit = float(os.getenv('TTS_RATE_LIMIT', '0')) or None
+        # Každý provider má vlastní governor, i záložní v řetězci
+        self._governors: Dict[int, RateGovernor] = {}
+        # Běžící hedgované syntézy souborů podle klíče (souběžná volání čekají na jednu)
+        self._hedging: Dict[str, asyncio.Task] = {}
         
         if self.provider:
             logger.info(f"TTS Service initialized with: {self.provider.get_provider_name()}")
         else:
             logger.error(f"Failed to initialize TTS provider: {provider}")
     
+    def _init_chain(self, providers: str):
+        """
+        Inicializuje providery ze seznamu odděleného čárkou.
+        
+        Pro více providerů vrátí ProviderChain s failoverem a hedgingem;
+        provideři, které nelze inicializovat, se přeskočí.
+        
+        Args:
+            providers: Názvy providerů v pořadí priority
+            
+        Returns:
+            Instance TTS providera, ProviderChain nebo None
+        """
+        names = [name.strip() for name in providers.split(',') if name.strip()]
+        chain = []
+        for name in names:
+            instance = self._init_provider(name)
+            if instance:
+                chain.append(instance)
+                self.provider_names[id(instance)] = name
+        
+        if len(chain) <= 1:
+            return chain[0] if chain else None
+        
+        return ProviderChain(
+            chain,
+            hedge=os.getenv('TTS_HEDGE', 'true').lower() in ('1', 'true', 'yes'),
+            hedge_percentile=float(os.getenv('TTS_HEDGE_PERCENTILE', '95')) / 100,
+            hedge_delay=float(os.getenv('TTS_HEDGE_DELAY', '3')),
+            failure_threshold=int(os.getenv('TTS_FAILURE_THRESHOLD', '3')),
+            cooldown=float(os.getenv('TTS_FAILURE_COOLDOWN', '30'))
+        )
+    
     def _init_provider(self, provider: str):
         """
         Inicializuje TTS providera podle názvu.
@@ -48,10 +130,19 @@ class TTSService:
         Returns:
             Instance TTS providera nebo None
         """
+        try:
+            cls = registry.load(provider)
+        except KeyError:
+            logger.error(f"Unknown TTS provider: {provider} (available: {', '.join(registry.names())})")
+            return None
+        except Exception as e:
+            logger.error(f"Error loading TTS provider {provider}: {e}")
+            return None
+        
         try:
             if provider == "edge":
                 # Edge TTS - zdarma, dobré české hlasy
-                return EdgeTTS(
+                return cls(
                     voice=os.getenv('EDGE_VOICE', 'cs-CZ-AntoninNeural'),
                     rate=os.getenv('EDGE_RATE', '+0%'),
                     pitch=os.getenv('EDGE_PITCH', '+0Hz')
@@ -66,10 +157,14 @@ class TTSService:
                     logger.error("ElevenLabs credentials not found in environment")
                     return None
                 
-                return ElevenLabsTTS(
+                return cls(
                     api_key=api_key,
                     voice_id=voice_id,
-                    model_id=os.getenv('ELEVENLABS_MODEL_ID', 'eleven_multilingual_v2')
+                    model_id=os.getenv('ELEVENLABS_MODEL_ID', 'eleven_multilingual_v2'),
+                    http_client=self.connections.sync_client(
+                        self.max_concurrency or cls.max_concurrency,
+                        timeout=240.0
+                    ) if self.connections else None
                 )
             
             elif provider == "polly":
@@ -78,25 +173,27 @@ class TTSService:
                     logger.error("AWS credentials not found in environment")
                     return None
                 
-                return PollyTTS(
+                return cls(
                     voice_id=os.getenv('POLLY_VOICE_ID', 'Iveta'),
-                    region=os.getenv('AWS_REGION', 'eu-central-1')
+                    region=os.getenv('AWS_REGION', 'eu-central-1'),
+                    max_pool_connections=self.max_concurrency or 0
                 )
             
             else:
-                logger.error(f"Unknown TTS provider: {provider}")
-                return None
+                # Provider z jiného balíčku se konfiguruje sám (např. z proměnných prostředí)
+                return cls.from_env() if hasattr(cls, 'from_env') else cls()
                 
         except Exception as e:
             logger.error(f"Error initializing TTS provider {provider}: {e}")
             return None
     
-    def generate_audio(self, text: str) -> Optional[str]:
+    async def generate_audio(self, text: str, on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
         """
         Generuje MP3 audio z textu.
         
         Args:
             text: Text k přečtení
+            on_progress: Volitelný callback s podílem hotových částí (0-1)
             
         Returns:
             str: Název vygenerovaného souboru nebo None při chybě
@@ -109,33 +206,529 @@ class TTSService:
             logger.error("No TTS provider available")
             return None
         
-        filename = f"{uuid.uuid4()}.mp3"
-        output_path = os.path.join(self.output_dir, filename)
+        if isinstance(self.provider, ProviderChain):
+            return await self._generate_hedged(text, on_progress)
+        return await self._generate_with(self.provider, text, on_progress)
+    
+    async def _generate_hedged(self, text: str, on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
+        """
+        Vrátí soubor z cache, nebo ho vygeneruje řetězcem providerů
+        s failoverem a hedgingem celého článku (jako stream_audio()).
+        
+        Souběžná volání pro stejný text čekají na jedinou syntézu, i když
+        audio nakonec vygeneruje záložní provider pod svým klíčem.
+        
+        Args:
+            text: Text k přečtení
+            on_progress: Volitelný callback s podílem hotových částí (0-1)
+            
+        Returns:
+            str: Název souboru nebo None při chybě
+        """
+        key = make_cache_key(text, self.provider.get_cache_params())
+        task = self._hedging.get(key)
+        if task is None:
+            task = self._hedging[key] = asyncio.create_task(self._generate_hedged_once(text, key, on_progress))
+            task.add_done_callback(lambda _: self._hedging.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _generate_hedged_once(self, text: str, key: str,
+                                    on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
+        filename = await self.cache.get_or_create(key, lambda output_path: self._synthesize_hedged(text, key, output_path, on_progress))
+        if filename:
+            return filename
+        # Vyhrál záložní provider - audio je pod jeho klíčem
+        for provider in self.provider.candidates():
+            backup_key = make_cache_key(text, provider.get_cache_params())
+            filename = await self.cache.get(backup_key) if backup_key != key else None
+            if filename:
+                return filename
+        return None
+    
+    async def _generate_with(self, provider: BaseTTS, text: str, on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
+        """
+        Vrátí soubor z cache, nebo ho nechá vygenerovat zadaným providerem.
+        
+        Args:
+            provider: Provider, který celý text přečte
+            text: Text k přečtení
+            on_progress: Volitelný callback s podílem hotových částí (0-1)
+            
+        Returns:
+            str: Název souboru nebo None při chybě
+        """
+        key = make_cache_key(text, provider.get_cache_params())
+        return await self.cache.get_or_create(key, lambda output_path: self._synthesize(provider, text, output_path, on_progress))
+    
+    async def get_cached_audio(self, text: str) -> Optional[str]:
+        """
+        Vrátí již vygenerovaný soubor pro text, pokud existuje.
+        
+        Args:
+            text: Text k přečtení
+            
+        Returns:
+            str: Název souboru nebo None
+        """
+        if not text.strip() or not self.provider:
+            return None
+        
+        key = make_cache_key(text, self.provider.get_cache_params())
+        return await self.cache.get(key)
+    
+    async def stream_audio(self, text: str) -> AsyncIterator[bytes]:
+        """
+        Streamuje MP3 audio z textu, jak ho provider generuje.
         
+        Audio se zároveň zapisuje do cache, takže další požadavek na stejný
+        text už dostane hotový soubor.
+        
+        Args:
+            text: Text k přečtení
+            
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        if not text.strip() or not self.provider:
+            logger.error("Nothing to stream: empty text or no TTS provider")
+            return
+        
+        # Klíč cache i štítek metrik patří providerovi, který audio skutečně vygeneruje
+        key = None
+        tee = None
+        label = None
+        
+        def chosen(provider: BaseTTS):
+            nonlocal key, tee, label
+            label = self._name(provider)
+            candidate = make_cache_key(text, provider.get_cache_params())
+            # Pokud stejný text už někdo syntetizuje, jen ho streamujeme bez ukládání
+            if self.cache.reserve(candidate):
+                key = candidate
+                tee = open(self.cache.temp_path(key), 'wb')
+        
+        success = False
+        
+        started = time.perf_counter()
         try:
-            logger.info(f"Generating audio using {self.provider.get_provider_name()}")
-            self.provider.generate(text, output_path)
+            logger.info(f"Streaming audio using {self.provider.get_provider_name()}")
+            async for chunk in self._stream_article(lambda provider: self._stream_segments(provider, text), chosen):
+                AUDIO_BYTES.inc(len(chunk), provider=label)
+                if tee:
+                    tee.write(chunk)
+                yield chunk
+            success = True
+            TTS_SYNTHESIS.observe(time.perf_counter() - started, provider=label, kind="stream")
+        except Exception as e:
+            ERRORS.inc(stage="tts")
+            logger.error(f"TTS streaming failed: {e}")
+        finally:
+            if tee:
+                tee.close()
+                self.cache.release(key, success)
+    
+    async def _stream_article(self, open_stream: Callable[[BaseTTS], AsyncIterator[bytes]],
+                              on_provider: Optional[Callable[[BaseTTS], None]] = None) -> AsyncIterator[bytes]:
+        """
+        Streamuje audio celého článku od jediného providera; u řetězce
+        providerů s failoverem a hedgingem celého článku, takže se hlasy
+        v jednom audiu nemíchají.
+        
+        Args:
+            open_stream: Spustí syntézu článku u daného providera
+            on_provider: Zavolá se s providerem, jehož audio se použije,
+                         před prvním blokem
+            
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        if isinstance(self.provider, ProviderChain):
+            chunks = self.provider.stream_with(open_stream, on_provider)
+        else:
+            if on_provider:
+                on_provider(self.provider)
+            chunks = open_stream(self.provider)
+        async for chunk in chunks:
+            yield chunk
+    
+    async def _synthesize(self, provider: BaseTTS, text: str, output_path: str,
+                          on_progress: Optional[Callable[[float], None]] = None) -> bool:
+        """
+        Zavolá providera a zapíše audio do zadané cesty.
+        
+        Args:
+            provider: Provider, který celý text přečte
+            text: Text k přečtení
+            output_path: Cesta k výstupnímu souboru
+            on_progress: Volitelný callback s podílem hotových částí (0-1)
+            
+        Returns:
+            bool: True při úspěchu
+        """
+        try:
+            logger.info(f"Generating audio using {provider.get_provider_name()}")
+            
+            with TTS_SYNTHESIS.time(timing="tts", provider=self._name(provider), kind="file"):
+                if len(self._split(text, provider)) == 1:
+                    await self._get_governor(provider).call(lambda: provider.generate_async(text, output_path))
+                else:
+                    with open(output_path, 'wb') as f:
+                        async for chunk in self._stream_segments(provider, text, on_progress):
+                            f.write(chunk)
             
             # Verify file was created
             if not os.path.exists(output_path):
                 logger.error(f"Audio file not created: {output_path}")
-                return None
+                return False
             
             file_size = os.path.getsize(output_path)
-            logger.info(f"Audio generated successfully: {filename} ({file_size} bytes)")
+            AUDIO_BYTES.inc(file_size, provider=self._name(provider))
+            logger.info(f"Audio generated successfully ({file_size} bytes)")
             
-            return filename
+            return True
             
         except Exception as e:
+            ERRORS.inc(stage="tts")
             logger.error(f"TTS Generation failed: {e}")
+            return False
+    
+    async def _synthesize_hedged(self, text: str, key: str, output_path: str,
+                                 on_progress: Optional[Callable[[float], None]] = None) -> bool:
+        """
+        Zapíše audio od providera, který v řetězci první začne odpovídat.
+        
+        Audio vítěze s klíčem `key` jde do `output_path`; audio záložního
+        providera do cache pod jeho vlastním klíčem. Soubor se klientovi
+        posílá až hotový, takže při výpadku uprostřed článku se celý článek
+        zkusí znovu u zbývajících providerů.
+        
+        Args:
+            text: Text k přečtení
+            key: Klíč rezervovaný volajícím (provider, který by text teď syntetizoval)
+            output_path: Dočasná cesta pro `key`
+            on_progress: Volitelný callback s podílem hotových částí (0-1)
+            
+        Returns:
+            bool: True, pokud vzniklo audio pod klíčem `key`
+        """
+        done = 0.0
+        
+        def progress(value: float):
+            # Další pokus začíná od nuly - průběh nesmí couvat
+            nonlocal done
+            if value > done:
+                done = value
+                on_progress(value)
+        
+        tried = []
+        while True:
+            candidates = [provider for provider in self.provider.candidates() if provider not in tried]
+            if not candidates:
+                return False
+            winner = None
+            out = None
+            reserved = None
+            
+            def chosen(provider: BaseTTS):
+                nonlocal winner, out, reserved
+                winner = provider
+                winner_key = make_cache_key(text, provider.get_cache_params())
+                if winner_key == key:
+                    out = open(output_path, 'wb')
+                elif self.cache.reserve(winner_key):
+                    reserved = winner_key
+                    out = open(self.cache.temp_path(winner_key), 'wb')
+            
+            success = False
+            size = 0
+            started = time.perf_counter()
+            chunks = self.provider.stream_with(
+                lambda provider: self._stream_segments(provider, text, progress if on_progress else None),
+                chosen,
+                candidates
+            )
+            try:
+                logger.info(f"Generating audio using {self.provider.get_provider_name()}")
+                async for chunk in chunks:
+                    if out is None:
+                        # Stejný text u záložního providera už vytváří někdo jiný
+                        break
+                    out.write(chunk)
+                    size += len(chunk)
+                success = out is not None
+            except Exception as e:
+                ERRORS.inc(stage="tts")
+                logger.error(f"TTS Generation failed: {e}")
+            finally:
+                await chunks.aclose()
+                if out:
+                    out.close()
+                if reserved:
+                    self.cache.release(reserved, success)
+            
+            if success:
+                AUDIO_BYTES.inc(size, provider=self._name(winner))
+                TTS_SYNTHESIS.observe(time.perf_counter() - started, provider=self._name(winner), kind="file")
+                logger.info(f"Audio generated successfully ({size} bytes)")
+                return reserved is None
+            if winner is None or out is None:
+                # Nikdo nezačal odpovídat (stream_with už zkusil všechny), nebo audio vytváří jiné volání
+                return False
+            tried.append(winner)
+    
+    def _split(self, text: str, provider: Optional[BaseTTS] = None) -> list:
+        """
+        Rozdělí text na části podle limitu providera.
+        
+        Args:
+            text: Text k přečtení
+            provider: Provider, který text přečte (výchozí je nakonfigurovaný)
+            
+        Returns:
+            list: Části textu
+        """
+        return split_text(text, self.chunk_chars or (provider or self.provider).max_chunk_chars) or [text]
+    
+    def _name(self, provider: BaseTTS) -> str:
+        """
+        Vrátí název providera z TTS_PROVIDER (štítek metrik a governoru).
+        """
+        return self.provider_names.get(id(provider)) or provider.get_provider_name()
+    
+    def _primary(self) -> BaseTTS:
+        return self.provider.providers[0] if isinstance(self.provider, ProviderChain) else self.provider
+    
+    def _get_governor(self, provider: Optional[BaseTTS] = None) -> RateGovernor:
+        """
+        Vrátí governor omezující souběžná volání a počet požadavků na providera.
+        
+        Každý provider v řetězci má vlastní governor s vlastními limity;
+        TTS_MAX_CONCURRENCY, TTS_RATE_LIMIT a TTS_RATE_BURST se vztahují
+        k primárnímu providerovi. Při throttlingu (HTTP 429,
+        ThrottlingException) opakuje volání s exponenciálním čekáním.
+        
+        Args:
+            provider: Provider (výchozí je primární)
+            
+        Returns:
+            RateGovernor: Governor sdílený všemi požadavky na providera
+        """
+        provider = provider or self._primary()
+        governor = self._governors.get(id(provider))
+        if governor is None:
+            primary = provider is self._primary()
+            governor = self._governors[id(provider)] = RateGovernor(
+                f"tts:{self._name(provider)}",
+                max_in_flight=(self.max_concurrency if primary else None) or provider.max_concurrency,
+                rate=(self.rate_limit if primary else None) or provider.rate_limit,
+                burst=(int(os.getenv('TTS_RATE_BURST', '0')) if primary else 0) or None,
+                max_retries=int(os.getenv('RATE_LIMIT_MAX_RETRIES', '4')),
+                backoff=float(os.getenv('RATE_LIMIT_BACKOFF', '0.5'))
+            )
+        return governor
+    
+    async def stream_text_audio(self, pieces: AsyncIterator[str]) -> AsyncIterator[bytes]:
+        """
+        Streamuje MP3 audio z textu, který teprve vzniká (např. streamovaná
+        odpověď LLM).
+        
+        Každá hotová věta (resp. skupina vět) se pošle do syntézy, jakmile
+        dorazí, takže první audio začne hrát dřív, než LLM dopíše odpověď,
+        a celková doba se blíží delšímu z obou kroků místo jejich součtu.
+        Po dokončení se audio uloží do cache pod klíčem celého textu, takže
+        další požadavek na stejný text dostane hotový soubor.
+        
+        Args:
+            pieces: Kusy textu v pořadí, jak přicházejí
+            
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        if not self.provider:
+            logger.error("Nothing to stream: no TTS provider")
+            return
+        
+        sentences = SentenceStream(self.chunk_chars or self.provider.max_chunk_chars)
+        parts = []
+        
+        async def segments() -> AsyncIterator[str]:
+            async for piece in pieces:
+                parts.append(piece)
+                for segment in sentences.feed(piece):
+                    yield segment
+            for segment in sentences.flush():
+                yield segment
+        
+        # Záložní provider při failoveru čte části znovu od začátku
+        replay = SegmentReplay(segments())
+        winner = None
+        
+        def chosen(provider: BaseTTS):
+            nonlocal winner
+            winner = provider
+        
+        # Klíč cache je známý až na konci, audio se proto píše do vlastního dočasného souboru
+        tmp_path = os.path.join(self.output_dir, f"stream-{uuid.uuid4().hex}.part")
+        success = False
+        
+        started = time.perf_counter()
+        try:
+            logger.info(f"Streaming audio of incoming text using {self.provider.get_provider_name()}")
+            with open(tmp_path, 'wb') as tee:
+                async for chunk in self._stream_article(lambda provider: self._synthesize_stream(provider, replay.read()), chosen):
+                    AUDIO_BYTES.inc(len(chunk), provider=self._name(winner))
+                    tee.write(chunk)
+                    yield chunk
+            success = True
+            TTS_SYNTHESIS.observe(time.perf_counter() - started, provider=self._name(winner), kind="stream")
+        except Exception as e:
+            ERRORS.inc(stage="tts")
+            logger.error(f"TTS streaming of incoming text failed: {e}")
+        finally:
+            await replay.close()
+            text = "".join(parts).strip()
+            key = make_cache_key(text, winner.get_cache_params()) if success and text and winner else None
+            if key and self.cache.reserve(key):
+                os.replace(tmp_path, self.cache.temp_path(key))
+                self.cache.release(key, True)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    async def _stream_segments(self, provider: BaseTTS, text: str,
+                               on_progress: Optional[Callable[[float], None]] = None) -> AsyncIterator[bytes]:
+        """
+        Syntetizuje části textu souběžně a vydává MP3 data ve správném pořadí.
+        
+        Args:
+            provider: Provider, který celý text přečte
+            text: Text k přečtení
+            on_progress: Volitelný callback s podílem odeslaných částí (0-1)
             
-            # Cleanup on error
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                except:
-                    pass
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        segments = self._split(text, provider)
+        if len(segments) > 1:
+            logger.info(f"Synthesizing {len(segments)} segments in parallel")
+        
+        async def source() -> AsyncIterator[str]:
+            for segment in segments:
+                yield segment
+        
+        async for chunk in self._synthesize_stream(provider, source(), on_progress, len(segments)):
+            yield chunk
+    
+    async def _synthesize_stream(self, provider: BaseTTS, segments: AsyncIterator[str],
+                                 on_progress: Optional[Callable[[float], None]] = None,
+                                 total: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Syntetizuje části textu souběžně, jak přicházejí, a vydává MP3 data
+        ve správném pořadí.
+        
+        První část se streamuje hned, jak přichází; další se mezitím
+        syntetizují na pozadí (v rámci limitu souběžnosti) a odešlou se,
+        jakmile na ně dojde řada.
+        
+        Args:
+            provider: Provider, který přečte všechny části
+            segments: Části textu (mohou přicházet postupně)
+            on_progress: Volitelný callback s podílem odeslaných částí (0-1)
+            total: Celkový počet částí (pro on_progress)
             
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        # Fronta front: jedna fronta MP3 bloků na každou část, v pořadí textu
+        order: asyncio.Queue = asyncio.Queue()
+        tasks = []
+        
+        async def synthesize(index: int, segment: str, queue: asyncio.Queue):
+            try:
+                first = True
+                # aclosing uvolní slot governoru hned při zrušení úlohy
+                async with contextlib.aclosing(self._get_governor(provider).stream(lambda: provider.stream(segment))) as chunks:
+                    async for chunk in chunks:
+                        if first and index > 0:
+                            chunk = strip_id3(chunk)
+                        first = False
+                        await queue.put(chunk)
+                await queue.put(None)
+            except Exception as e:
+                await queue.put(e)
+        
+        async def feed():
+            try:
+                index = 0
+                async for segment in segments:
+                    queue = asyncio.Queue()
+                    tasks.append(asyncio.create_task(synthesize(index, segment, queue)))
+                    await order.put(queue)
+                    index += 1
+                await order.put(None)
+            except Exception as e:
+                await order.put(e)
+        
+        feeder = asyncio.create_task(feed())
+        
+        try:
+            index = 0
+            while (queue := await order.get()) is not None:
+                if isinstance(queue, Exception):
+                    raise queue
+                while (chunk := await queue.get()) is not None:
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+                index += 1
+                if on_progress and total:
+                    on_progress(index / total)
+        finally:
+            feeder.cancel()
+            for task in tasks:
+                task.cancel()
+    
+    def stats(self) -> dict:
+        """
+        Vrátí statistiky audio cache.
+        
+        Returns:
+            dict: Statistiky
+        """
+        return {**self.cache.stats(), "transcoding": self.variants.stats()}
+    
+    def rate_stats(self) -> Optional[dict]:
+        """
+        Vrátí statistiky omezování požadavků na (primárního) providera;
+        záložní provideři je mají v provider_stats().
+        
+        Returns:
+            dict: Statistiky nebo None, pokud ještě nebyl volán
+        """
+        governor = self._governors.get(id(self._primary())) if self.provider else None
+        return governor.stats() if governor else None
+    
+    def provider_stats(self) -> Optional[list]:
+        """
+        Vrátí zdraví a latence providerů v řetězci.
+        
+        Returns:
+            list: Statistiky nebo None, pokud se používá jediný provider
+        """
+        if not isinstance(self.provider, ProviderChain):
             return None
+        stats = self.provider.stats()
+        for provider, entry in zip(self.provider.providers, stats):
+            governor = self._governors.get(id(provider))
+            entry["rate_limit"] = governor.stats() if governor else None
+        return stats
+
+# Třídy vestavěných providerů se importují až při prvním přístupu (s nimi i jejich SDK)
+_PROVIDER_CLASSES = {'EdgeTTS': 'edge', 'ElevenLabsTTS': 'elevenlabs', 'PollyTTS': 'polly'}
+
+def __getattr__(name: str):
+    if name in _PROVIDER_CLASSES:
+        return registry.load(_PROVIDER_CLASSES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-__all__ = ['BaseTTS', 'EdgeTTS', 'ElevenLabsTTS', 'PollyTTS', 'TTSService']
+__all__ = ['AudioVariants', 'BaseTTS', 'EdgeTTS', 'ElevenLabsTTS', 'PollyTTS', 'ProviderChain', 'ProviderRegistry',
+           'TTSService', 'register_provider', 'registry']
@@ -1,7 +1,57 @@
 """
 Abstraktní třída pro TTS poskytovatele
 """
+import os
+import asyncio
+import tempfile
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Vrátí sdílený thread pool pro blokující SDK (boto3, ElevenLabs).
+
+    Velikost je omezená (TTS_THREAD_POOL_SIZE), aby nárazová zátěž
+    nevytvořila neomezené množství vláken.
+
+    Returns:
+        ThreadPoolExecutor: Sdílený pool
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('TTS_THREAD_POOL_SIZE', '8')),
+            thread_name_prefix="tts"
+        )
+    return _executor
+
+
+async def iterate_in_executor(iterator: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Převede blokující iterátor (stream z SDK) na async iterátor.
+    
+    Každé volání next() běží ve sdíleném thread poolu.
+    
+    Args:
+        iterator: Synchronní iterátor bloků dat
+    
+    Yields:
+        bytes: Bloky dat
+    """
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        chunk = await loop.run_in_executor(get_executor(), next, iterator, done)
+        if chunk is done:
+            break
+        if chunk:
+            yield chunk
 
 
 class BaseTTS(ABC):
@@ -9,6 +59,15 @@ class BaseTTS(ABC):
     Abstraktní třída pro TTS poskytovatele.
     """
     
+    # Maximální délka textu na jedno volání providera (delší text se dělí)
+    max_chunk_chars = 2000
+    
+    # Maximální počet souběžných volání providera
+    max_concurrency = 4
+    
+    # Maximální počet požadavků za sekundu (None = bez limitu)
+    rate_limit = None
+    
     @abstractmethod
     def generate(self, text: str, output_path: str) -> str:
         """
@@ -23,6 +82,47 @@ class BaseTTS(ABC):
         """
         pass
     
+    async def generate_async(self, text: str, output_path: str) -> str:
+        """
+        Async varianta generate() - neblokuje event loop.
+        
+        Výchozí implementace spustí synchronní generate() ve sdíleném
+        thread poolu. Provideři s nativním async API ji přepisují.
+        
+        Args:
+            text: Text k přečtení
+            output_path: Cesta k výstupnímu audio souboru
+        
+        Returns:
+            str: Cesta k vygenerovanému souboru
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), self.generate, text, output_path)
+    
+    async def stream(self, text: str) -> AsyncIterator[bytes]:
+        """
+        Generuje audio z textu jako proud MP3 bloků.
+        
+        Výchozí implementace vygeneruje celý soubor a teprve pak ho
+        odešle. Provideři se streamovacím API ji přepisují, aby
+        přehrávání mohlo začít před dokončením syntézy.
+        
+        Args:
+            text: Text k přečtení
+        
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix=".mp3")
+        os.close(fd)
+        try:
+            await self.generate_async(text, tmp_path)
+            with open(tmp_path, 'rb') as f:
+                while chunk := f.read(STREAM_CHUNK_SIZE):
+                    yield chunk
+        finally:
+            os.remove(tmp_path)
+    
     @abstractmethod
     def get_provider_name(self) -> str:
         """
@@ -32,3 +132,12 @@ class BaseTTS(ABC):
             str: Název poskytovatele
         """
         pass
+    
+    def get_cache_params(self) -> Dict[str, str]:
+        """
+        Vrátí parametry, které ovlivňují výsledné audio (pro klíč cache).
+        
+        Returns:
+            dict: Parametry syntézy
+        """
+        return {"provider": self.get_provider_name()}
@@ -0,0 +1,930 @@
+"""
+Obsahově adresovaná cache vygenerovaných audio souborů
+"""
+import os
+import json
+import time
+import hashlib
+import asyncio
+import logging
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from services.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+
+# Nedokončené (.part) a neznámé soubory mladší než tato doba úklid nechá být (s)
+ORPHAN_GRACE = 3600
+
+# Přípony souborů, které úklid prochází (MP3, varianty, rozpracované soubory)
+AUDIO_SUFFIXES = (".mp3", ".opus", ".part")
+
+# Kolik nejstarších záznamů sdíleného indexu načte jeden krok evikce
+EVICT_BATCH = 32
+
+# Jak často se do sdíleného indexu zapisuje čas posledního použití souboru
+# (nejvýš, s; u krátkého `lease` častěji) - pořadí LRU tato přesnost stačí
+TOUCH_INTERVAL = 60.0
+
+
+def make_cache_key(text: str, params: Dict[str, str]) -> str:
+    """
+    Spočítá klíč cache z textu a parametrů syntézy.
+
+    Args:
+        text: Zpracovaný text k přečtení
+        params: Parametry providera (provider, voice, rate, pitch, model...)
+
+    Returns:
+        str: SHA-256 hash v hex podobě
+    """
+    payload = json.dumps({"text": text, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Cache MP3 souborů ve `static/audio` adresovaná hashem obsahu.
+
+    Soubory jsou rozdělené do podsložek podle prvních dvou znaků klíče, aby
+    ani statisíce souborů nezpomalovaly práci s adresářem. Index (index.json)
+    drží pořadí LRU; velikost je omezena počtem souborů, celkovým objemem
+    a stářím posledního použití. Souběžné požadavky na stejný klíč čekají
+    na jedinou probíhající syntézu.
+
+    Soubor se nemaže, dokud je držený přes hold() (např. právě odesílaný)
+    nebo byl použit před méně než `lease` sekundami - klient ho může ještě
+    přehrávat nebo k němu mít URL z dokončené úlohy. Úklid na pozadí
+    (start()/stop()) maže prošlé soubory, adoptuje soubory chybějící
+    v indexu, odstraňuje zbytky nedokončených syntéz a ukládá index.
+    """
+
+    # Sdílená databáze pracovních procesů (nastavuje jen SharedAudioCache)
+    shared = None
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 500 * 1024 * 1024,
+        max_files: int = 5000,
+        max_age: Optional[float] = None,
+        lease: float = 3600.0,
+        sweep_interval: float = 600.0
+    ):
+        """
+        Inicializace cache.
+
+        Args:
+            directory: Složka s audio soubory
+            max_bytes: Maximální celková velikost souborů v cache
+            max_files: Maximální počet souborů v cache
+            max_age: Po kolika sekundách od posledního použití se soubor smaže (None = nikdy)
+            lease: Jak dlouho po použití je soubor chráněný před smazáním (s)
+            sweep_interval: Interval úklidu na pozadí (s)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_age = max_age
+        self.lease = lease
+        self.sweep_interval = sweep_interval
+        self.index_path = os.path.join(directory, INDEX_FILENAME)
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+        self.adopted = 0
+        self.orphans_removed = 0
+        self.last_sweep: Optional[float] = None
+        self.last_sweep_duration = 0.0
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._refs: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """
+        Načte index z disku a zahodí záznamy, jejichž soubor už neexistuje.
+        """
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Audio cache index unreadable, starting empty: {e}")
+            return
+
+        for entry in sorted(data.get("entries", []), key=lambda e: e.get("last_access", 0)):
+            path = os.path.join(self.directory, entry["filename"])
+            if os.path.exists(path):
+                variants = entry.get("variants", {})
+                for name, variant in list(variants.items()):
+                    if not os.path.exists(os.path.join(self.directory, variant["filename"])):
+                        variants.pop(name)
+                self._entries[entry["key"]] = entry
+                self._total_bytes += self._entry_bytes(entry)
+
+        logger.info(f"Audio cache loaded: {len(self._entries)} files, {self._total_bytes} bytes")
+
+    def _save_index(self):
+        """
+        Atomicky zapíše index na disk. Volat pod zámkem.
+        """
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": list(self._entries.values())}, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Failed to write audio cache index: {e}")
+
+    def flush(self):
+        """
+        Uloží index, pokud se od posledního uložení změnil.
+
+        Index se nezapisuje při každém novém souboru (u velké cache by to
+        byl nejdražší krok); soubory, které se do něj nestihly uložit,
+        úklid po restartu znovu adoptuje.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    @staticmethod
+    def filename_for(key: str) -> str:
+        """
+        Vrátí relativní cestu souboru pro klíč (podsložka podle prefixu).
+
+        Args:
+            key: Klíč z make_cache_key
+
+        Returns:
+            str: Např. 'ab/ab12...ef.mp3'
+        """
+        return f"{key[:2]}/{key}.mp3"
+
+    @staticmethod
+    def key_for(filename: str) -> str:
+        """
+        Vrátí klíč ze jména souboru (i varianty, např. 'ab/ab12...ef.opus').
+        """
+        return os.path.basename(filename).split(".", 1)[0]
+
+    @staticmethod
+    def _entry_bytes(entry: dict) -> int:
+        return entry["size"] + sum(variant["size"] for variant in entry.get("variants", {}).values())
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """
+        Vrátí název souboru pro klíč a posune ho na konec LRU. Volat pod zámkem.
+        """
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+
+        if not os.path.exists(os.path.join(self.directory, entry["filename"])):
+            self._drop(key)
+            return None
+
+        entry["last_access"] = time.time()
+        self._entries.move_to_end(key)
+        return entry["filename"]
+
+    def _insert(self, entry: dict):
+        """
+        Zařadí nový soubor do indexu a vynutí limity. Volat pod zámkem.
+        """
+        self._entries[entry["key"]] = entry
+        self._total_bytes += entry["size"]
+        self._dirty = True
+        self._evict()
+
+    def _known_files(self) -> set:
+        """
+        Vrátí názvy všech souborů v indexu včetně variant. Volat pod zámkem.
+        """
+        known = set()
+        for entry in self._entries.values():
+            known.add(entry["filename"])
+            known.update(variant["filename"] for variant in entry.get("variants", {}).values())
+        return known
+
+    def _protected(self, entry: dict, now: float) -> bool:
+        return self._refs.get(entry["filename"], 0) > 0 or now - entry["last_access"] < self.lease
+
+    def _drop(self, key: str):
+        """
+        Odebere záznam z indexu a smaže jeho soubor. Volat pod zámkem.
+        """
+        entry = self._entries.pop(key)
+        self._total_bytes -= self._entry_bytes(entry)
+        self._dirty = True
+        filenames = [entry["filename"]] + [variant["filename"] for variant in entry.get("variants", {}).values()]
+        for filename in filenames:
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+
+    def _evict(self):
+        """
+        Maže nejdéle nepoužité soubory, dokud cache nesplňuje limity. Volat pod zámkem.
+
+        Chráněné soubory přeskakuje; jsou-li chráněné všechny, cache limit
+        dočasně překročí.
+        """
+        now = time.time()
+        files, total = len(self._entries), self._total_bytes
+        # Prochází se jen začátek LRU, dokud limity nesedí (bez kopie celého indexu)
+        victims = []
+        for key, entry in self._entries.items():
+            if files <= self.max_files and total <= self.max_bytes:
+                break
+            if self._protected(entry, now):
+                continue
+            victims.append((key, entry["filename"]))
+            files -= 1
+            total -= self._entry_bytes(entry)
+        for key, filename in victims:
+            self._drop(key)
+            self.evictions += 1
+            logger.info(f"Audio cache evicted: {filename}")
+
+    def _expire(self):
+        """
+        Maže soubory nepoužité déle než max_age. Volat pod zámkem.
+        """
+        if not self.max_age:
+            return
+        now = time.time()
+        victims = []
+        for key, entry in self._entries.items():
+            # Záznamy jsou v pořadí LRU - první dost čerstvý ukončí průchod
+            if now - entry["last_access"] < self.max_age:
+                break
+            if not self._protected(entry, now):
+                victims.append(key)
+        for key in victims:
+            self._drop(key)
+            self.expired += 1
+
+    @contextlib.contextmanager
+    def hold(self, filename: str):
+        """
+        Chrání soubor před smazáním po dobu bloku (např. během odesílání).
+
+        Args:
+            filename: Název souboru vrácený cache
+        """
+        self.pin(filename)
+        try:
+            yield
+        finally:
+            self.unpin(filename)
+
+    def pin(self, filename: str):
+        with self._lock:
+            self._refs[filename] = self._refs.get(filename, 0) + 1
+
+    def unpin(self, filename: str):
+        with self._lock:
+            count = self._refs.get(filename, 0) - 1
+            if count > 0:
+                self._refs[filename] = count
+            else:
+                self._refs.pop(filename, None)
+
+    def touch(self, filename: str) -> bool:
+        """
+        Zaznamená použití souboru (např. při jeho odeslání klientovi).
+
+        Args:
+            filename: Název souboru vrácený cache
+
+        Returns:
+            bool: False, pokud soubor v cache není
+        """
+        with self._lock:
+            entry = self._entries.get(self.key_for(filename))
+            return entry is not None and entry["filename"] == filename and self._lookup(entry["key"]) is not None
+
+    def variant(self, filename: str, name: str) -> Optional[str]:
+        """
+        Vrátí soubor varianty (např. 'opus') zdrojového souboru, pokud už existuje.
+
+        Args:
+            filename: Název zdrojového souboru
+            name: Název varianty
+
+        Returns:
+            str: Název souboru varianty nebo None
+        """
+        with self._lock:
+            entry = self._entries.get(self.key_for(filename))
+            variant = entry.get("variants", {}).get(name) if entry else None
+            return variant["filename"] if variant else None
+
+    def add_variant(self, filename: str, name: str, variant_filename: str) -> bool:
+        """
+        Zařadí hotovou variantu k záznamu zdrojového souboru.
+
+        Varianta se započítává do limitu velikosti a maže se spolu se
+        zdrojovým souborem. Pokud mezitím zdroj z cache zmizel, soubor
+        varianty se smaže.
+
+        Args:
+            filename: Název zdrojového souboru
+            name: Název varianty
+            variant_filename: Název souboru varianty ve složce cache
+
+        Returns:
+            bool: True, pokud byla varianta zařazena
+        """
+        path = os.path.join(self.directory, variant_filename)
+        with self._lock:
+            entry = self._entries.get(self.key_for(filename))
+            if entry is None or entry["filename"] != filename:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                return False
+            variants = entry.setdefault("variants", {})
+            if name in variants:
+                self._total_bytes -= variants[name]["size"]
+            size = os.path.getsize(path)
+            variants[name] = {"filename": variant_filename, "size": size}
+            self._total_bytes += size
+            self._dirty = True
+            self._evict()
+            return True
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Vrátí soubor z cache bez vytváření nového.
+
+        Pokud stejný klíč právě někdo syntetizuje, počká na výsledek.
+
+        Args:
+            key: Klíč z make_cache_key
+
+        Returns:
+            str: Název souboru nebo None, pokud v cache není
+        """
+        with self._lock:
+            filename = self._lookup(key)
+            if filename:
+                self.hits += 1
+                return filename
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+
+        if inflight is None:
+            return None
+        return await asyncio.shield(inflight)
+
+    def reserve(self, key: str) -> bool:
+        """
+        Označí klíč jako právě vytvářený.
+
+        Args:
+            key: Klíč z make_cache_key
+
+        Returns:
+            bool: True, pokud volající soubor vytváří; False, pokud už ho vytváří někdo jiný
+        """
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self.misses += 1
+            self._inflight[key] = asyncio.get_running_loop().create_future()
+            return True
+
+    def temp_path(self, key: str) -> str:
+        """
+        Vrátí dočasnou cestu, do které se zapisuje rozpracovaný soubor.
+
+        Args:
+            key: Klíč z make_cache_key
+
+        Returns:
+            str: Cesta k dočasnému souboru
+        """
+        path = os.path.join(self.directory, f"{self.filename_for(key)}.part")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def release(self, key: str, success: bool) -> Optional[str]:
+        """
+        Dokončí vytváření souboru rezervovaného přes reserve().
+
+        Při úspěchu přesune dočasný soubor na místo a zařadí ho do indexu,
+        jinak ho smaže. Probudí všechna volání čekající na stejný klíč.
+
+        Args:
+            key: Klíč z make_cache_key
+            success: Zda se soubor podařilo celý zapsat
+
+        Returns:
+            str: Název souboru nebo None při chybě
+        """
+        tmp_path = self.temp_path(key)
+        filename = None
+
+        try:
+            if success and os.path.exists(tmp_path):
+                filename = self.filename_for(key)
+                output_path = os.path.join(self.directory, filename)
+                os.replace(tmp_path, output_path)
+
+                with self._lock:
+                    self._insert({
+                        "key": key,
+                        "filename": filename,
+                        "size": os.path.getsize(output_path),
+                        "last_access": time.time(),
+                    })
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+            with self._lock:
+                inflight = self._inflight.pop(key, None)
+            if inflight is not None and not inflight.done():
+                inflight.set_result(filename)
+
+        return filename
+
+    async def get_or_create(self, key: str, create: Callable[[str], Awaitable[bool]]) -> Optional[str]:
+        """
+        Vrátí soubor z cache, nebo ho vytvoří zavoláním `create`.
+
+        Souběžná volání se stejným klíčem čekají na jedinou syntézu.
+
+        Args:
+            key: Klíč z make_cache_key
+            create: Korutina, která zapíše audio do předané cesty a vrátí True při úspěchu
+
+        Returns:
+            str: Název souboru ve složce cache nebo None při chybě
+        """
+        filename = await self.get(key)
+        if filename:
+            return filename
+        if not self.reserve(key):
+            # Mezitím začal stejný klíč vytvářet někdo jiný
+            return await self.get(key)
+
+        success = False
+        try:
+            success = await create(self.temp_path(key))
+        finally:
+            filename = self.release(key, success)
+        return filename
+
+    def start(self):
+        """
+        Spustí úklid na pozadí.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Zastaví úklid a uloží index.
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Audio cache sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def sweep(self):
+        """
+        Jeden průchod úklidu (blokující, spouští se v threadu).
+
+        Smaže prošlé soubory, vynutí limity, projde složku a adoptuje
+        soubory chybějící v indexu (např. po pádu před uložením indexu),
+        smaže staré zbytky nedokončených syntéz a uloží index.
+        """
+        started = time.time()
+
+        with self._lock:
+            self._expire()
+            self._evict()
+            known = self._known_files()
+
+        for filename, path, stat in self._scan():
+            if filename in known:
+                continue
+            key, ext = os.path.splitext(os.path.basename(filename))
+            if ext == ".mp3" and len(key) == 64 and self._adopt(key, filename, stat):
+                continue
+            if started - stat.st_mtime > ORPHAN_GRACE:
+                # Zbytek nedokončené syntézy nebo soubor, na který nic neodkazuje
+                try:
+                    os.remove(path)
+                    self.orphans_removed += 1
+                except OSError:
+                    pass
+
+        with self._lock:
+            self._evict()
+            if self._dirty:
+                self._save_index()
+            self.last_sweep = started
+            self.last_sweep_duration = time.time() - started
+
+    def _adopt(self, key: str, filename: str, stat: os.stat_result) -> bool:
+        """
+        Zařadí do indexu soubor, který v něm chybí (i ze starého plochého rozložení).
+
+        Returns:
+            bool: False, pokud už klíč v indexu je (soubor je duplikát)
+        """
+        with self._lock:
+            if key in self._entries or key in self._inflight:
+                return False
+            self._entries[key] = {
+                "key": key,
+                "filename": filename,
+                "size": stat.st_size,
+                "last_access": stat.st_mtime,
+            }
+            # Adoptované soubory patří na začátek LRU
+            self._entries.move_to_end(key, last=False)
+            self._total_bytes += stat.st_size
+            self._dirty = True
+            self.adopted += 1
+            return True
+
+    def _scan(self):
+        """
+        Projde audio soubory ve složce a jejích podsložkách.
+
+        Yields:
+            tuple: (relativní cesta, plná cesta, os.stat_result)
+        """
+        with os.scandir(self.directory) as top:
+            for item in top:
+                if item.is_dir(follow_symlinks=False):
+                    with os.scandir(item.path) as shard:
+                        for file in shard:
+                            if file.is_file(follow_symlinks=False) and file.name.endswith(AUDIO_SUFFIXES):
+                                yield f"{item.name}/{file.name}", file.path, file.stat()
+                elif item.is_file(follow_symlinks=False) and item.name.endswith(AUDIO_SUFFIXES):
+                    yield item.name, item.path, item.stat()
+
+    def stats(self) -> dict:
+        """
+        Vrátí statistiky cache.
+
+        Returns:
+            dict: Počty zásahů, minutí, vyřazení a obsazené místo
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "adopted": self.adopted,
+                "orphans_removed": self.orphans_removed,
+                "files": len(self._entries),
+                "variants": sum(len(entry.get("variants", {})) for entry in self._entries.values()),
+                "bytes": self._total_bytes,
+                "pinned": len(self._refs),
+                "oldest_access_age": round(time.time() - next(iter(self._entries.values()))["last_access"]) if self._entries else None,
+                "max_bytes": self.max_bytes,
+                "max_files": self.max_files,
+                "max_age": self.max_age,
+                "last_sweep": self.last_sweep,
+                "last_sweep_duration": round(self.last_sweep_duration, 3),
+            }
+
+
+class SharedAudioCache(AudioCache):
+    """
+    AudioCache pro více pracovních procesů: index je tabulka ve sdílené
+    SQLite databázi místo index.json v paměti procesu.
+
+    Všechny procesy tak vidí stejné soubory, pořadí LRU i limity. Jeden
+    klíč syntetizuje jen jeden proces (lease `audio:<klíč>`), ostatní čekají
+    na jeho soubor. Úklid na pozadí běží jen v procesu, který drží lease
+    `audio:sweep`. Držení přes hold()/pin() platí jen v rámci procesu; mezi
+    procesy chrání soubory `lease` od posledního použití.
+    """
+
+    def __init__(self, directory: str, shared: SharedState, **kwargs):
+        """
+        Args:
+            directory: Složka s audio soubory
+            shared: Sdílená databáze pracovních procesů
+            **kwargs: Limity a intervaly jako u AudioCache
+        """
+        self.shared = shared
+        self._db = shared.connect()
+        super().__init__(directory, **kwargs)
+
+    def _load_index(self):
+        """
+        Založí tabulku indexu; je-li prázdná, převezme do ní index.json
+        z režimu s jedním procesem.
+        """
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS audio_index ("
+            "key TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, bytes INTEGER NOT NULL, "
+            "last_access REAL NOT NULL, variants TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS audio_index_last_access ON audio_index (last_access)")
+        # Počet a velikost souborů udržují triggery, aby je evikce nemusela sčítat přes celý index
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS audio_totals ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), files INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS audio_index_insert AFTER INSERT ON audio_index BEGIN "
+            "UPDATE audio_totals SET files = files + 1, bytes = bytes + NEW.bytes; END"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS audio_index_delete AFTER DELETE ON audio_index BEGIN "
+            "UPDATE audio_totals SET files = files - 1, bytes = bytes - OLD.bytes; END"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS audio_index_update AFTER UPDATE OF bytes ON audio_index BEGIN "
+            "UPDATE audio_totals SET bytes = bytes - OLD.bytes + NEW.bytes; END"
+        )
+        # Index založený starší verzí (triggery už běží, takže se nic nezapočítá dvakrát)
+        self._db.execute(
+            "INSERT OR IGNORE INTO audio_totals (id, files, bytes) "
+            "SELECT 0, COUNT(*), COALESCE(SUM(bytes), 0) FROM audio_index"
+        )
+        self._db.commit()
+
+        if self._db.execute("SELECT COUNT(*) FROM audio_index").fetchone()[0] == 0:
+            super()._load_index()
+            for entry in self._entries.values():
+                self._write(entry)
+            self._entries.clear()
+            self._total_bytes = 0
+
+        files, total = self._totals()
+        logger.info(f"Shared audio cache index: {files} files, {total} bytes")
+
+    def _save_index(self):
+        # Každá změna se zapisuje rovnou do databáze
+        self._dirty = False
+
+    @staticmethod
+    def _entry(row) -> dict:
+        return {"key": row[0], "filename": row[1], "size": row[2], "last_access": row[3], "variants": json.loads(row[4])}
+
+    def _load(self, key: str) -> Optional[dict]:
+        row = self._db.execute(
+            "SELECT key, filename, size, last_access, variants FROM audio_index WHERE key = ?", (key,)
+        ).fetchone()
+        return self._entry(row) if row else None
+
+    def _write(self, entry: dict):
+        # Upsert místo INSERT OR REPLACE - nahrazení řádku by nespustilo trigger pro mazání
+        self._db.execute(
+            "INSERT INTO audio_index (key, filename, size, bytes, last_access, variants) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET filename = excluded.filename, size = excluded.size, "
+            "bytes = excluded.bytes, last_access = excluded.last_access, variants = excluded.variants",
+            (entry["key"], entry["filename"], entry["size"], self._entry_bytes(entry), entry["last_access"],
+             json.dumps(entry.get("variants", {})))
+        )
+        self._db.commit()
+
+    def _totals(self) -> Tuple[int, int]:
+        return self._db.execute("SELECT files, bytes FROM audio_totals").fetchone()
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._load(key)
+        if not entry:
+            return None
+
+        if not os.path.exists(os.path.join(self.directory, entry["filename"])):
+            self._drop(key)
+            return None
+
+        now = time.time()
+        if now - entry["last_access"] >= min(TOUCH_INTERVAL, self.lease / 2):
+            # Zápis mimo event loop; častější použití téhož souboru se nezapisují
+            self.shared.writer.defer("UPDATE audio_index SET last_access = ? WHERE key = ?", (now, key))
+        return entry["filename"]
+
+    def _find(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._lookup(key)
+
+    def _drop(self, key: str):
+        entry = self._load(key)
+        if entry is None:
+            return
+        self._db.execute("DELETE FROM audio_index WHERE key = ?", (key,))
+        self._db.commit()
+        for filename in [entry["filename"]] + [variant["filename"] for variant in entry["variants"].values()]:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(self.directory, filename))
+
+    def _evict(self):
+        files, total = self._totals()
+        if files <= self.max_files and total <= self.max_bytes:
+            return
+
+        now = time.time()
+        # Nejstarší záznamy po dávkách; chráněné se přeskočí posunem začátku dávky
+        skipped = 0
+        while files > self.max_files or total > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, filename, bytes, last_access FROM audio_index ORDER BY last_access LIMIT ? OFFSET ?",
+                (EVICT_BATCH, skipped)
+            ).fetchall()
+            if not rows:
+                break
+            for key, filename, size, last_access in rows:
+                if files <= self.max_files and total <= self.max_bytes:
+                    break
+                if self._protected({"filename": filename, "last_access": last_access}, now):
+                    skipped += 1
+                    continue
+                self._drop(key)
+                files -= 1
+                total -= size
+                self.evictions += 1
+                logger.info(f"Audio cache evicted: {filename}")
+
+    def _expire(self):
+        if not self.max_age:
+            return
+        now = time.time()
+        rows = self._db.execute(
+            "SELECT key, filename, last_access FROM audio_index WHERE last_access < ? ORDER BY last_access",
+            (now - self.max_age,)
+        ).fetchall()
+        for key, filename, last_access in rows:
+            if self._protected({"filename": filename, "last_access": last_access}, now):
+                continue
+            self._drop(key)
+            self.expired += 1
+
+    def _insert(self, entry: dict):
+        self._write(entry)
+        self._evict()
+
+    def _known_files(self) -> set:
+        known = set()
+        for filename, variants in self._db.execute("SELECT filename, variants FROM audio_index"):
+            known.add(filename)
+            known.update(variant["filename"] for variant in json.loads(variants).values())
+        return known
+
+    def _adopt(self, key: str, filename: str, stat: os.stat_result) -> bool:
+        with self._lock:
+            if key in self._inflight:
+                return False
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO audio_index (key, filename, size, bytes, last_access, variants) VALUES (?, ?, ?, ?, ?, '{}')",
+                (key, filename, stat.st_size, stat.st_size, stat.st_mtime)
+            )
+            self._db.commit()
+            if cursor.rowcount <= 0:
+                return False
+            self.adopted += 1
+            return True
+
+    def touch(self, filename: str) -> bool:
+        with self._lock:
+            entry = self._load(self.key_for(filename))
+            return entry is not None and entry["filename"] == filename and self._lookup(entry["key"]) is not None
+
+    def variant(self, filename: str, name: str) -> Optional[str]:
+        with self._lock:
+            entry = self._load(self.key_for(filename))
+        variant = entry["variants"].get(name) if entry else None
+        return variant["filename"] if variant else None
+
+    def add_variant(self, filename: str, name: str, variant_filename: str) -> bool:
+        path = os.path.join(self.directory, variant_filename)
+        with self._lock:
+            entry = self._load(self.key_for(filename))
+            if entry is None or entry["filename"] != filename:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                return False
+            entry["variants"][name] = {"filename": variant_filename, "size": os.path.getsize(path)}
+            self._write(entry)
+            self._evict()
+            return True
+
+    def temp_path(self, key: str) -> str:
+        # Každý proces zapisuje do vlastního dočasného souboru
+        path = os.path.join(self.directory, f"{self.filename_for(key)}.{os.getpid()}.part")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def reserve(self, key: str) -> bool:
+        """
+        Jako AudioCache.reserve(), navíc vrátí False, pokud klíč právě
+        syntetizuje jiný proces.
+        """
+        with self._lock:
+            if key in self._inflight:
+                return False
+        if not self.shared.try_acquire(f"audio:{key}"):
+            return False
+        return super().reserve(key)
+
+    def release(self, key: str, success: bool) -> Optional[str]:
+        try:
+            return super().release(key, success)
+        finally:
+            self.shared.release(f"audio:{key}")
+
+    async def get_or_create(self, key: str, create: Callable[[str], Awaitable[bool]]) -> Optional[str]:
+        """
+        Jako AudioCache.get_or_create(); když klíč syntetizuje jiný proces,
+        počká na jeho soubor. Pokud ten proces skončí bez výsledku (chyba,
+        pád), zkusí syntézu sám.
+        """
+        while True:
+            filename = await self.get(key)
+            if filename:
+                return filename
+
+            if self.reserve(key):
+                success = False
+                try:
+                    success = await create(self.temp_path(key))
+                finally:
+                    filename = self.release(key, success)
+                return filename
+
+            with self._lock:
+                local = key in self._inflight
+            if local:
+                return await self.get(key)
+
+            filename = await self.shared.wait_for(f"audio:{key}", lambda: self._find(key))
+            if filename:
+                return filename
+
+    async def _run(self):
+        while True:
+            # Úklid běží v jediném procesu - v tom, který drží lease
+            if self.shared.holds("audio:sweep") or self.shared.try_acquire("audio:sweep"):
+                try:
+                    await asyncio.to_thread(self.sweep)
+                except Exception as e:
+                    logger.error(f"Audio cache sweep failed: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            files, total = self._totals()
+            oldest = self._db.execute("SELECT MIN(last_access) FROM audio_index").fetchone()[0]
+            variants = sum(len(json.loads(value)) for (value,) in
+                           self._db.execute("SELECT variants FROM audio_index WHERE variants != '{}'"))
+        stats.update({
+            "files": files,
+            "variants": variants,
+            "bytes": total,
+            "oldest_access_age": round(time.time() - oldest) if oldest else None,
+            "shared": True,
+        })
+        return stats
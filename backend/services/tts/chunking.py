@@ -0,0 +1,219 @@
+"""
+Dělení textu na části vhodné pro TTS providera a skládání MP3
+"""
+import re
+from typing import List
+
+# Zkratky, za jejichž tečkou věta nekončí (porovnává se bez rozlišení velikosti písmen)
+CZECH_ABBREVIATIONS = {
+    "např", "tzv", "tj", "atd", "apod", "aj", "mj", "resp", "popř", "tzn", "příp",
+    "cca", "max", "min", "str", "čís", "č", "sv", "st", "ul", "nám", "tř", "odst",
+    "písm", "obr", "tab", "kap", "roč", "vyd", "zejm", "srov", "viz",
+    "dr", "ing", "mgr", "bc", "prof", "doc", "phdr", "judr", "mudr", "rndr", "csc",
+    "phd", "mr", "mrs", "ms", "p", "pí", "sl", "ml", "gen", "plk", "mjr",
+    "kpt", "npor", "por", "arm", "tis", "mil", "mld", "kč", "hod", "tel", "fax",
+    "a.s", "s.r.o", "spol", "n.l", "př.n.l", "r",
+}
+
+# Kandidát na konec věty: interpunkce, případně uzavírací uvozovky/závorky, pak mezera
+SENTENCE_END = re.compile(r'[.!?…]+["“”»\')\]]*\s+')
+WORD_BEFORE = re.compile(r'(\S+)$')
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """
+    Rozdělí odstavec na věty s ohledem na české zkratky, iniciály a řadové číslovky.
+
+    Args:
+        paragraph: Souvislý text bez prázdných řádků
+
+    Returns:
+        list: Věty v původním pořadí
+    """
+    sentences = []
+    start = 0
+
+    for match in SENTENCE_END.finditer(paragraph):
+        end = match.end()
+        following = paragraph[end:end + 1]
+        punctuation = match.group().strip()
+
+        if punctuation.startswith("."):
+            word = WORD_BEFORE.search(paragraph[start:match.start()])
+            word = word.group(1).lower().lstrip('("„«') if word else ""
+
+            # "např. Praha", "J. Novák", "17. listopadu", "3. Máj" (letopočty větu ukončit mohou)
+            if word in CZECH_ABBREVIATIONS or len(word) == 1 or (word.isdigit() and len(word) <= 2):
+                continue
+            # Za tečkou pokračuje malým písmenem - nejde o konec věty
+            if following and following.islower():
+                continue
+
+        sentences.append(paragraph[start:end].strip())
+        start = end
+
+    rest = paragraph[start:].strip()
+    if rest:
+        sentences.append(rest)
+    return sentences
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """
+    Rozdělí příliš dlouhou větu na čárkách, případně na mezerách.
+    """
+    parts = []
+    current = ""
+
+    for piece in re.split(r'(?<=[,;:–])\s+|\s+', sentence):
+        if len(piece) > max_chars:
+            # Jediné "slovo" delší než limit (URL apod.) - rozřízneme natvrdo
+            if current:
+                parts.append(current)
+                current = ""
+            parts.extend(piece[i:i + max_chars] for i in range(0, len(piece), max_chars))
+            continue
+
+        candidate = f"{current} {piece}" if current else piece
+        if len(candidate) > max_chars:
+            parts.append(current)
+            current = piece
+        else:
+            current = candidate
+
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """
+    Rozdělí text na části do `max_chars` znaků.
+
+    Části se skládají z celých vět (i přes hranice odstavců, aby vznikalo
+    co nejméně požadavků); věta delší než limit se dělí na čárkách nebo
+    mezerách.
+
+    Args:
+        text: Text k přečtení
+        max_chars: Maximální délka jedné části (limit providera)
+
+    Returns:
+        list: Části textu v původním pořadí
+    """
+    chunks = []
+    current = ""
+
+    for paragraph in re.split(r'\n\s*\n|\n', text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+
+        separator = "\n"
+        for sentence in split_sentences(paragraph):
+            pieces = [sentence] if len(sentence) <= max_chars else _split_long(sentence, max_chars)
+            for piece in pieces:
+                candidate = f"{current}{separator}{piece}" if current else piece
+                if len(candidate) > max_chars:
+                    chunks.append(current)
+                    current = piece
+                else:
+                    current = candidate
+                separator = " "
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+class SentenceStream:
+    """
+    Dělí text, který přichází po kouscích (streamovaná odpověď LLM), na
+    části pro TTS, jakmile jsou hotové celé věty.
+
+    Poslední věta v bufferu se drží zpátky, dokud za ní nepřijde další text
+    nebo konec odstavce - jinak by se např. "17." mohlo utrhnout od
+    "listopadu". Hotové věty se vydávají, až dohromady mají aspoň
+    `min_chars` znaků (žádné požadavky na jednoslovné věty), a nikdy
+    nepřekročí `max_chars`.
+    """
+
+    def __init__(self, max_chars: int, min_chars: int = 60):
+        """
+        Args:
+            max_chars: Maximální délka jedné části (limit providera)
+            min_chars: Minimální délka části kromě poslední
+        """
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._ready: List[str] = []
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Přidá další kus textu.
+
+        Args:
+            text: Kus textu v pořadí, jak přišel
+
+        Returns:
+            list: Části připravené k syntéze (může být prázdný)
+        """
+        self._buffer += text
+        paragraphs = re.split(r'\n\s*\n|\n', self._buffer)
+
+        # Všechny odstavce kromě posledního jsou uzavřené
+        for paragraph in paragraphs[:-1]:
+            self._ready.extend(split_sentences(" ".join(paragraph.split())))
+
+        last = paragraphs[-1]
+        sentences = split_sentences(" ".join(last.split()))
+        if len(sentences) > 1:
+            self._ready.extend(sentences[:-1])
+            # Mezera na konci patří k dalšímu slovu, které teprve přijde
+            last = sentences[-1] + (" " if last[-1:].isspace() else "")
+        self._buffer = last
+
+        return self._take(final=False)
+
+    def flush(self) -> List[str]:
+        """
+        Ukončí text a vrátí zbývající části.
+
+        Returns:
+            list: Poslední části k syntéze
+        """
+        self._ready.extend(split_sentences(" ".join(self._buffer.split())))
+        self._buffer = ""
+        return self._take(final=True)
+
+    def _take(self, final: bool) -> List[str]:
+        text = " ".join(self._ready)
+        if not text or (len(text) < self.min_chars and not final):
+            return []
+        self._ready = []
+        return split_text(text, self.max_chars)
+
+
+def strip_id3(data: bytes) -> bytes:
+    """
+    Odstraní ID3v2 hlavičku ze začátku MP3 dat.
+
+    Při skládání více MP3 za sebe smí hlavička zůstat jen na začátku
+    prvního souboru, jinak ji některé přehrávače čtou jako šum.
+
+    Args:
+        data: Začátek MP3 dat
+
+    Returns:
+        bytes: Data bez ID3v2 hlavičky
+    """
+    if len(data) < 10 or not data.startswith(b"ID3"):
+        return data
+
+    # Velikost je "synchsafe" integer - 4 bajty po 7 bitech
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    if data[5] & 0x10:
+        size += 10  # patička
+    return data[10 + size:]
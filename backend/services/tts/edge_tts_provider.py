@@ -12,6 +12,10 @@ class EdgeTTS(BaseTTS):
     Nabízí kvalitní české hlasy.
     """
     
+    # Edge zvládne i dlouhý text, kratší části ale umožní paralelní syntézu
+    max_chunk_chars = 1500
+    max_concurrency = 4
+    
     def __init__(self, voice: str = 'cs-CZ-AntoninNeural', rate: str = '+0%', pitch: str = '+0Hz'):
         """
         Inicializace Edge TTS.
@@ -39,30 +43,21 @@ class EdgeTTS(BaseTTS):
         Returns:
             str: Cesta k vygenerovanému souboru
         """
-        # Edge TTS je async - musíme ho volat správně
-        import asyncio
-        try:
-            # Try to get existing event loop
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If loop is already running (FastAPI), create a new thread
-                import nest_asyncio
-                nest_asyncio.apply()
-                loop.run_until_complete(self._generate_async(text, output_path))
-            else:
-                loop.run_until_complete(self._generate_async(text, output_path))
-        except RuntimeError:
-            # No event loop, create new one
-            asyncio.run(self._generate_async(text, output_path))
+        # Synchronní volání je možné jen mimo běžící event loop
+        # (z FastAPI se volá generate_async)
+        asyncio.run(self.generate_async(text, output_path))
         return output_path
     
-    async def _generate_async(self, text: str, output_path: str):
+    async def generate_async(self, text: str, output_path: str) -> str:
         """
-        Async generování audio.
+        Async generování audio - nativní await bez thread poolu.
         
         Args:
             text: Text k přečtení
             output_path: Cesta k výstupnímu souboru
+        
+        Returns:
+            str: Cesta k vygenerovanému souboru
         """
         # Vytvoření Edge TTS komunikace
         communicate = edge_tts.Communicate(
@@ -74,6 +69,28 @@ class EdgeTTS(BaseTTS):
         
         # Uložení audio
         await communicate.save(output_path)
+        return output_path
+    
+    async def stream(self, text: str):
+        """
+        Streamuje MP3 bloky přímo z Edge TTS, jak přicházejí.
+        
+        Args:
+            text: Text k přečtení
+        
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        communicate = edge_tts.Communicate(
+            text=text,
+            voice=self.voice,
+            rate=self.rate,
+            pitch=self.pitch
+        )
+        
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
     
     def get_provider_name(self) -> str:
         """
@@ -83,3 +100,12 @@ class EdgeTTS(BaseTTS):
             str: Název poskytovatele
         """
         return f"edge-tts (voice={self.voice}, rate={self.rate})"
+    
+    def get_cache_params(self) -> dict:
+        """
+        Vrátí parametry, které ovlivňují výsledné audio.
+        
+        Returns:
+            dict: Parametry syntézy
+        """
+        return {"provider": "edge", "voice": self.voice, "rate": self.rate, "pitch": self.pitch}
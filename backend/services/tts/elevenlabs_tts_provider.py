@@ -1,8 +1,9 @@
 """
 ElevenLabs TTS implementace
 """
+import asyncio
 from elevenlabs.client import ElevenLabs
-from .base import BaseTTS
+from .base import BaseTTS, get_executor, iterate_in_executor
 
 
 class ElevenLabsTTS(BaseTTS):
@@ -10,11 +11,16 @@ class ElevenLabsTTS(BaseTTS):
     ElevenLabs TTS provider.
     """
     
+    # Souběžné požadavky ElevenLabs jsou omezené tarifem
+    max_chunk_chars = 2500
+    max_concurrency = 2
+    
     def __init__(
         self, 
         api_key: str,
         voice_id: str,
-        model_id: str = 'eleven_multilingual_v2'
+        model_id: str = 'eleven_multilingual_v2',
+        http_client=None
     ):
         """
         Inicializace ElevenLabs TTS.
@@ -23,13 +29,17 @@ class ElevenLabsTTS(BaseTTS):
             api_key: ElevenLabs API klíč
             voice_id: ID hlasu z ElevenLabs
             model_id: ID modelu (default: 'eleven_multilingual_v2')
+            http_client: Volitelný httpx.Client s vyladěným poolem spojení
         """
         self.api_key = api_key
         self.voice_id = voice_id
         self.model_id = model_id
         
-        # Vytvoření klienta
-        self.client = ElevenLabs(api_key=api_key)
+        # Vytvoření klienta (se sdíleným nastavením spojení, pokud je předané)
+        if http_client is not None:
+            self.client = ElevenLabs(api_key=api_key, httpx_client=http_client)
+        else:
+            self.client = ElevenLabs(api_key=api_key)
     
     def generate(self, text: str, output_path: str) -> str:
         """
@@ -42,12 +52,7 @@ class ElevenLabsTTS(BaseTTS):
         Returns:
             str: Cesta k vygenerovanému souboru
         """
-        # Volání ElevenLabs API
-        audio_generator = self.client.generate(
-            text=text,
-            voice=self.voice_id,
-            model=self.model_id
-        )
+        audio_generator = self._request(text)
         
         # Uložení audio do souboru
         with open(output_path, 'wb') as f:
@@ -57,6 +62,39 @@ class ElevenLabsTTS(BaseTTS):
         
         return output_path
     
+    async def stream(self, text: str):
+        """
+        Streamuje MP3 bloky z generátoru ElevenLabs, jak přicházejí.
+        
+        Args:
+            text: Text k přečtení
+        
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        loop = asyncio.get_running_loop()
+        audio_generator = await loop.run_in_executor(get_executor(), self._request, text)
+        
+        async for chunk in iterate_in_executor(iter(audio_generator)):
+            if isinstance(chunk, bytes):
+                yield chunk
+    
+    def _request(self, text: str):
+        """
+        Zavolá ElevenLabs API.
+        
+        Args:
+            text: Text k přečtení
+        
+        Returns:
+            Generátor bloků audio dat
+        """
+        return self.client.generate(
+            text=text,
+            voice=self.voice_id,
+            model=self.model_id
+        )
+    
     def get_provider_name(self) -> str:
         """
         Vrátí název poskytovatele.
@@ -65,3 +103,12 @@ class ElevenLabsTTS(BaseTTS):
             str: Název poskytovatele
         """
         return f"elevenlabs (voice={self.voice_id}, model={self.model_id})"
+    
+    def get_cache_params(self) -> dict:
+        """
+        Vrátí parametry, které ovlivňují výsledné audio.
+        
+        Returns:
+            dict: Parametry syntézy
+        """
+        return {"provider": "elevenlabs", "voice": self.voice_id, "model": self.model_id}
@@ -0,0 +1,413 @@
+"""
+Řetězec TTS providerů se sledováním zdraví, circuit breakerem a hedgingem
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from .base import BaseTTS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderHealth:
+    """
+    Zdraví jednoho providera v řetězci.
+
+    Sleduje latenci do prvního bloku audia (posledních `window` úspěšných
+    volání) a po `failure_threshold` chybách v řadě provider na `cooldown`
+    sekund vyřadí (circuit breaker). Po uplynutí cooldownu pustí jeden
+    zkušební požadavek; jeho úspěch providera vrátí do provozu.
+    """
+
+    def __init__(self, provider: BaseTTS, window: int = 100, failure_threshold: int = 3, cooldown: float = 30.0):
+        """
+        Args:
+            provider: Sledovaný provider
+            window: Počet posledních latencí pro výpočet percentilů
+            failure_threshold: Počet chyb v řadě, po kterém se provider vyřadí
+            cooldown: Jak dlouho je vyřazený provider přeskakován (s)
+        """
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.successes = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+        self._latencies: deque = deque(maxlen=window)
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return OPEN
+        return HALF_OPEN
+
+    def available(self) -> bool:
+        """
+        Vrátí, zda lze providera použít (v half-open stavu jen pro jeden
+        zkušební požadavek za cooldown).
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        return state == HALF_OPEN and (self._trial_at is None or time.monotonic() - self._trial_at >= self.cooldown)
+
+    def begin(self):
+        """
+        Zaznamená odeslání požadavku; v half-open stavu jde o zkušební požadavek.
+        """
+        if self.state == HALF_OPEN:
+            self._trial_at = time.monotonic()
+
+    def record_success(self, latency: Optional[float] = None):
+        """
+        Zaznamená úspěch; `latency` je doba do prvního bloku audia (u celých
+        souborů se neměří, aby nezkreslila percentily pro hedging).
+        """
+        self.successes += 1
+        self.consecutive_failures = 0
+        if latency is not None:
+            self._latencies.append(latency)
+        if self.opened_at is not None:
+            logger.info(f"TTS provider {self.provider.get_provider_name()} recovered")
+        self.opened_at = None
+        self._trial_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self._trial_at = None
+        if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"TTS provider {self.provider.get_provider_name()} disabled for {self.cooldown:.0f}s")
+            self.opened_at = time.monotonic()
+
+    def percentile(self, share: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Vrátí percentil latence do prvního bloku, nebo None při nedostatku vzorků.
+        """
+        if len(self._latencies) < max(1, min_samples):
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(share * len(latencies)))]
+
+    def stats(self) -> dict:
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        return {
+            "provider": self.provider.get_provider_name(),
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50_first_chunk": round(p50, 3) if p50 is not None else None,
+            "p95_first_chunk": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class ProviderChain(BaseTTS):
+    """
+    Několik TTS providerů v pořadí priority (např. edge → polly → elevenlabs).
+
+    Požadavek jde na první dostupného providera. Když selže dřív, než pošle
+    první blok audia, pokračuje se dalším (failover). Když první blok nepřijde
+    do `hedge_percentile` obvyklé latence providera, souběžně se spustí záložní
+    požadavek (hedging); použije se ten, který odpoví dřív, a druhý se zruší.
+    Výpadek uprostřed streamu se už nepřepíná, aby se audio neopakovalo.
+
+    TTSService přes stream_with() přepíná celý článek (stream i soubor), ne
+    jeho jednotlivé části, takže jeden soubor nikdy nemíchá hlasy. Audio se
+    ukládá pod klíčem providera, který ho skutečně vygeneroval; limity
+    souběžnosti a požadavků má každý provider vlastní.
+    """
+
+    def __init__(
+        self,
+        providers: List[BaseTTS],
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_delay: float = 3.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0
+    ):
+        """
+        Args:
+            providers: Provideři v pořadí priority
+            hedge: Zda posílat záložní požadavky u pomalých odpovědí
+            hedge_percentile: Percentil latence, po kterém se spustí záloha
+            hedge_min_samples: Kolik měření je potřeba, než se percentil použije
+            hedge_delay: Zpoždění zálohy, dokud percentil není znám (s)
+            failure_threshold: Počet chyb v řadě, po kterém se provider vyřadí
+            cooldown: Jak dlouho je vyřazený provider přeskakován (s)
+        """
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self.health: Dict[int, ProviderHealth] = {
+            id(provider): ProviderHealth(provider, failure_threshold=failure_threshold, cooldown=cooldown)
+            for provider in providers
+        }
+
+        # Text rozdělený dřív, než je jasné, kdo ho přečte, musí sedět všem
+        self.max_chunk_chars = min(provider.max_chunk_chars for provider in providers)
+
+    def generate(self, text: str, output_path: str) -> str:
+        """
+        Generuje audio z textu (synchronně, mimo běžící event loop).
+
+        Args:
+            text: Text k přečtení
+            output_path: Cesta k výstupnímu MP3 souboru
+
+        Returns:
+            str: Cesta k vygenerovanému souboru
+        """
+        asyncio.run(self.generate_async(text, output_path))
+        return output_path
+
+    async def generate_async(self, text: str, output_path: str) -> str:
+        """
+        Generuje audio přes stream(), aby i celé soubory měly failover a hedging.
+
+        Args:
+            text: Text k přečtení
+            output_path: Cesta k výstupnímu MP3 souboru
+
+        Returns:
+            str: Cesta k vygenerovanému souboru
+        """
+        with open(output_path, 'wb') as f:
+            async for chunk in self.stream(text):
+                f.write(chunk)
+        return output_path
+
+    async def stream(self, text: str) -> AsyncIterator[bytes]:
+        """
+        Streamuje MP3 bloky od providera, který první začne odpovídat.
+
+        Args:
+            text: Text k přečtení
+
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        async for chunk in self.stream_with(lambda provider: provider.stream(text)):
+            yield chunk
+
+    async def stream_with(self, open_stream: Callable[[BaseTTS], AsyncIterator[bytes]],
+                          on_provider: Optional[Callable[[BaseTTS], None]] = None,
+                          candidates: Optional[List[BaseTTS]] = None) -> AsyncIterator[bytes]:
+        """
+        Streamuje audio z `open_stream(provider)` s failoverem a hedgingem.
+
+        Args:
+            open_stream: Otevře stream audia u daného providera (např. celý
+                         článek po částech)
+            on_provider: Zavolá se s vítězným providerem před prvním blokem
+            candidates: Provideři, kteří se mají zkusit (výchozí jsou
+                        všichni dostupní)
+
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        candidates = list(candidates) if candidates else self.candidates()
+        # Běžící pokusy: úloha čekající na první blok -> (provider, iterátor, začátek, záloha)
+        attempts: Dict[asyncio.Task, tuple] = {}
+        last_error: Optional[BaseException] = None
+        winner = None
+
+        def launch(hedged: bool = False):
+            provider = candidates.pop(0)
+            iterator = open_stream(provider).__aiter__()
+            task = asyncio.ensure_future(iterator.__anext__())
+            attempts[task] = (provider, iterator, time.monotonic(), hedged)
+            self.health[id(provider)].begin()
+            if hedged:
+                self.health[id(provider)].hedges += 1
+                logger.info(f"Hedging slow TTS request with {provider.get_provider_name()}")
+
+        try:
+            launch()
+            while attempts and winner is None:
+                timeout = self._hedge_after(attempts) if candidates and self.hedge else None
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(hedged=True)
+                    continue
+
+                for task in done:
+                    provider, iterator, started, hedged = attempts.pop(task)
+                    health = self.health[id(provider)]
+                    error = task.exception()
+                    if error is None and winner is None:
+                        health.record_success(time.monotonic() - started)
+                        if hedged:
+                            health.hedge_wins += 1
+                        winner = (provider, iterator, task.result())
+                    elif error is None:
+                        # Druhý pokus doběhl ve stejném okamžiku - nepotřebujeme ho
+                        await iterator.aclose()
+                    else:
+                        if isinstance(error, StopAsyncIteration):
+                            error = RuntimeError("Empty audio stream")
+                        health.record_failure()
+                        last_error = error
+                        logger.warning(f"TTS provider {provider.get_provider_name()} failed: {error}")
+                        if candidates and not attempts:
+                            launch()
+        finally:
+            await self._cancel(attempts)
+
+        if winner is None:
+            raise last_error or RuntimeError("No TTS provider available")
+
+        provider, iterator, first = winner
+        if on_provider:
+            on_provider(provider)
+        try:
+            yield first
+            async for chunk in iterator:
+                yield chunk
+        except Exception:
+            self.health[id(provider)].record_failure()
+            raise
+        finally:
+            await iterator.aclose()
+
+    def candidates(self) -> List[BaseTTS]:
+        """
+        Vrátí dostupné providery v pořadí priority; když jsou všichni
+        vyřazení, zkusí se všichni (lepší než jistá chyba).
+        """
+        candidates = [provider for provider in self.providers if self.health[id(provider)].available()]
+        return candidates or list(self.providers)
+
+    def _hedge_after(self, attempts: Dict[asyncio.Task, tuple]) -> float:
+        """
+        Vrátí, za jak dlouho spustit zálohu za nejnovější běžící pokus.
+        """
+        provider, _, started, _ = max(attempts.values(), key=lambda attempt: attempt[2])
+        delay = self.health[id(provider)].percentile(self.hedge_percentile, self.hedge_min_samples)
+        if delay is None:
+            delay = self.hedge_delay
+        return max(0.0, started + delay - time.monotonic())
+
+    async def _cancel(self, attempts: Dict[asyncio.Task, tuple]):
+        """
+        Zruší prohrané pokusy a uzavře jejich streamy.
+        """
+        for task in attempts:
+            task.cancel()
+        await asyncio.gather(*attempts, return_exceptions=True)
+        for _, iterator, _, _ in attempts.values():
+            await iterator.aclose()
+        attempts.clear()
+
+    def get_provider_name(self) -> str:
+        """
+        Vrátí názvy providerů v řetězci.
+
+        Returns:
+            str: Název řetězce
+        """
+        return " -> ".join(provider.get_provider_name() for provider in self.providers)
+
+    def get_cache_params(self) -> dict:
+        """
+        Vrátí parametry providera, který by teď text syntetizoval (prvního
+        dostupného), takže po zotavení primárního se audio zálohy nepoužije.
+
+        Returns:
+            dict: Parametry syntézy
+        """
+        return self.candidates()[0].get_cache_params()
+
+    def stats(self) -> list:
+        """
+        Vrátí zdraví a latence jednotlivých providerů.
+
+        Returns:
+            list: Statistiky v pořadí priority
+        """
+        return [self.health[id(provider)].stats() for provider in self.providers]
+
+
+class SegmentReplay:
+    """
+    Části textu z jednoho zdroje (např. streamované odpovědi LLM), které
+    může číst více pokusů o syntézu, každý od začátku - záložní provider
+    při failoveru nebo hedgingu celého článku dostane i části, které už
+    přečetl primární.
+
+    Zdroj čte úloha na pozadí, takže zrušení prohraného pokusu zdroj
+    nepřeruší.
+    """
+
+    def __init__(self, source: AsyncIterator[str]):
+        self._source = source
+        self._items: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _notify(self):
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+
+    async def _pump(self):
+        try:
+            async for item in self._source:
+                self._items.append(item)
+                self._notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+
+    async def read(self) -> AsyncIterator[str]:
+        """
+        Vydává části od začátku, jak přicházejí.
+
+        Yields:
+            str: Části textu
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._pump())
+        index = 0
+        while True:
+            if index < len(self._items):
+                index += 1
+                yield self._items[index - 1]
+            elif self._done:
+                if self._error:
+                    raise self._error
+                return
+            else:
+                await self._changed.wait()
+
+    async def close(self):
+        """
+        Přestane číst zdroj.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
@@ -2,8 +2,10 @@
 AWS Polly TTS implementace
 """
 import boto3
-from .base import BaseTTS
+from botocore.config import Config
+from .base import BaseTTS, STREAM_CHUNK_SIZE, get_executor, iterate_in_executor
 import os
+import asyncio
 
 
 class PollyTTS(BaseTTS):
@@ -11,13 +13,18 @@ class PollyTTS(BaseTTS):
     AWS Polly TTS provider.
     """
     
-    def __init__(self, voice_id: str = 'Iveta', region: str = 'eu-central-1'):
+    # Polly neural přijme max. 3000 účtovaných znaků na požadavek
+    max_chunk_chars = 2500
+    max_concurrency = 8
+    
+    def __init__(self, voice_id: str = 'Iveta', region: str = 'eu-central-1', max_pool_connections: int = 0):
         """
         Inicializace AWS Polly TTS.
         
         Args:
             voice_id: ID hlasu (default: 'Iveta' - český ženský hlas)
             region: AWS region (default: 'eu-central-1')
+            max_pool_connections: Velikost poolu spojení (0 = podle max_concurrency)
         """
         self.voice_id = voice_id
         self.region = region
@@ -27,7 +34,12 @@ class PollyTTS(BaseTTS):
             'polly',
             region_name=region,
             aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+            # Pool stačí na souběžná volání, spojení se drží otevřená (TCP keepalive)
+            config=Config(
+                max_pool_connections=max_pool_connections or self.max_concurrency,
+                tcp_keepalive=True
+            )
         )
     
     def generate(self, text: str, output_path: str) -> str:
@@ -41,13 +53,7 @@ class PollyTTS(BaseTTS):
         Returns:
             str: Cesta k vygenerovanému souboru
         """
-        # Volání Polly API
-        response = self.client.synthesize_speech(
-            Text=text,
-            OutputFormat='mp3',
-            VoiceId=self.voice_id,
-            Engine='neural'  # Neural engine pro lepší kvalitu
-        )
+        response = self._request(text)
         
         # Uložení audio streamu
         with open(output_path, 'wb') as f:
@@ -55,6 +61,39 @@ class PollyTTS(BaseTTS):
         
         return output_path
     
+    async def stream(self, text: str):
+        """
+        Streamuje MP3 bloky z Polly AudioStream, jak přicházejí.
+        
+        Args:
+            text: Text k přečtení
+        
+        Yields:
+            bytes: Bloky MP3 dat
+        """
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(get_executor(), self._request, text)
+        
+        async for chunk in iterate_in_executor(response['AudioStream'].iter_chunks(STREAM_CHUNK_SIZE)):
+            yield chunk
+    
+    def _request(self, text: str) -> dict:
+        """
+        Zavolá Polly API.
+        
+        Args:
+            text: Text k přečtení
+        
+        Returns:
+            dict: Odpověď synthesize_speech s AudioStream
+        """
+        return self.client.synthesize_speech(
+            Text=text,
+            OutputFormat='mp3',
+            VoiceId=self.voice_id,
+            Engine='neural'  # Neural engine pro lepší kvalitu
+        )
+    
     def get_provider_name(self) -> str:
         """
         Vrátí název poskytovatele.
@@ -63,3 +102,12 @@ class PollyTTS(BaseTTS):
             str: Název poskytovatele
         """
         return f"aws-polly (voice={self.voice_id}, region={self.region})"
+    
+    def get_cache_params(self) -> dict:
+        """
+        Vrátí parametry, které ovlivňují výsledné audio.
+        
+        Returns:
+            dict: Parametry syntézy
+        """
+        return {"provider": "polly", "voice": self.voice_id, "engine": "neural"}
@@ -0,0 +1,131 @@
+"""
+Registr TTS providerů s líným importem
+"""
+import time
+import logging
+import importlib
+from importlib.metadata import entry_points
+from typing import Dict, List, Type, Union
+
+from .base import BaseTTS
+
+logger = logging.getLogger(__name__)
+
+# Skupina entry pointů, přes kterou se registrují provideři z jiných balíčků:
+#   [project.entry-points."vocas.tts_providers"]
+#   azure = "vocas_azure:AzureTTS"
+ENTRY_POINT_GROUP = "vocas.tts_providers"
+
+# Vestavění provideři: název -> "modul:třída"; modul (a s ním SDK) se
+# importuje až při prvním použití
+BUILTIN_PROVIDERS = {
+    "edge": f"{__package__}.edge_tts_provider:EdgeTTS",
+    "elevenlabs": f"{__package__}.elevenlabs_tts_provider:ElevenLabsTTS",
+    "polly": f"{__package__}.polly_tts_provider:PollyTTS",
+}
+
+
+class ProviderRegistry:
+    """
+    Mapuje názvy providerů (TTS_PROVIDER) na jejich třídy.
+
+    Třída se načte až podle názvu, takže proces importuje jen SDK
+    nakonfigurovaných providerů - boto3 nebo ElevenLabs SDK jinak stojí
+    stovky milisekund a desítky MB při každém startu workeru. Kromě
+    vestavěných providerů se načtou i entry pointy ze skupiny
+    ENTRY_POINT_GROUP a provideři registrovaní přes register().
+    """
+
+    def __init__(self):
+        self._targets: Dict[str, Union[str, Type[BaseTTS]]] = dict(BUILTIN_PROVIDERS)
+        self._classes: Dict[str, Type[BaseTTS]] = {}
+        self._discovered = False
+
+        # Doba importu jednotlivých providerů (s) pro report startu
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, target: Union[str, Type[BaseTTS]]):
+        """
+        Zaregistruje providera.
+
+        Args:
+            name: Název pro TTS_PROVIDER
+            target: Třída odvozená od BaseTTS nebo "modul:třída" pro líný import
+        """
+        self._targets[name] = target
+        self._classes.pop(name, None)
+
+    def _discover(self):
+        """
+        Načte providery registrované jinými balíčky přes entry pointy
+        (jen názvy, moduly se zatím neimportují).
+        """
+        if self._discovered:
+            return
+        self._discovered = True
+        try:
+            found = entry_points(group=ENTRY_POINT_GROUP)
+        except Exception as e:
+            logger.warning(f"Failed to read TTS provider entry points: {e}")
+            return
+        for entry_point in found:
+            if entry_point.name in self._targets:
+                logger.warning(f"TTS provider '{entry_point.name}' from {entry_point.value} ignored, name already registered")
+                continue
+            self._targets[entry_point.name] = entry_point.value
+
+    def names(self) -> List[str]:
+        self._discover()
+        return sorted(self._targets)
+
+    def load(self, name: str) -> Type[BaseTTS]:
+        """
+        Vrátí třídu providera a při prvním použití importuje její modul.
+
+        Args:
+            name: Název providera
+
+        Returns:
+            Třída providera
+
+        Raises:
+            KeyError: Neznámý provider
+            ImportError: Chybí SDK providera
+        """
+        cls = self._classes.get(name)
+        if cls is not None:
+            return cls
+
+        self._discover()
+        target = self._targets[name]
+        started = time.perf_counter()
+        if isinstance(target, str):
+            module_name, _, attribute = target.partition(":")
+            cls = importlib.import_module(module_name)
+            for part in attribute.split("."):
+                cls = getattr(cls, part)
+        else:
+            cls = target
+        self.load_times[name] = time.perf_counter() - started
+
+        if not (isinstance(cls, type) and issubclass(cls, BaseTTS)):
+            raise TypeError(f"TTS provider '{name}' ({target}) is not a BaseTTS subclass")
+        self._classes[name] = cls
+        logger.info(f"Loaded TTS provider '{name}' in {self.load_times[name] * 1000:.0f} ms")
+        return cls
+
+    def stats(self) -> dict:
+        return {
+            "available": self.names(),
+            "loaded": {name: round(seconds, 3) for name, seconds in self.load_times.items()},
+        }
+
+
+registry = ProviderRegistry()
+
+
+def register_provider(name: str, target: Union[str, Type[BaseTTS]]):
+    """
+    Zaregistruje TTS providera ve sdíleném registru (viz ProviderRegistry.register).
+    """
+    registry.register(name, target)
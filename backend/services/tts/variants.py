@@ -0,0 +1,233 @@
+"""
+Varianty vygenerovaného audia s nižším datovým tokem (ffmpeg)
+"""
+import os
+import time
+import shutil
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .cache import AudioCache
+from services.metrics import TRANSCODE, ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Kolik zdrojů bez varianty (selhání, nezmenšený soubor) si pamatovat
+MAX_SKIPPED = 10000
+
+
+@dataclass(frozen=True)
+class Variant:
+    """
+    Popis varianty: přípona souboru, MIME typ a parametry kodéru pro ffmpeg.
+    """
+    suffix: str
+    media_type: str
+    codec_args: Tuple[str, ...]
+
+
+def default_variants(opus_bitrate: str = "32k", low_bitrate: str = "64k") -> Dict[str, Variant]:
+    """
+    Vrátí výchozí varianty: Opus (přehraje většina prohlížečů, na řeč stačí
+    nízký tok) a MP3 s nižším tokem pro přehrávače bez Opusu.
+
+    Args:
+        opus_bitrate: Datový tok varianty 'opus'
+        low_bitrate: Datový tok varianty 'low'
+
+    Returns:
+        dict: Název varianty -> Variant
+    """
+    return {
+        "opus": Variant(".opus", "audio/ogg; codecs=opus",
+                        ("-c:a", "libopus", "-b:a", opus_bitrate, "-application", "voip", "-f", "ogg")),
+        "low": Variant(".low.mp3", "audio/mpeg",
+                       ("-c:a", "libmp3lame", "-b:a", low_bitrate, "-f", "mp3")),
+    }
+
+
+class AudioVariants:
+    """
+    Převádí MP3 z cache na úspornější varianty pro pomalá (mobilní) připojení.
+
+    Varianta se vytváří při prvním vyžádání a ukládá se do cache vedle
+    zdrojového souboru (`ab/<klíč>.opus`), se kterým se i maže. Souběžné
+    požadavky na stejnou variantu čekají na jediný převod a počet běžících
+    procesů ffmpeg je omezený; zbytky přerušeného převodu (.part) smaže úklid
+    cache. Když ffmpeg chybí, převod selže nebo by
+    varianta nebyla menší než zdroj, vrátí se None a posílá se původní MP3.
+    """
+
+    def __init__(self, cache: AudioCache, variants: Optional[Dict[str, Variant]] = None, enabled: Optional[List[str]] = None,
+                 ffmpeg: str = "ffmpeg", max_concurrency: int = 2):
+        """
+        Args:
+            cache: Audio cache se zdrojovými soubory
+            variants: Dostupné varianty (výchozí default_variants())
+            enabled: Povolené názvy variant (None = všechny)
+            ffmpeg: Cesta k ffmpeg
+            max_concurrency: Max. počet souběžných převodů
+        """
+        self.cache = cache
+        self.ffmpeg = shutil.which(ffmpeg)
+        variants = variants if variants is not None else default_variants()
+        self.variants = {name: variant for name, variant in variants.items() if enabled is None or name in enabled}
+        if self.variants and not self.ffmpeg:
+            logger.warning("ffmpeg not found, audio variants disabled")
+            self.variants = {}
+
+        self.transcoded = 0
+        self.failed = 0
+        self.not_smaller = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Zdroje, u kterých varianta nepomůže (nebo selhala) - znovu se nepřevádí
+        self._skip: Dict[Tuple[str, str], None] = {}
+
+    def choose(self, requested: Optional[str], save_data: bool = False, accept: str = "") -> Optional[str]:
+        """
+        Vybere variantu pro klienta.
+
+        Výslovně vyžádaná varianta (?variant=) má přednost; 'original' nebo
+        neznámý název znamená původní MP3. Jinak se varianta použije jen
+        u klientů s hlavičkou `Save-Data: on` - Opus, pokud ho klient
+        v Accept výslovně uvádí, jinak MP3 s nižším tokem.
+
+        Args:
+            requested: Název varianty z URL nebo None
+            save_data: Zda klient poslal Save-Data: on
+            accept: Hlavička Accept
+
+        Returns:
+            str: Název varianty nebo None pro původní soubor
+        """
+        if requested is not None:
+            return requested if requested in self.variants else None
+        if not save_data:
+            return None
+        if "opus" in self.variants and any(t in accept for t in ("audio/ogg", "audio/opus", "audio/webm")):
+            return "opus"
+        return "low" if "low" in self.variants else None
+
+    def media_type(self, name: Optional[str]) -> str:
+        return self.variants[name].media_type if name in self.variants else "audio/mpeg"
+
+    async def get(self, filename: str, name: str) -> Optional[str]:
+        """
+        Vrátí soubor varianty, případně ho nejdřív vytvoří.
+
+        Args:
+            filename: Název zdrojového MP3 v cache
+            name: Název varianty
+
+        Returns:
+            str: Název souboru varianty, nebo None (použije se zdroj)
+        """
+        if name not in self.variants or (filename, name) in self._skip:
+            return None
+
+        existing = self.cache.variant(filename, name)
+        if existing:
+            return existing
+
+        # Převod běží jako samostatná úloha, aby ho odpojení klienta nepřerušilo
+        task = self._inflight.get((filename, name))
+        if task is None:
+            task = asyncio.create_task(self._transcode(filename, name))
+            self._inflight[(filename, name)] = task
+            task.add_done_callback(lambda _: self._inflight.pop((filename, name), None))
+        return await asyncio.shield(task)
+
+    async def _transcode(self, filename: str, name: str) -> Optional[str]:
+        """
+        Převede zdroj na variantu; s více procesy jen v jednom z nich,
+        ostatní počkají na jeho výsledek.
+        """
+        variant = self.variants[name]
+        source = os.path.join(self.cache.directory, filename)
+        variant_filename = f"{os.path.splitext(filename)[0]}{variant.suffix}"
+        output_path = os.path.join(self.cache.directory, variant_filename)
+        tmp_path = f"{output_path}.{os.getpid()}.part"
+
+        # S více procesy převádí stejnou variantu jen jeden z nich
+        lease = f"variant:{variant_filename}"
+        shared = self.cache.shared
+        if shared and not shared.try_acquire(lease):
+            return await shared.wait_for(lease, lambda: self.cache.variant(filename, name))
+        try:
+            return await self._run_ffmpeg(filename, name, variant_filename, source, output_path, tmp_path)
+        finally:
+            if shared:
+                shared.release(lease)
+
+    async def _run_ffmpeg(self, filename: str, name: str, variant_filename: str, source: str, output_path: str,
+                          tmp_path: str) -> Optional[str]:
+        """
+        Spustí ffmpeg a zařadí výsledek do cache.
+        """
+        variant = self.variants[name]
+        async with self._semaphore:
+            # Soubor mohl mezitím vzniknout v jiném požadavku
+            existing = self.cache.variant(filename, name)
+            if existing:
+                return existing
+
+            started = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                self.ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-i", source,
+                "-vn", "-ac", "1", *variant.codec_args, tmp_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await process.communicate()
+
+        if process.returncode != 0 or not os.path.exists(tmp_path):
+            self.failed += 1
+            self._remember_skip(filename, name)
+            ERRORS.inc(stage="transcode")
+            logger.error(f"Audio transcode to {name} failed for {filename}: {stderr.decode(errors='replace').strip()[-300:]}")
+            self._remove(tmp_path)
+            return None
+
+        TRANSCODE.observe(time.perf_counter() - started, variant=name)
+        if os.path.getsize(tmp_path) >= os.path.getsize(source):
+            # Např. Edge TTS už posílá 48 kb/s - nižší tok by soubor zvětšil
+            self.not_smaller += 1
+            self._remember_skip(filename, name)
+            self._remove(tmp_path)
+            return None
+
+        os.replace(tmp_path, output_path)
+        if not self.cache.add_variant(filename, name, variant_filename):
+            return None
+        self.transcoded += 1
+        return variant_filename
+
+    def _remember_skip(self, filename: str, name: str):
+        self._skip[(filename, name)] = None
+        while len(self._skip) > MAX_SKIPPED:
+            del self._skip[next(iter(self._skip))]
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Vrátí statistiky převodů.
+
+        Returns:
+            dict: Povolené varianty a počty převodů
+        """
+        return {
+            "enabled": sorted(self.variants),
+            "transcoded": self.transcoded,
+            "failed": self.failed,
+            "not_smaller": self.not_smaller,
+            "in_progress": len(self._inflight),
+        }
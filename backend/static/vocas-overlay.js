@@ -34,6 +34,13 @@
 
     let audioPlayer = new Audio();
 
+    // Smaller audio encoding on slow or metered connections (null = original MP3)
+    function audioVariant() {
+        const connection = navigator.connection;
+        if (!connection || !(connection.saveData || /2g|3g/.test(connection.effectiveType || ''))) return null;
+        return audioPlayer.canPlayType('audio/ogg; codecs="opus"') ? 'opus' : 'low';
+    }
+
     // --- Link Interception ---
     document.addEventListener('click', function(e) {
         let target = e.target.closest('a');
@@ -72,28 +79,41 @@
         if (timeout) setTimeout(() => statusEl.style.display = 'none', timeout);
     }
 
-    async function processPage(mode) {
-        showStatus(mode === 'read' ? 'Zpracovávám text...' : 'Vytvářím souhrn...', 0);
-        
-        // Use Readability to find content
-        // We clone the document because Readability mutates the DOM
-        const documentClone = document.cloneNode(true); 
-        // We need to verify if Readability is loaded
-        if (typeof Readability === 'undefined') {
-            showStatus("Chyba: Readability library not loaded!");
-            return;
+    const READABILITY_URL = 'https://unpkg.com/@mozilla/readability@0.4.4/Readability.js';
+    let readabilityLoading = null;
+
+    // Readability is only needed when server-side extraction finds nothing,
+    // so it is loaded on demand instead of on every page
+    function loadReadability() {
+        if (typeof Readability !== 'undefined') return Promise.resolve();
+        if (!readabilityLoading) {
+            readabilityLoading = new Promise((resolve, reject) => {
+                const script = document.createElement('script');
+                script.src = READABILITY_URL;
+                script.onload = resolve;
+                script.onerror = () => {
+                    readabilityLoading = null;
+                    reject(new Error('Readability library not loaded!'));
+                };
+                document.head.appendChild(script);
+            });
         }
+        return readabilityLoading;
+    }
+
+    async function extractText() {
+        await loadReadability();
 
+        // We clone the document because Readability mutates the DOM
+        const documentClone = document.cloneNode(true);
         const reader = new Readability(documentClone);
         const article = reader.parse();
 
-        if (!article || !article.textContent) {
-            showStatus("Nepodařilo se najít hlavní obsah článku.");
-            return;
-        }
+        return article && article.textContent ? article.textContent : null;
+    }
 
-        const textContent = article.textContent;
-        console.log("Extracted text length:", textContent.length);
+    async function processPage(mode) {
+        showStatus(mode === 'read' ? 'Zpracovávám text...' : 'Vytvářím souhrn...', 0);
 
         try {
             // ROBUST URL STRATEGY: Use window.location.origin
@@ -104,28 +124,54 @@
             
             console.log("Vocas calling API:", apiUrl);
             
-            const response = await fetch(apiUrl, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    text: textContent,
-                    mode: mode
-                })
-            });
+            // Stream audio so playback starts before synthesis finishes
+            const options = { mode: mode, stream: true };
+            let response = null;
+
+            // Server-side extraction: the proxy already has the page, send only its URL
+            if (window.VOCAS_PAGE_URL) {
+                response = await fetch(apiUrl + '?url=' + encodeURIComponent(window.VOCAS_PAGE_URL), {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(options)
+                });
+            }
+
+            // No article found on the server (or unknown page URL) - extract here
+            if (!response || response.status === 422) {
+                const textContent = await extractText();
+                if (!textContent) {
+                    showStatus("Nepodařilo se najít hlavní obsah článku.");
+                    return;
+                }
+                console.log("Extracted text length:", textContent.length);
+
+                response = await fetch(apiUrl, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ ...options, text: textContent, source: window.VOCAS_PAGE_URL || null })
+                });
+            }
 
             if (!response.ok) throw new Error('API Error: ' + response.status);
 
             const data = await response.json();
             
-            showStatus('Přehrávám audio...');
+            showStatus(data.audio_url.startsWith('/api/stream/') ? 'Připravuji audio...' : 'Přehrávám audio...', 0);
             
             // Ensure audio URL is absolute
             let audioUrl = data.audio_url;
             if (audioUrl.startsWith('/')) {
                 audioUrl = apiOrigin + audioUrl;
             }
+            const variant = audioVariant();
+            if (variant) {
+                audioUrl += '?variant=' + variant;
+            }
             
             audioPlayer.src = audioUrl;
+            audioPlayer.onplaying = () => showStatus('Přehrávám audio...');
+            audioPlayer.onerror = () => showStatus('Chyba při přehrávání audia');
             audioPlayer.play();
 
         } catch (e) {
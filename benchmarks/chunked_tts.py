@@ -0,0 +1,63 @@
+"""
+Wall-clock synthesis time vs. chunk count for sentence-chunked parallel TTS.
+
+The stub provider has a fixed per-request overhead plus a per-character cost,
+roughly like a cloud TTS API. Smaller chunks mean more requests in parallel
+(up to --concurrency at a time) but more per-request overhead.
+
+Usage (from the repository root):
+    python benchmarks/chunked_tts.py --chars 12000 --latency 0.4 --per-char 0.0008 --concurrency 4
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import StubTTS, make_tts_service
+
+SENTENCES = [
+    "Vláda dnes schválila návrh státního rozpočtu na příští rok.",
+    "Podle ministra financí se schodek oproti letošku sníží o několik miliard korun.",
+    "Opozice návrh kritizuje, např. kvůli nižším výdajům na dopravní stavby.",
+    "O rozpočtu bude sněmovna hlasovat 17. listopadu.",
+    "Ekonomové upozorňují, že odhad růstu může být příliš optimistický.",
+]
+
+
+def make_text(chars: int) -> str:
+    sentences = []
+    length = 0
+    while length < chars:
+        sentence = SENTENCES[len(sentences) % len(SENTENCES)]
+        sentences.append(sentence)
+        length += len(sentence) + 1
+        if len(sentences) % 4 == 0:
+            sentences.append("\n\n")
+    return " ".join(sentences)
+
+
+async def run(chars: int, latency: float, per_char: float, concurrency: int):
+    text = make_text(chars)
+    print(f"text: {len(text)} chars, request overhead {latency}s, {per_char * 1000:.2f} ms/char, concurrency {concurrency}")
+    print(f"{'chunk chars':>12} {'chunks':>7} {'wall-clock':>11}")
+
+    for chunk_chars in (len(text) + 1, 6000, 3000, 1500, 750, 375):
+        service = make_tts_service(StubTTS(latency, chunks=4, per_char=per_char))
+        service.chunk_chars = chunk_chars
+        service.max_concurrency = concurrency
+
+        started = time.perf_counter()
+        await service.generate_audio(text)
+        elapsed = time.perf_counter() - started
+
+        print(f"{chunk_chars:>12} {len(service._split(text)):>7} {elapsed:>10.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chars", type=int, default=12000)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--per-char", type=float, default=0.0008)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.chars, args.latency, args.per_char, args.concurrency))
@@ -0,0 +1,91 @@
+"""
+Checks that /api/process requests run concurrently instead of blocking the event loop.
+
+Gemini and the TTS provider are replaced by stubs with a fixed latency, then
+N different requests are sent in parallel. The job worker pools are sized to
+N, so with a non-blocking pipeline the wall-clock time stays close to a single
+request's latency, not N times it (see job_queue.py for bounded pools).
+
+Before that, a check asserts that N parallel generate_audio() calls for the
+same text share a single synthesis instead of each calling the provider.
+
+Usage (from the repository root):
+    python benchmarks/concurrency.py --requests 20 --llm-latency 0.5 --tts-latency 0.5
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import StubTTS, install_stubs, make_tts_service
+
+from services.ratelimit import RateGovernor
+
+import httpx
+
+import main
+
+
+class CountingTTS(StubTTS):
+    """
+    Stub provider counting the syntheses it was asked for.
+    """
+
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.calls = 0
+
+    def generate(self, text: str, output_path: str) -> str:
+        self.calls += 1
+        return super().generate(text, output_path)
+
+    async def stream(self, text: str):
+        self.calls += 1
+        async for chunk in super().stream(text):
+            yield chunk
+
+
+async def check_single_synthesis(requests: int, latency: float):
+    provider = CountingTTS(latency)
+    service = make_tts_service(provider)
+    files = await asyncio.gather(*(service.generate_audio("Stejný článek pro všechny.") for _ in range(requests)))
+    assert all(files) and len(set(files)) == 1, files
+    assert provider.calls == 1, f"{requests} parallel requests synthesized {provider.calls} times"
+    print(f"{requests} parallel generate_audio() calls for the same text: 1 synthesis, ok")
+
+
+async def run(requests: int, llm_latency: float, tts_latency: float):
+    install_stubs(main, llm_latency, tts_latency)
+    # ASGITransport doesn't run startup events
+    main.job_manager.llm_workers = main.job_manager.tts_workers = requests
+    main.llm_service.governor = RateGovernor("gemini", max_in_flight=requests)
+    main.job_manager.start()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int) -> float:
+            started = time.perf_counter()
+            response = await client.post("/api/process", json={"text": f"Článek číslo {i}.", "mode": "read"})
+            response.raise_for_status()
+            return time.perf_counter() - started
+
+        single = await one(-1)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        parallel = time.perf_counter() - started
+
+    await main.job_manager.stop()
+
+    print(f"single request:        {single:.2f}s")
+    print(f"{requests} parallel requests: {parallel:.2f}s ({parallel / single:.1f}x single)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    asyncio.run(check_single_synthesis(args.requests, args.tts_latency))
+    asyncio.run(run(args.requests, args.llm_latency, args.tts_latency))
@@ -0,0 +1,81 @@
+"""
+Requests per second through /read/ with the default and the tuned upstream pool.
+
+A local fake news site (fake_site.py) serves articles with `Cache-Control:
+no-store`, so every /read/ request goes upstream. The proxy is run once with
+a plain httpx.AsyncClient (default limits: 20 keepalive connections, a name
+lookup per new connection) and once with the client from ConnectionSettings
+(HTTP_MAX_KEEPALIVE, DNS cache). The site is addressed as `localhost` so
+name resolution is part of the measurement; the number of TCP connections
+the site saw is printed as well. The local site speaks HTTP/1.1 only, so
+HTTP/2 multiplexing is not measured here.
+
+Usage (from the repository root):
+    python benchmarks/connection_pool.py --concurrency 50 --requests 2000
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import serve
+from fake_site import FakeNewsSite, load_fixtures
+
+import httpx
+
+import main
+from services.http_client import ConnectionSettings, USER_AGENT
+
+
+def make_client(tuned: bool) -> httpx.AsyncClient:
+    options = {"follow_redirects": True, "timeout": 30.0, "headers": {"User-Agent": USER_AGENT}}
+    if tuned:
+        return ConnectionSettings().async_client(**options)
+    return httpx.AsyncClient(**options)
+
+
+async def run_once(tuned: bool, concurrency: int, requests: int, site_latency: float, paragraphs: int) -> dict:
+    site = FakeNewsSite(load_fixtures(), latency=site_latency, cache_control="no-store", paragraphs=paragraphs)
+    main.proxy_service.client = make_client(tuned)
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async with serve(site) as site_url, serve(main.app) as base_url:
+        site_url = site_url.replace("127.0.0.1", "localhost")
+        async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=httpx.Limits(max_connections=concurrency)) as client:
+            async def one(i: int):
+                nonlocal errors
+                async with semaphore:
+                    response = await client.get(f"/read/{site_url}/clanek/{i}")
+                    if response.status_code != 200:
+                        errors += 1
+
+            # Warm up both pools before timing
+            await asyncio.gather(*(one(i) for i in range(concurrency)))
+            site.connections.clear()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            elapsed = time.perf_counter() - started
+
+    await main.proxy_service.client.aclose()
+    return {
+        "pool": "tuned" if tuned else "default",
+        "throughput": requests / elapsed,
+        "connections": len(site.connections),
+        "errors": errors,
+    }
+
+
+async def run(args):
+    for tuned in (False, True):
+        result = await run_once(tuned, args.concurrency, args.requests, args.site_latency, args.paragraphs)
+        print(f"{result['pool']:<8} {result['throughput']:>8.1f} req/s  upstream connections {result['connections']:<5} errors {result['errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--site-latency", type=float, default=0.0)
+    parser.add_argument("--paragraphs", type=int, default=12)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""
+Local stand-in for the news sites Vocas proxies.
+
+Serves homepages (saved fixtures or a synthetic one) at /<name>/ and
+synthetic Czech articles at /clanek/<id>, with a configurable response
+latency and Cache-Control header. It is a bare ASGI app so it can run on
+the same uvicorn helper as the app under test.
+"""
+import os
+import glob
+import asyncio
+
+PARAGRAPHS = [
+    "Vláda dnes schválila návrh státního rozpočtu na příští rok, o kterém bude sněmovna hlasovat 17. listopadu.",
+    "Podle ministra financí se schodek oproti letošku sníží o několik miliard korun, např. díky nižším výdajům na provoz úřadů.",
+    "Opozice návrh kritizuje a upozorňuje, že odhad hospodářského růstu může být příliš optimistický.",
+    "Ekonomové se shodují, že rozhodující bude vývoj inflace a cen energií v zimních měsících.",
+    "Hejtmani zároveň žádají více peněz na opravy silnic II. a III. třídy, které spravují kraje.",
+]
+
+
+def synthetic_homepage(articles: int = 3500) -> bytes:
+    teaser = (
+        '<article class="teaser"><a href="/clanek/{i}-vlada-schvalila-rozpocet?utm_source=hp&amp;pos={i}">'
+        '<img src="/img/{i}.jpg" alt="Foto {i}"></a><h2><a href="/clanek/{i}">Vláda schválila rozpočet č. {i}</a></h2>'
+        '<p>Podle ministra financí se schodek sníží. <a href="#komentare">Komentáře</a> '
+        '<a href="https://jiny-web.cz/tema/{i}" data-x="a>b">Téma</a></p>'
+        '<script>window.dataLayer.push({{"id": {i}, "html": "<a href=\'/x\'>"}});</script></article>\n'
+    )
+    head = (
+        '<!DOCTYPE html><html lang="cs"><head><meta charset="utf-8">'
+        '<meta http-equiv="Content-Security-Policy" content="default-src \'self\'">'
+        '<base href="/"><title>Zprávy</title><style>.teaser > a { color: red }</style>'
+        '<!-- <a href="/v-komentari"> --></head><body><nav><a href="/">Domů</a></nav>\n'
+    )
+    body = "".join(teaser.format(i=i) for i in range(articles))
+    return (head + body + "</body></html>").encode("utf-8")
+
+
+def synthetic_article(article_id: int, paragraphs: int = 12) -> bytes:
+    """
+    An article page with navigation and footer clutter around the story,
+    long enough for server-side extraction.
+    """
+    story = "".join(
+        f"<p>{PARAGRAPHS[(article_id + i) % len(PARAGRAPHS)]} (Článek {article_id}, odstavec {i + 1}.)</p>"
+        for i in range(paragraphs)
+    )
+    return (
+        '<!DOCTYPE html><html lang="cs"><head><meta charset="utf-8">'
+        f"<title>Vláda schválila rozpočet č. {article_id}</title></head><body>"
+        '<nav><a href="/">Domů</a> <a href="/domaci">Domácí</a> <a href="/svet">Svět</a></nav>'
+        f"<article><h1>Vláda schválila rozpočet č. {article_id}</h1>"
+        '<p class="byline">Autor: Redakce, dnes 8:00</p>'
+        f"{story}</article>"
+        '<aside><h3>Nejčtenější</h3><ul><li><a href="/clanek/1">Jiný článek</a></li></ul></aside>'
+        "<footer>© Zprávy. Všechna práva vyhrazena.</footer></body></html>"
+    ).encode("utf-8")
+
+
+def load_fixtures(directory=None) -> dict:
+    if not directory:
+        return {"synthetic": synthetic_homepage()}
+    return {os.path.splitext(os.path.basename(path))[0]: open(path, "rb").read()
+            for path in sorted(glob.glob(os.path.join(directory, "*.html")))}
+
+
+class FakeNewsSite:
+    """
+    ASGI app serving `homepages` ({name: html bytes}) and generated articles.
+    """
+
+    def __init__(self, homepages: dict, latency: float = 0.0, cache_control: str = "max-age=60", paragraphs: int = 12):
+        self.homepages = homepages
+        self.latency = latency
+        self.cache_control = cache_control
+        self.paragraphs = paragraphs
+        self.requests = 0
+        # (host, port) of every client connection, i.e. how many connections the proxy opened
+        self.connections = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                await send({"type": message["type"] + ".complete"})
+                if message["type"] == "lifespan.shutdown":
+                    return
+        if scope["type"] != "http":
+            return
+        self.requests += 1
+        if scope.get("client"):
+            self.connections.add(tuple(scope["client"]))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        parts = scope["path"].strip("/").split("/")
+        body = None
+        if len(parts) == 1 and parts[0] in self.homepages:
+            body = self.homepages[parts[0]]
+        elif len(parts) == 2 and parts[0] == "clanek":
+            article_id = parts[1].split("-", 1)[0]
+            if article_id.isdigit():
+                body = synthetic_article(int(article_id), self.paragraphs)
+
+        status = 200 if body is not None else 404
+        body = body if body is not None else b"Not found"
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"text/html; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"cache-control", self.cache_control.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,50 @@
+"""
+Measures time to first audio byte: buffered /api/process vs. the streaming endpoint.
+
+The buffered path waits for the LLM step and the whole synthesis before the
+client gets an URL; the streaming path returns an URL immediately and the
+first MP3 chunk arrives as soon as the provider produces it.
+
+Usage (from the repository root):
+    python benchmarks/first_audio.py --llm-latency 1 --tts-latency 10
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import install_stubs, serve
+
+import httpx
+
+import main
+
+
+async def first_byte(client: httpx.AsyncClient, text: str, stream: bool) -> float:
+    started = time.perf_counter()
+    response = await client.post("/api/process", json={"text": text, "mode": "read", "stream": stream})
+    response.raise_for_status()
+
+    async with client.stream("GET", response.json()["audio_url"]) as audio:
+        async for _ in audio.aiter_bytes():
+            return time.perf_counter() - started
+
+
+async def run(llm_latency: float, tts_latency: float, chunks: int):
+    install_stubs(main, llm_latency, tts_latency, chunks)
+
+    async with serve(main.app) as base_url, httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        buffered = await first_byte(client, "Buffered article.", stream=False)
+        streamed = await first_byte(client, "Streamed article.", stream=True)
+
+    print(f"buffered  /api/process: first audio after {buffered:.2f}s")
+    print(f"streaming /api/stream:  first audio after {streamed:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--tts-latency", type=float, default=10.0)
+    parser.add_argument("--chunks", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.llm_latency, args.tts_latency, args.chunks))
@@ -0,0 +1,69 @@
+"""
+Tail latency of TTS requests with a slow primary provider, with and without hedging.
+
+The primary stub answers most requests quickly but a --slow-share of them
+takes --slow-factor times longer; the backup stub is a bit slower but never
+stalls. Hedging fires the backup once the primary exceeds its p95 latency
+and keeps whichever answers first. Measured for streamed audio and for
+whole files from TTSService.generate_audio() (the /api/process path).
+
+Usage (from the repository root):
+    python benchmarks/hedged_tts.py --requests 200 --latency 0.1 --slow-share 0.05 --slow-factor 20
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import StubTTS, make_tts_service
+
+from services.tts import ProviderChain
+
+
+def percentile(values, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def run(requests: int, latency: float, slow_share: float, slow_factor: float):
+    print(f"{requests} requests, primary {latency}s ({slow_share:.0%} take {slow_factor:.0f}x), backup {latency * 1.5:.2f}s")
+    print(f"{'kind':>6} {'hedging':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'hedges':>7}")
+
+    for kind in ("stream", "file"):
+        for hedge in (False, True):
+            await measure(kind, hedge, requests, latency, slow_share, slow_factor)
+
+
+async def measure(kind: str, hedge: bool, requests: int, latency: float, slow_share: float, slow_factor: float):
+    primary = StubTTS(latency, chunks=4, slow_share=slow_share, slow_factor=slow_factor, name="primary")
+    backup = StubTTS(latency * 1.5, chunks=4, name="backup")
+    chain = ProviderChain([primary, backup], hedge=hedge, hedge_min_samples=10, hedge_delay=latency * 3)
+    service = make_tts_service(chain)
+
+    async def one(i: int) -> float:
+        started = time.perf_counter()
+        if kind == "file":
+            if not await service.generate_audio(f"Věta číslo {i}."):
+                raise RuntimeError("Synthesis failed")
+        else:
+            async for _ in chain.stream(f"Věta číslo {i}."):
+                pass
+        return time.perf_counter() - started
+
+    latencies = []
+    # Small batches so the latency window fills up while the benchmark runs
+    for batch in range(0, requests, 10):
+        latencies += await asyncio.gather(*(one(i) for i in range(batch, min(requests, batch + 10))))
+
+    hedges = sum(entry["hedges"] for entry in chain.stats())
+    print(f"{kind:>6} {'on' if hedge else 'off':>8} {percentile(latencies, 0.5):>6.2f}s {percentile(latencies, 0.95):>6.2f}s {percentile(latencies, 0.99):>6.2f}s {hedges:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--slow-share", type=float, default=0.05)
+    parser.add_argument("--slow-factor", type=float, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.latency, args.slow_share, args.slow_factor))
@@ -0,0 +1,95 @@
+"""
+Compares the BeautifulSoup and streaming HTML rewrite engines.
+
+For every fixture page both engines rewrite the same upstream bytes; the
+script checks that the outputs are equivalent and reports latency and peak
+memory (tracemalloc) for each engine. bs4 re-serializes the whole document
+while the streaming engine passes untouched markup through verbatim, so
+outputs are compared after normalizing both through html.parser.
+
+Without --fixtures a synthetic ~1.5 MB news homepage is used. Save real
+homepages with e.g. `curl -o fixtures/ct24.html https://ct24.ceskatelevize.cz/`.
+
+Usage (from the repository root):
+    python benchmarks/html_rewrite.py --fixtures path/to/saved/homepages --runs 5
+"""
+import re
+import time
+import argparse
+import statistics
+import tracemalloc
+
+import stubs  # noqa: F401 - puts backend/ on sys.path
+from fake_site import load_fixtures
+
+from bs4 import BeautifulSoup
+
+from services.proxy import ProxyService, REWRITE_CHUNK_SIZE
+from services.html_rewriter import rewrite_chunks
+
+URL = "https://zpravy.example.cz/"
+BASE_HOST = "http://localhost:5000"
+
+# Small pages with markup the tokenizer must handle like html.parser,
+# checked for equivalence along with the fixtures
+EDGE_CASES = {
+    "unquoted-attributes": (
+        '<!DOCTYPE html><html><head><meta charset=windows-1250><title>T</title></head><body>'
+        '<a href=/clanek?id=5&page=2 class=x>Článek</a> <a class=y href=clanek/6?a=b=c>Další</a>'
+        '<a href=https://ct24.cz/zpravy?x=1#k>Jinam</a></body></html>'
+    ).encode("utf-8"),
+}
+
+
+def normalize(html: str) -> str:
+    return re.sub(r">\s+<", "><", str(BeautifulSoup(html, "html.parser")))
+
+
+def soup_engine(content: bytes) -> int:
+    proxy = ProxyService.__new__(ProxyService)
+    return len(proxy.render(content, "utf-8", URL, BASE_HOST))
+
+
+def stream_engine(content: bytes) -> int:
+    # Consume chunks like StreamingResponse does, without joining them
+    view = memoryview(content)
+    slices = (view[i:i + REWRITE_CHUNK_SIZE] for i in range(0, len(view), REWRITE_CHUNK_SIZE))
+    return sum(len(chunk) for chunk in rewrite_chunks(slices, "utf-8", URL, BASE_HOST))
+
+
+def measure(engine, content: bytes, runs: int):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        engine(content)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    engine(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main(fixtures_dir, runs: int):
+    proxy = ProxyService.__new__(ProxyService)
+
+    print(f"{'fixture':<24} {'size':>8} {'engine':>7} {'median':>9} {'peak mem':>10} equivalent")
+    for name, content in {**load_fixtures(fixtures_dir), **EDGE_CASES}.items():
+        soup_html = proxy.render(content, "utf-8", URL, BASE_HOST)
+        stream_html = "".join(rewrite_chunks([content], "utf-8", URL, BASE_HOST))
+        equivalent = normalize(soup_html) == normalize(stream_html)
+
+        for engine_name, engine in (("soup", soup_engine), ("stream", stream_engine)):
+            latency, peak = measure(engine, content, runs)
+            print(f"{name:<24} {len(content) / 1024:>6.0f}KB {engine_name:>7} {latency * 1000:>7.1f}ms "
+                  f"{peak / 1024 / 1024:>8.1f}MB {'yes' if equivalent else 'NO'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", help="directory with saved *.html homepages (UTF-8)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    main(args.fixtures, args.runs)
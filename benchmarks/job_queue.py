@@ -0,0 +1,77 @@
+"""
+Latency and throughput of the job queue under a burst of submissions.
+
+A burst of N different jobs is posted to /api/jobs at once and each one is
+polled until it finishes. With bounded worker pools the jobs queue up instead
+of all hitting Gemini and TTS at the same time; submissions beyond
+--max-queued are rejected with 503.
+
+Usage (from the repository root):
+    python benchmarks/job_queue.py --jobs 50 --llm-workers 4 --tts-workers 2 --max-queued 40
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import install_stubs
+
+import httpx
+
+import main
+
+
+def percentile(values, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def run(jobs: int, llm_workers: int, tts_workers: int, max_queued: int, llm_latency: float, tts_latency: float):
+    install_stubs(main, llm_latency, tts_latency)
+    manager = main.job_manager
+    manager.llm_workers = llm_workers
+    manager.tts_workers = tts_workers
+    manager.max_queued = max_queued
+    # ASGITransport doesn't run startup events
+    manager.start()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            started = time.perf_counter()
+            response = await client.post("/api/jobs", json={"text": f"Článek číslo {i}.", "mode": "read"})
+            if response.status_code == 503:
+                return None
+            response.raise_for_status()
+            status_url = response.json()["status_url"]
+            while True:
+                job = (await client.get(status_url)).json()
+                if job["status"] in ("done", "failed"):
+                    return time.perf_counter() - started
+                await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(jobs)))
+        elapsed = time.perf_counter() - started
+
+    await manager.stop()
+
+    latencies = [r for r in results if r is not None]
+    print(f"workers: llm={llm_workers}, tts={tts_workers}, max queued {max_queued}")
+    print(f"accepted {len(latencies)}/{jobs}, rejected {jobs - len(latencies)}")
+    print(f"wall-clock {elapsed:.2f}s, throughput {len(latencies) / elapsed:.1f} jobs/s")
+    if latencies:
+        print(f"latency p50 {percentile(latencies, 0.5):.2f}s, p95 {percentile(latencies, 0.95):.2f}s, max {max(latencies):.2f}s")
+    print(f"avg queue wait {manager.stats()['avg_queue_wait']:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--llm-workers", type=int, default=4)
+    parser.add_argument("--tts-workers", type=int, default=2)
+    parser.add_argument("--max-queued", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.jobs, args.llm_workers, args.tts_workers, args.max_queued, args.llm_latency, args.tts_latency))
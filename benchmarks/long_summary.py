@@ -0,0 +1,68 @@
+"""
+Summarization time for long articles: one Gemini call vs. map-reduce over sections.
+
+The stub model takes --latency plus --per-char seconds per input character
+and returns the first --output-chars characters, like a summary. The same
+article is then summarized again after one paragraph was edited, to show
+how many sections are served from the cache.
+
+Usage (from the repository root):
+    python benchmarks/long_summary.py --chars 60000 --latency 1 --per-char 0.0001
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import StubGeminiModel
+from fake_site import PARAGRAPHS
+
+from services.llm import LLMService
+
+
+def make_service(args, single_max_chars: int) -> LLMService:
+    service = LLMService(api_key=None)
+    service.client = StubGeminiModel(args.latency, output_chars=args.output_chars, per_char=args.per_char)
+    service.summary_single_max_chars = single_max_chars
+    service.summary_concurrency = args.concurrency
+    return service
+
+
+def make_article(chars: int) -> list:
+    paragraphs = []
+    while sum(len(p) + 1 for p in paragraphs) < chars:
+        i = len(paragraphs)
+        paragraphs.append(f"{PARAGRAPHS[i % len(PARAGRAPHS)]} {PARAGRAPHS[(i + 2) % len(PARAGRAPHS)]} (Odstavec {i + 1}.)")
+    return paragraphs
+
+
+async def timed(service: LLMService, text: str) -> tuple:
+    calls = service.client.calls
+    started = time.perf_counter()
+    await service.summarize_text(text)
+    return time.perf_counter() - started, service.client.calls - calls
+
+
+async def run(args):
+    paragraphs = make_article(args.chars)
+    text = "\n".join(paragraphs)
+    paragraphs[len(paragraphs) // 2] = "Aktualizace: ministr své vyjádření upřesnil. " + paragraphs[len(paragraphs) // 2]
+    edited = "\n".join(paragraphs)
+
+    print(f"article {len(text)} chars, {args.latency}s + {args.per_char * 1000:.2f} ms/char per call, concurrency {args.concurrency}")
+    print(f"{'engine':<12} {'first':>8} {'calls':>6} {'edited':>8} {'calls':>6}")
+    for name, single_max_chars in (("single call", len(text) * 2), ("map-reduce", args.single_max_chars)):
+        service = make_service(args, single_max_chars)
+        first, first_calls = await timed(service, text)
+        again, again_calls = await timed(service, edited)
+        print(f"{name:<12} {first:>7.2f}s {first_calls:>6} {again:>7.2f}s {again_calls:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chars", type=int, default=60000)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--per-char", type=float, default=0.0001)
+    parser.add_argument("--output-chars", type=int, default=400)
+    parser.add_argument("--single-max-chars", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=6)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""
+Front page to audio: N sequential /api/process calls vs one playlist.
+
+A local fake news site (fake_site.py) serves a section page and articles
+with --site-latency per response. The sequential client calls
+/api/process?url= for each article in turn, as a listener clicking through
+the page would. The playlist client posts the section page to
+/api/playlists once and polls it: articles are extracted in parallel and
+queued through the job workers, so LLM and TTS of later items overlap
+with earlier ones. Both runs use different articles, so neither is helped
+by the other's caches. A second playlist of the same page shows cached
+audio being reused.
+
+Usage (from the repository root):
+    python benchmarks/playlist.py --articles 10 --llm-latency 1.0 --tts-latency 1.5 --site-latency 0.3
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import install_stubs, serve
+from fake_site import FakeNewsSite, synthetic_homepage
+
+import httpx
+
+import main
+
+
+async def sequential(client: httpx.AsyncClient, urls: list) -> tuple:
+    started = time.perf_counter()
+    first = None
+    for url in urls:
+        response = await client.post("/api/process", params={"url": url}, json={"mode": "read"})
+        response.raise_for_status()
+        if first is None:
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def playlist(client: httpx.AsyncClient, section: str, articles: int) -> tuple:
+    started = time.perf_counter()
+    response = await client.post("/api/playlists", json={"section": section, "limit": articles, "mode": "read"})
+    response.raise_for_status()
+    status_url = f"/api/playlists/{response.json()['playlist_id']}"
+
+    first = None
+    while True:
+        data = (await client.get(status_url)).json()
+        if first is None and data["items"] and data["items"][0]["ready"]:
+            first = time.perf_counter() - started
+        if not data["building"] and all(item["status"] in ("done", "failed") for item in data["items"]):
+            return first, time.perf_counter() - started, data
+        await asyncio.sleep(0.02)
+
+
+async def run(args):
+    install_stubs(main, args.llm_latency, args.tts_latency)
+    main.playlist_manager.tts_service = main.tts_service
+    main.job_manager.llm_workers = args.llm_workers
+    main.job_manager.tts_workers = args.tts_workers
+
+    # Articles 0..N-1 are on the section page; the sequential run reads N..2N-1
+    site = FakeNewsSite({"domaci": synthetic_homepage(args.articles)}, latency=args.site_latency)
+
+    print(f"{args.articles} articles, site {args.site_latency}s, LLM {args.llm_latency}s, TTS {args.tts_latency}s, "
+          f"workers llm={args.llm_workers} tts={args.tts_workers}")
+    print(f"{'client':<18} {'first ready':>12} {'all ready':>10}")
+    async with serve(site) as site_url, serve(main.app) as base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            urls = [f"{site_url}/clanek/{i}" for i in range(args.articles, 2 * args.articles)]
+            first, total = await sequential(client, urls)
+            print(f"{'sequential':<18} {first:>11.2f}s {total:>9.2f}s")
+
+            first, total, data = await playlist(client, f"{site_url}/domaci/", args.articles)
+            failed = sum(1 for item in data["items"] if item["status"] == "failed")
+            print(f"{'playlist':<18} {first:>11.2f}s {total:>9.2f}s  ({len(data['items'])} items, {failed} failed)")
+
+            first, total, data = await playlist(client, f"{site_url}/domaci/", args.articles)
+            print(f"{'playlist (cached)':<18} {first:>11.2f}s {total:>9.2f}s")
+
+    stats = main.playlist_manager.stats()
+    print(f"audio reused for {stats['reused_audio']} of {stats['items']} playlist items")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--articles", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--tts-latency", type=float, default=1.5)
+    parser.add_argument("--site-latency", type=float, default=0.3)
+    parser.add_argument("--llm-workers", type=int, default=4)
+    parser.add_argument("--tts-workers", type=int, default=2)
+    asyncio.run(run(parser.parse_args()))
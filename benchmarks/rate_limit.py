@@ -0,0 +1,47 @@
+"""
+Success rate and latency of TTS calls against a provider that returns 429s.
+
+The stub provider throttles requests beyond --quota in flight, while the
+service allows --concurrency. Without retries the excess requests fail;
+with the rate governor they back off and are retried until they succeed.
+
+Usage (from the repository root):
+    python benchmarks/rate_limit.py --requests 20 --quota 2 --concurrency 8 --latency 0.3
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import StubTTS, make_tts_service
+
+
+async def run(requests: int, quota: int, concurrency: int, latency: float):
+    print(f"{requests} requests, provider quota {quota} in flight, service concurrency {concurrency}")
+    print(f"{'retries':>8} {'ok':>4} {'failed':>7} {'429s':>5} {'wall-clock':>11} {'avg wait':>9}")
+
+    for max_retries in (0, 4, 8):
+        provider = StubTTS(latency, chunks=2, throttle_above=quota)
+        service = make_tts_service(provider)
+        service.max_concurrency = concurrency
+        governor = service._get_governor()
+        governor.max_retries = max_retries
+        governor.backoff = latency / 2
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(service.generate_audio(f"Článek číslo {i}.") for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+        ok = sum(1 for r in results if r)
+        stats = governor.stats()
+        print(f"{max_retries:>8} {ok:>4} {requests - ok:>7} {provider.throttled:>5} {elapsed:>10.2f}s {stats['avg_queue_wait']:>8.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--quota", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.quota, args.concurrency, args.latency))
@@ -0,0 +1,62 @@
+"""
+Worker cold start: time to ready and RSS with lazy vs. eager provider imports.
+
+Each run starts a fresh interpreter that imports the app (backend/main.py)
+the way a new gunicorn worker does and reports startup.report(): seconds
+from process start until the app is ready, RSS and the SDKs that were
+imported. "eager" first imports every provider SDK (Edge TTS, ElevenLabs,
+boto3, Gemini), as the app did before the lazy registry; "lazy" imports
+only what TTS_PROVIDER and GEMINI_API_KEY need. SDKs that are not installed
+are skipped.
+
+Usage (from the repository root):
+    python benchmarks/startup.py --provider edge --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+CHILD = """
+import sys, json, importlib
+if sys.argv[1] == "eager":
+    for name in ("edge_tts", "elevenlabs.client", "boto3", "google.generativeai"):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+sys.path.insert(0, ".")
+import main
+from services import startup
+startup.mark_ready()
+print(json.dumps(startup.report()))
+"""
+
+
+def start_worker(mode: str, env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, mode], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(args):
+    env = {**os.environ, "TTS_PROVIDER": args.provider, "PREFETCH_SOURCES": "", "LOG_LEVEL": "WARNING"}
+    print(f"TTS_PROVIDER={args.provider}, {args.runs} runs, median")
+    print(f"{'imports':<8} {'ready':>8} {'RSS':>9}  SDKs loaded")
+    for mode in ("eager", "lazy"):
+        reports = [start_worker(mode, env) for _ in range(args.runs)]
+        ready = statistics.median(report["ready_seconds"] for report in reports)
+        rss = statistics.median(report["rss_mb"] or 0 for report in reports)
+        print(f"{mode:<8} {ready:>7.2f}s {rss:>6.1f} MB  {', '.join(reports[-1]['sdks_loaded'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--provider", default="edge")
+    parser.add_argument("--runs", type=int, default=5)
+    run(parser.parse_args())
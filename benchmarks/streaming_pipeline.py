@@ -0,0 +1,64 @@
+"""
+End-to-end latency of /api/stream with and without LLM_STREAMING.
+
+Without it the whole LLM response is awaited before synthesis starts, so the
+audio is complete after roughly LLM + TTS time. With it the LLM output is
+split into sentences as it arrives and each one is synthesized right away,
+so the total approaches max(LLM, TTS). The stub LLM emits the article word
+by word over --llm-latency seconds; the stub TTS takes --tts-latency plus
+--per-char seconds per character for every segment.
+
+Usage (from the repository root):
+    python benchmarks/streaming_pipeline.py --llm-latency 4 --tts-latency 0.5 --per-char 0.004
+"""
+import time
+import asyncio
+import argparse
+
+from stubs import StubGeminiModel, StubTTS, make_tts_service, serve
+from chunked_tts import make_text
+
+import httpx
+
+import main
+
+
+async def measure(client: httpx.AsyncClient, text: str) -> tuple:
+    started = time.perf_counter()
+    response = await client.post("/api/process", json={"text": text, "mode": "read", "stream": True})
+    response.raise_for_status()
+
+    first = None
+    size = 0
+    async with client.stream("GET", response.json()["audio_url"]) as audio:
+        async for chunk in audio.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - started
+            size += len(chunk)
+    return first, time.perf_counter() - started, size
+
+
+async def run(args):
+    main.llm_service.client = StubGeminiModel(args.llm_latency)
+    main.tts_service = make_tts_service(StubTTS(args.tts_latency, chunks=4, per_char=args.per_char))
+    main.tts_service.chunk_chars = args.chunk_chars
+
+    print(f"article {args.chars} chars, LLM {args.llm_latency}s, TTS {args.tts_latency}s + {args.per_char * 1000:.1f} ms/char per segment")
+    print(f"{'pipeline':<10} {'first audio':>12} {'last audio':>11} {'bytes':>9}")
+    async with serve(main.app) as base_url, httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for streaming in (False, True):
+            main.LLM_STREAMING = streaming
+            # A different article each run, so neither cache helps
+            text = f"Článek {int(streaming)}. " + make_text(args.chars)
+            first, last, size = await measure(client, text)
+            print(f"{'streamed' if streaming else 'sequential':<10} {first:>11.2f}s {last:>10.2f}s {size:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chars", type=int, default=2000)
+    parser.add_argument("--llm-latency", type=float, default=4.0)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    parser.add_argument("--per-char", type=float, default=0.004)
+    parser.add_argument("--chunk-chars", type=int, default=400)
+    asyncio.run(run(parser.parse_args()))
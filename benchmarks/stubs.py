@@ -0,0 +1,208 @@
+"""
+Stand-in providers and app setup shared by the benchmark scripts.
+
+Importing this module puts backend/ on sys.path and makes it the working
+directory, the same way the app is started in Docker.
+"""
+import os
+import sys
+import time
+import zlib
+import random
+import socket
+import asyncio
+import tempfile
+import threading
+import contextlib
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+import uvicorn
+
+from services.tts import TTSService
+from services.tts.base import BaseTTS
+
+# Roughly one second of 128 kbps MP3
+AUDIO_CHUNK = b"\xff\xfb" + b"\x00" * (16 * 1024 - 2)
+
+
+class StubGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiStream:
+    """
+    Streamed response: the output arrives word by word, spread evenly over the latency.
+    """
+
+    def __init__(self, text: str, latency: float):
+        self.text = text
+        self.latency = latency
+
+    async def __aiter__(self):
+        words = self.text.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield StubGeminiResponse(word if i == len(words) - 1 else word + " ")
+
+
+class StubGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel with a fixed response latency.
+
+    Echoes the input text, cut to `output_chars` when set (like a summary,
+    tagged with a checksum of the input).
+    A call takes `latency` plus `per_char` seconds per input character.
+    With stream=True the text arrives in pieces over the same latency.
+    """
+
+    def __init__(self, latency: float, output_chars: int = 0, per_char: float = 0.0):
+        self.latency = latency
+        self.output_chars = output_chars
+        self.per_char = per_char
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        text = prompt.rsplit("TEXT:\n", 1)[-1]
+        latency = self.latency + self.per_char * len(text)
+        if self.output_chars:
+            # Different inputs give different "summaries"
+            text = f"{text[:self.output_chars]} [{zlib.crc32(text.encode()):08x}]"
+        if stream:
+            return StubGeminiStream(text, latency)
+        await asyncio.sleep(latency)
+        return StubGeminiResponse(text)
+
+
+class ThrottlingError(Exception):
+    """
+    HTTP 429 as raised by the ElevenLabs SDK.
+    """
+
+    status_code = 429
+
+
+class StubTTS(BaseTTS):
+    """
+    Blocking TTS provider (like boto3/ElevenLabs) with a configurable latency.
+
+    A request takes `latency` plus `per_char` seconds for every character;
+    streaming spreads that time over `chunks` evenly sized audio chunks.
+    With `throttle_above` set, requests beyond that many in flight fail
+    with ThrottlingError, like a provider enforcing a concurrency quota.
+    A `slow_share` of requests takes `slow_factor` times longer (tail latency).
+    """
+
+    def __init__(
+        self,
+        latency: float,
+        chunks: int = 10,
+        per_char: float = 0.0,
+        throttle_above: int = 0,
+        slow_share: float = 0.0,
+        slow_factor: float = 10.0,
+        name: str = "stub"
+    ):
+        self.latency = latency
+        self.chunks = chunks
+        self.per_char = per_char
+        self.throttle_above = throttle_above
+        self.slow_share = slow_share
+        self.slow_factor = slow_factor
+        self.name = name
+        self.throttled = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def duration(self, text: str) -> float:
+        duration = self.latency + self.per_char * len(text)
+        if self.slow_share and random.random() < self.slow_share:
+            duration *= self.slow_factor
+        return duration
+
+    @contextlib.contextmanager
+    def _quota(self):
+        with self._lock:
+            if self.throttle_above and self._in_flight >= self.throttle_above:
+                self.throttled += 1
+                raise ThrottlingError("Too many concurrent requests")
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def generate(self, text: str, output_path: str) -> str:
+        with self._quota():
+            time.sleep(self.duration(text))
+        with open(output_path, "wb") as f:
+            f.write(AUDIO_CHUNK * self.chunks)
+        return output_path
+
+    async def stream(self, text: str):
+        duration = self.duration(text)
+        with self._quota():
+            for _ in range(self.chunks):
+                await asyncio.sleep(duration / self.chunks)
+                yield AUDIO_CHUNK
+
+    def get_provider_name(self) -> str:
+        return self.name
+
+
+class StubAsyncTTS(StubTTS):
+    """
+    Native-async TTS provider (like Edge TTS): no thread pool involved.
+    """
+
+    async def generate_async(self, text: str, output_path: str) -> str:
+        with self._quota():
+            await asyncio.sleep(self.duration(text))
+        with open(output_path, "wb") as f:
+            f.write(AUDIO_CHUNK * self.chunks)
+        return output_path
+
+
+def make_tts_service(provider: BaseTTS) -> TTSService:
+    """
+    Creates a TTSService using `provider` and an empty audio cache in a temporary directory.
+    """
+    service = TTSService(output_dir=tempfile.mkdtemp(prefix="vocas-bench-"), provider="edge")
+    service.provider = provider
+    return service
+
+
+def install_stubs(app_module, llm_latency: float, tts_latency: float, tts_chunks: int = 10):
+    """
+    Replaces Gemini and the TTS provider of the imported `main` module with stubs.
+    """
+    app_module.llm_service.client = StubGeminiModel(llm_latency)
+    app_module.tts_service = make_tts_service(StubTTS(tts_latency, tts_chunks))
+
+
+@contextlib.asynccontextmanager
+async def serve(app):
+    """
+    Runs the app on a local uvicorn server and yields its base URL.
+
+    Needed wherever chunked responses matter: httpx's ASGITransport buffers
+    the whole response body before returning it.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
@@ -0,0 +1,178 @@
+"""
+End-to-end benchmark of /read and /api/process against local stand-ins.
+
+A fake news site (fake_site.py) serves saved or synthetic Czech homepages and
+articles over HTTP, and Gemini and the TTS provider are replaced by stubs
+with configurable latency and payload size. Each scenario is driven at every
+concurrency level; throughput, p50/p95/p99 latency, errors and peak RSS are
+printed and written to JSON, and --compare prints the change against an
+earlier run (e.g. from the previous commit).
+
+Scenarios:
+    read        GET /read/<homepage or article>, through the page and render caches
+    process     POST /api/process with a distinct text per request (LLM + TTS)
+    process-url POST /api/process?url=<article>, server-side extraction + LLM + TTS
+
+Usage (from the repository root):
+    python benchmarks/suite.py --scenarios read,process --concurrency 1,10,50 --requests 200 --output bench.json
+    python benchmarks/suite.py --compare bench.json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+
+from stubs import StubAsyncTTS, StubGeminiModel, StubTTS, AUDIO_CHUNK, make_tts_service, serve
+from fake_site import FakeNewsSite, PARAGRAPHS, load_fixtures
+
+import httpx
+
+import main
+
+
+def percentile(values, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))] if values else 0.0
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def install(args):
+    main.llm_service.client = StubGeminiModel(args.llm_latency, args.llm_output_chars)
+    stub = StubAsyncTTS if args.tts_style == "async" else StubTTS
+    chunks = max(1, args.audio_kb * 1024 // len(AUDIO_CHUNK))
+    main.tts_service = make_tts_service(stub(args.tts_latency, chunks=chunks, per_char=args.tts_per_char))
+
+
+def make_request(scenario: str, site_url: str, homepages: list, i: int):
+    """
+    Returns (method, path, json body) for the i-th request of a scenario.
+    """
+    if scenario == "read":
+        # Mix of homepages and articles, repeating so the caches get hits
+        target = f"{homepages[i % len(homepages)]}/" if i % 4 == 0 else f"clanek/{i % 50}"
+        return "GET", f"/read/{site_url}/{target}", None
+    if scenario == "process":
+        text = " ".join(PARAGRAPHS[(i + k) % len(PARAGRAPHS)] for k in range(8)) + f" (Požadavek {i}.)"
+        return "POST", "/api/process", {"text": text, "mode": "read"}
+    if scenario == "process-url":
+        return "POST", f"/api/process?url={site_url}/clanek/{100000 + i}", {"mode": "read"}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, concurrency: int, requests: int, site_url: str, homepages: list, offset: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        method, path, body = make_request(scenario, site_url, homepages, offset + i)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2),
+        "p50": round(percentile(latencies, 0.50), 4),
+        "p95": round(percentile(latencies, 0.95), 4),
+        "p99": round(percentile(latencies, 0.99), 4),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args) -> dict:
+    install(args)
+    homepages = load_fixtures(args.fixtures)
+    site = FakeNewsSite(homepages, latency=args.site_latency, cache_control=args.site_cache_control)
+
+    results = []
+    async with serve(site) as site_url, serve(main.app) as base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            offset = 0
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    result = await run_scenario(client, scenario, concurrency, args.requests, site_url, list(homepages), offset)
+                    # Later runs use fresh texts/articles so they are not served from the caches
+                    offset += args.requests
+                    results.append(result)
+                    print(f"{scenario:<12} c={concurrency:<4} {result['throughput']:>8.1f} req/s  p50 {result['p50'] * 1000:>8.1f}ms  "
+                          f"p95 {result['p95'] * 1000:>8.1f}ms  p99 {result['p99'] * 1000:>8.1f}ms  "
+                          f"errors {result['errors']:<3} rss {result['peak_rss_mb']}MB")
+
+    config = {name: value for name, value in vars(args).items() if name not in ("output", "compare")}
+    return {"commit": git_commit(), "config": config, "results": results}
+
+
+def compare(report: dict, baseline: dict):
+    """
+    Prints the relative change of throughput and latencies against a baseline report.
+    """
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nchange vs. {baseline.get('commit') or 'baseline'} (throughput: + is better; latency: - is better)")
+    for result in report["results"]:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if not old:
+            continue
+        changes = []
+        for name in ("throughput", "p50", "p95", "p99", "peak_rss_mb"):
+            if old[name]:
+                changes.append(f"{name} {(result[name] - old[name]) / old[name] * 100:+.1f}%")
+        print(f"{result['scenario']:<12} c={result['concurrency']:<4} " + "  ".join(changes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=["read", "process", "process-url"])
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--fixtures", help="directory with saved *.html homepages (UTF-8)")
+    parser.add_argument("--site-latency", type=float, default=0.05)
+    parser.add_argument("--site-cache-control", default="max-age=60")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-output-chars", type=int, default=0, help="cut LLM output to this length (0 = echo input)")
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    parser.add_argument("--tts-per-char", type=float, default=0.0)
+    parser.add_argument("--tts-style", choices=["blocking", "async"], default="blocking",
+                        help="blocking SDK in the thread pool (Polly, ElevenLabs) or native async (Edge)")
+    parser.add_argument("--audio-kb", type=int, default=256, help="size of each generated MP3")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)